@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Cycling_events.settings')
 
+from Cycling_events_app.handlers import get_asgi_application  # noqa: E402
+
 application = get_asgi_application()
+
+from Cycling_events_app.reference import warm_reference_cache  # noqa: E402
+
+warm_reference_cache()
@@ -41,7 +41,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Cycling_events_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'Cycling_events_app.query_inspector.QueryInspectorMiddleware',
+    'Cycling_events_app.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +57,7 @@ ROOT_URLCONF = 'Cycling_events.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'Cycling_events_app.metrics.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,6 +88,56 @@ DATABASES = {
     }
 }
 
+# Read replicas are added from DATABASE_REPLICA_URLS at the end of this file.
+# Views with replica_reads read from them, a client which wrote
+# reads from the primary for REPLICA_PIN_SECONDS (more than the lag).
+DATABASE_ROUTERS = ['Cycling_events_app.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# CACHE_BACKEND selects the backend: locmem (default), file or redis.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get(
+                'CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cycling-events',
+        }
+    }
+
+# Seconds for which rendered event lists and event details are cached.
+EVENT_CACHE_TIMEOUT = int(os.environ.get('EVENT_CACHE_TIMEOUT', 300))
+
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+# Logged in user is loaded with the profile from a cached snapshot,
+# which is dropped whenever the user or the profile is saved.
+# The snapshot is shared by all workers only with a shared cache (redis).
+AUTHENTICATION_BACKENDS = ['Cycling_events_app.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', 300))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -103,6 +156,50 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# The first hasher hashes new passwords; passwords stored with another one
+# (or with another number of iterations) are hashed again at login.
+
+PASSWORD_HASHER = os.environ.get(
+    'PASSWORD_HASHER', 'Cycling_events_app.hashers.TunablePBKDF2PasswordHasher')
+PASSWORD_HASHERS = [PASSWORD_HASHER] + [hasher for hasher in (
+    'Cycling_events_app.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+) if hasher != PASSWORD_HASHER]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0)) \
+    or None
+
+# Login throttling: at most LOGIN_THROTTLE_IP_LIMIT failed logins from an
+# address and LOGIN_THROTTLE_USERNAME_LIMIT for a username within
+# LOGIN_THROTTLE_WINDOW seconds. LOGIN_THROTTLE_BACKEND is memory (per
+# worker) or cache (shared by the workers with the redis or file cache).
+# Client addresses are read from X-Forwarded-For set by
+# LOGIN_THROTTLE_TRUSTED_PROXIES proxies in front of the app
+# (the router on Heroku, which sets DYNO).
+LOGIN_THROTTLE_TRUSTED_PROXIES = int(os.environ.get(
+    'LOGIN_THROTTLE_TRUSTED_PROXIES', 1 if 'DYNO' in os.environ else 0))
+LOGIN_THROTTLE_WINDOW = int(os.environ.get('LOGIN_THROTTLE_WINDOW', 300))
+LOGIN_THROTTLE_IP_LIMIT = int(os.environ.get('LOGIN_THROTTLE_IP_LIMIT', 20))
+LOGIN_THROTTLE_USERNAME_LIMIT = int(
+    os.environ.get('LOGIN_THROTTLE_USERNAME_LIMIT', 5))
+LOGIN_THROTTLE_BACKEND = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+
+
+# E-mail (waitlist notifications), printed to the console unless
+# EMAIL_BACKEND is set, e.g. django.core.mail.backends.smtp.EmailBackend
+# with EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER and EMAIL_HOST_PASSWORD.
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL',
+                                    'noreply@cycling-events.pl')
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
@@ -123,7 +220,37 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-
+# Events listing
+# Number of events shown on a single page of the events list
+# (can be changed per request with the `page_size` query parameter).
+EVENTS_PAGE_SIZE = int(os.environ.get('EVENTS_PAGE_SIZE', 25))
+EVENTS_MAX_PAGE_SIZE = int(os.environ.get('EVENTS_MAX_PAGE_SIZE', 100))
+
+# Largest accepted GPX track of an event, in bytes.
+GPX_MAX_SIZE = int(os.environ.get('GPX_MAX_SIZE', 20 * 2 ** 20))
+
+# Background tasks (e.g. processing of uploaded images)
+# run in a thread pool of every process, TASKS_EAGER runs them in place.
+TASKS_MAX_WORKERS = int(os.environ.get('TASKS_MAX_WORKERS', 2))
+TASKS_EAGER = os.environ.get('TASKS_EAGER') == '1'
+
+# Query inspector (development and CI): counts queries of every request
+# and reports queries repeated QUERY_INSPECTOR_THRESHOLD times (N+1),
+# QUERY_INSPECTOR_RAISE turns the reports into errors.
+QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR') == '1'
+QUERY_INSPECTOR_RAISE = os.environ.get('QUERY_INSPECTOR_RAISE') == '1'
+QUERY_INSPECTOR_THRESHOLD = int(
+    os.environ.get('QUERY_INSPECTOR_THRESHOLD', 3))
+
+# Request metrics exposed at /metrics in the Prometheus text format.
+# METRICS_SAMPLE_RATE of requests also measure database and template time,
+# METRICS_DIR shares metrics of gunicorn workers (clear it on deploy),
+# METRICS_TOKEN protects the endpoint (Authorization: Bearer <token>).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
 
 # Default primary key field type
@@ -132,4 +259,46 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 import django_on_heroku
-django_on_heroku.settings(locals())
\ No newline at end of file
+django_on_heroku.settings(locals())
+# WhiteNoise able to serve the async views on the event loop
+MIDDLEWARE = [
+    'Cycling_events_app.handlers.AsyncWhiteNoiseMiddleware'
+    if path == 'whitenoise.middleware.WhiteNoiseMiddleware' else path
+    for path in MIDDLEWARE]
+
+# Comma separated urls of read replicas, e.g. postgres://... or
+# sqlite:////path/to/copy.sqlite3 to try the routing locally.
+# Tests read the replicas from the test database (TEST MIRROR).
+import dj_database_url
+for number, url in enumerate(
+        filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')),
+        start=1):
+    replica = dj_database_url.parse(
+        url.strip(), conn_max_age=int(os.environ.get('CONN_MAX_AGE', 600)))
+    replica['TEST'] = {'MIRROR': 'default'}
+    DATABASES[f'replica{number}'] = replica
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+# Connection pool of every process replacing persistent connections
+# (CONN_MAX_AGE) of PostgreSQL databases, disabled by DB_POOL=0.
+# Connections are returned to the pool at the end of every request.
+# DB_POOL_MAX_SIZE limits open connections of a process (gunicorn workers
+# and threads of the ASGI server share them), DB_POOL_TIMEOUT is the wait
+# for a free one, idle connections are closed after DB_POOL_IDLE_TIMEOUT
+# and checked before use after DB_POOL_HEALTH_CHECK_INTERVAL seconds.
+for database in DATABASES.values():
+    if os.environ.get('DB_POOL', '1') != '1' \
+            or 'postgresql' not in database['ENGINE']:
+        continue
+    database.update({
+        'ENGINE': 'Cycling_events_app.postgresql_pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'IDLE_TIMEOUT': float(
+                os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'HEALTH_CHECK_INTERVAL': float(
+                os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        },
+    })
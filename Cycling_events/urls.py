@@ -14,35 +14,47 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from Cycling_events_app.metrics import metrics_view
 from Cycling_events_app.views import LoginView, MainView, EventsView, AddEventView, LogoutView, RegisterView, \
     ProfileView, EditProfileView, EventView, EditEventView, MyEventsView, EventResignationView, \
-    EventSignupView, ParticipantsView, AddBikeView, BikeDetailsView, EditBikeView, ContactView
+    EventSignupView, ParticipantsView, ParticipantsExportView, AddBikeView, BikeDetailsView, EditBikeView, ContactView, \
+    SearchEventsView, ImportEventsView, CalendarFeedView, EventRouteView, WaitlistResignationView, \
+    region_feed, user_feed
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('Cycling_events_app.api_urls')),
     path('', LoginView.as_view()),
     path('accounts/login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('register/', RegisterView.as_view(), name='register'),
     path('main_page/', MainView.as_view(), name='main'),
     path('events/', EventsView.as_view(), name='events'),
+    path('search/', SearchEventsView.as_view(), name='search'),
     path('add_event/', AddEventView.as_view(), name='add-events'),
+    path('import_events/', ImportEventsView.as_view(), name='import-events'),
     path('profile/', ProfileView.as_view(), name='profile'),
     path('edit_profile/', EditProfileView.as_view(), name='edit-profile'),
     path('event_details/<str:id>/', EventView.as_view(), name='event-details'),
     path('event_signup/<str:id>/', EventSignupView.as_view(), name='event-signup'),
     path('edit_event/<str:id>/', EditEventView.as_view(), name='edit-event'),
+    path('event_route/<str:id>/', EventRouteView.as_view(), name='event-route'),
     path('my_events', MyEventsView.as_view(), name='my-events'),
     path('event_resignation/<str:id>/', EventResignationView.as_view(), name='event-resignation'),
+    path('waitlist_resignation/<str:id>/', WaitlistResignationView.as_view(), name='waitlist-resignation'),
     path('participants/<str:id>/', ParticipantsView.as_view(), name='participants'),
+    path('participants/<str:id>/export/', ParticipantsExportView.as_view(), name='participants-export'),
     path('add_bike/', AddBikeView.as_view(), name='add-bike'),
     path('bike_details/<str:id>/', BikeDetailsView.as_view(), name='bike_details'),
     path('edit_bike/<str:id>/', EditBikeView.as_view(), name='edit-bike'),
     path('contact/', ContactView.as_view(), name='contact'),
+    path('calendar/region/<int:id>/', CalendarFeedView.as_view(feed=region_feed), name='region-calendar'),
+    path('calendar/<str:token>/', CalendarFeedView.as_view(feed=user_feed), name='user-calendar'),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Cycling_events.settings')
 
 application = get_wsgi_application()
+
+from Cycling_events_app.reference import warm_reference_cache  # noqa: E402
+
+warm_reference_cache()
@@ -0,0 +1,509 @@
+"""
+JSON API for events, profiles, bikes and sign ups.
+
+Authentication uses the regular session, so unsafe requests have to send
+the CSRF token in the X-CSRFToken header.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.forms.models import model_to_dict
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views import View
+
+from .caching import event_list_version, event_version
+from .forms import AddEventForm, EditEventForm, FilterEventsForm, \
+    ProfileDetailsForm, AddBikeForm, start_of_day
+from .models import Event, Profile, Bike, WaitlistEntry
+from .pagination import KeysetPaginator, InvalidCursor
+from .reference import regions, categories
+from .signups import sign_up, resign, join_waitlist, leave_waitlist, \
+    update_event, EventFull, AlreadySignedUp, AlreadyWaiting
+
+
+class ApiError(Exception):
+    """
+    Error returned to the client as JSON with the given status.
+    """
+    def __init__(self, status, message, errors=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.errors = errors
+
+
+def get_object(queryset, pk):
+    """
+    Return object or raise 404 ApiError.
+    """
+    try:
+        return queryset.get(pk=pk)
+    except (queryset.model.DoesNotExist, ValueError):
+        raise ApiError(404, 'Nie znaleziono obiektu.')
+
+
+def location(event, prefix):
+    """
+    Return [lat, lon] of the event start or finish or None.
+    """
+    lat = getattr(event, f'{prefix}_lat')
+    if lat is None:
+        return None
+    return [lat, getattr(event, f'{prefix}_lon')]
+
+
+# API field name -> (model columns needed, getter)
+EVENT_FIELDS = {
+    'id': (('id',), lambda event: event.id),
+    'event_name': (('event_name',), lambda event: event.event_name),
+    'event_type': (('event_type',), lambda event: event.event_type),
+    'limit': (('limit',), lambda event: event.limit),
+    'distance': (('distance',), lambda event: event.distance),
+    'route_description': (('route_description',),
+                          lambda event: event.route_description),
+    'date': (('date',), lambda event: event.date),
+    'start': (('start',), lambda event: event.start),
+    'finish': (('finish',), lambda event: event.finish),
+    'start_location': (('start_lat', 'start_lon'),
+                       lambda event: location(event, 'start')),
+    'finish_location': (('finish_lat', 'finish_lon'),
+                        lambda event: location(event, 'finish')),
+    'region_name': (('region_name',),
+                    lambda event: regions.value_for_pk(event.region_name_id)),
+    'categories': (('categories',),
+                   lambda event: categories.value_for_pk(event.categories_id)),
+    'participant_count': (('participant_count',),
+                          lambda event: event.participant_count),
+    'free_places': (('limit', 'participant_count'),
+                    lambda event: event.free_places),
+    'event_creator': (('event_creator',), lambda event: event.event_creator_id),
+}
+
+PROFILE_FIELDS = {
+    'id': lambda profile: profile.id,
+    'username': lambda profile: profile.user.username,
+    'region': lambda profile: profile.region,
+    'bike': lambda profile: profile.bike_id,
+}
+
+OWN_PROFILE_FIELDS = dict(PROFILE_FIELDS, **{
+    'first_name': lambda profile: profile.user.first_name,
+    'last_name': lambda profile: profile.user.last_name,
+    'email': lambda profile: profile.user.email,
+    'gender': lambda profile: profile.gender,
+    'age': lambda profile: profile.age,
+    'weight': lambda profile: profile.weight,
+})
+
+BIKE_FIELDS = {
+    'id': lambda bike: bike.id,
+    'brand': lambda bike: bike.brand,
+    'model': lambda bike: bike.model,
+    'bike_type': lambda bike: bike.bike_type,
+    'weight': lambda bike: bike.weight,
+    'image': lambda bike: bike.image.url if bike.image else None,
+    'thumbnail': lambda bike: bike.thumbnail.url if bike.thumbnail else None,
+    'thumbnail_webp':
+        lambda bike: bike.thumbnail_webp.url if bike.thumbnail_webp else None,
+}
+
+
+def requested_fields(request, available):
+    """
+    Return field names selected with the `fields` query parameter
+    (sparse fieldset), all fields by default.
+    """
+    fields = request.GET.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(400, f'Nieznane pola: {", ".join(unknown)}.')
+    return fields
+
+
+def serialize(obj, fields, getters):
+    return {field: getters[field](obj) for field in fields}
+
+
+def serialize_event(event, fields=EVENT_FIELDS):
+    return {field: EVENT_FIELDS[field][1](event) for field in fields}
+
+
+def event_queryset(fields, ordering=()):
+    """
+    Return queryset loading only the columns needed by the fields.
+    """
+    columns = set(ordering)
+    for field in fields:
+        columns.update(EVENT_FIELDS[field][0])
+    return Event.objects.only(*columns)
+
+
+def dump(data):
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+def json_response(request, data, status=200, etag=None):
+    """
+    Return JSON response with ETag, or 304 if the client has it already.
+    """
+    body = dump(data)
+    if etag is None:
+        etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(data, status=status, safe=False,
+                            encoder=DjangoJSONEncoder)
+    response['ETag'] = etag
+    return response
+
+
+def get_api_page_size(request):
+    """
+    Return page size from the query string, limited by EVENTS_MAX_PAGE_SIZE.
+    """
+    try:
+        page_size = int(request.GET.get('page_size', settings.EVENTS_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'Niepoprawny rozmiar strony.')
+    return max(1, min(page_size, settings.EVENTS_MAX_PAGE_SIZE))
+
+
+def parse_body(request):
+    """
+    Return JSON object sent in the request body.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Niepoprawny JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Oczekiwano obiektu JSON.')
+    return data
+
+
+def form_data(data):
+    """
+    Convert JSON values to strings expected by Django forms.
+    """
+    return {key: '' if value is None else str(value)
+            for key, value in data.items()}
+
+
+class ApiView(View):
+    """
+    Base view turning ApiError into JSON error responses.
+    """
+    login_required = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() in self.login_required \
+                    and not request.user.is_authenticated:
+                raise ApiError(401, 'Wymagane logowanie.')
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            content = {'error': error.message}
+            if error.errors:
+                content['errors'] = error.errors
+            return JsonResponse(content, status=error.status)
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        raise ApiError(405, 'Metoda niedozwolona.')
+
+
+class EventListApiView(ApiView):
+    """
+    List events (GET) or create event (POST).
+    """
+    login_required = ('post',)
+    ordering = ('event_name', 'id')
+
+    def get(self, request):
+        """
+        Handle GET requests: return page of events filtered by the
+        FilterEventsForm fields, with `cursor`, `page_size` and `fields`.
+        """
+        fields = requested_fields(request, EVENT_FIELDS)
+        etag = quote_etag(hashlib.md5(
+            f'{event_list_version()}:{request.GET.urlencode()}'.encode()
+        ).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        form = FilterEventsForm(request.GET or None)
+        if form.is_bound and not form.is_valid():
+            raise ApiError(400, 'Niepoprawne filtry.', form.errors)
+        filters = form.get_filters() if form.is_bound else {}
+        page_size = get_api_page_size(request)
+        events = event_queryset(fields, self.ordering).filter(**filters)
+        try:
+            page = KeysetPaginator(events, self.ordering, page_size)\
+                .page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise ApiError(400, 'Niepoprawny kursor.')
+
+        def link(cursor):
+            if cursor is None:
+                return None
+            query = request.GET.copy()
+            query['cursor'] = cursor
+            return f'{request.path}?{query.urlencode()}'
+
+        return json_response(request, {
+            'results': [serialize_event(event, fields) for event in page],
+            'next': link(page.next_cursor),
+            'previous': link(page.previous_cursor),
+        }, etag=etag)
+
+    def post(self, request):
+        """
+        Handle POST requests: create event validated with AddEventForm.
+        """
+        form = AddEventForm(form_data(parse_body(request)))
+        if not form.is_valid():
+            raise ApiError(400, 'Niepoprawne dane.', form.errors)
+        data = dict(form.cleaned_data)
+        data['region_name'] = regions.by_value(data['region_name'])
+        data['categories'] = categories.by_value(data['categories'])
+        if data['region_name'] is None or data['categories'] is None:
+            raise ApiError(400, 'Brak regionu lub kategorii w bazie.')
+        data['date'] = start_of_day(data['date'])
+        event = Event.objects.create(event_creator=request.user, **data)
+        return JsonResponse(serialize_event(event), status=201,
+                            encoder=DjangoJSONEncoder)
+
+
+class EventApiView(ApiView):
+    """
+    Read (GET), update (PATCH) or delete (DELETE) single event.
+    """
+    login_required = ('patch', 'delete')
+
+    def get_own_event(self, request, id):
+        event = get_object(Event.objects.all(), id)
+        if event.event_creator_id != request.user.id:
+            raise ApiError(403, 'Tylko twórca może zmieniać wydarzenie.')
+        return event
+
+    def get(self, request, id):
+        """
+        Handle GET requests: return event. The ETag comes from the cached
+        event version, so unchanged events are answered without a query.
+        """
+        fields = requested_fields(request, EVENT_FIELDS)
+        etag = quote_etag(f'{event_version(id)}-{",".join(fields)}')
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        event = get_object(event_queryset(fields), id)
+        return json_response(request, serialize_event(event, fields),
+                             etag=etag)
+
+    def patch(self, request, id):
+        """
+        Handle PATCH requests: update given fields of the event.
+        """
+        event = self.get_own_event(request, id)
+        changes = parse_body(request)
+        data = model_to_dict(event, fields=EditEventForm.Meta.fields)
+        data.update(changes)
+        if 'region_name' in changes:
+            region = regions.by_value(changes['region_name'])
+            data['region_name'] = region and region.pk
+        if 'categories' in changes:
+            category = categories.by_value(changes['categories'])
+            data['categories'] = category and category.pk
+        form = EditEventForm(form_data(data), instance=event)
+        if not form.is_valid():
+            raise ApiError(400, 'Niepoprawne dane.', form.errors)
+        event = update_event(form)
+        return JsonResponse(serialize_event(event), encoder=DjangoJSONEncoder)
+
+    def delete(self, request, id):
+        """
+        Handle DELETE requests: delete the event.
+        """
+        self.get_own_event(request, id).delete()
+        return HttpResponse(status=204)
+
+
+class EventSignupApiView(ApiView):
+    """
+    Sign up for (POST) or resign from (DELETE) the event.
+    """
+    login_required = ('post', 'delete')
+
+    def post(self, request, id):
+        try:
+            event = sign_up(id, request.user.profile)
+        except (Event.DoesNotExist, ValueError):
+            raise ApiError(404, 'Nie znaleziono obiektu.')
+        except EventFull:
+            raise ApiError(409, 'Limit miejsc został wyczerpany.')
+        except AlreadySignedUp:
+            raise ApiError(409, 'Jesteś już zapisany na to wydarzenie.')
+        return JsonResponse({'event': event.id}, status=201)
+
+    def delete(self, request, id):
+        try:
+            resign(id, request.user.profile)
+        except (Event.DoesNotExist, ValueError):
+            raise ApiError(404, 'Nie znaleziono obiektu.')
+        return HttpResponse(status=204)
+
+
+class EventWaitlistApiView(ApiView):
+    """
+    Position of the user on the waitlist of a full event (GET),
+    join (POST) or leave (DELETE) the waitlist.
+    """
+    login_required = ('get', 'post', 'delete')
+
+    def get(self, request, id):
+        entries = WaitlistEntry.objects\
+            .filter(profile__user_id=request.user.id)\
+            .only('event_id', 'position')
+        try:
+            entry = entries.get(event_id=id)
+        except (WaitlistEntry.DoesNotExist, ValueError):
+            raise ApiError(404, 'Nie jesteś na liście rezerwowej.')
+        return JsonResponse({'event': entry.event_id,
+                             'position': entry.position})
+
+    def post(self, request, id):
+        try:
+            event, position = join_waitlist(id, request.user.profile)
+        except (Event.DoesNotExist, ValueError):
+            raise ApiError(404, 'Nie znaleziono obiektu.')
+        except AlreadySignedUp:
+            raise ApiError(409, 'Jesteś już zapisany na to wydarzenie.')
+        except AlreadyWaiting as error:
+            raise ApiError(409, f'Jesteś już na liście rezerwowej '
+                                f'na pozycji {error.position}.')
+        return JsonResponse({'event': event.id, 'position': position},
+                            status=201)
+
+    def delete(self, request, id):
+        try:
+            leave_waitlist(id, request.user.profile)
+        except (Event.DoesNotExist, ValueError):
+            raise ApiError(404, 'Nie znaleziono obiektu.')
+        return HttpResponse(status=204)
+
+
+class EventExportApiView(ApiView):
+    """
+    Stream all (optionally filtered) events as a JSON array.
+    Events are read with a server side cursor in chunks,
+    so memory use does not depend on the number of events.
+    """
+    chunk_size = 2000
+
+    def get(self, request):
+        fields = requested_fields(request, EVENT_FIELDS)
+        form = FilterEventsForm(request.GET or None)
+        if form.is_bound and not form.is_valid():
+            raise ApiError(400, 'Niepoprawne filtry.', form.errors)
+        filters = form.get_filters() if form.is_bound else {}
+        events = event_queryset(fields, ('id',)).filter(**filters)\
+            .order_by('id').iterator(chunk_size=self.chunk_size)
+
+        def stream():
+            yield '['
+            separator = ''
+            for event in events:
+                yield separator + dump(serialize_event(event, fields))
+                separator = ','
+            yield ']'
+
+        response = StreamingHttpResponse(stream(),
+                                         content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename="events.json"'
+        return response
+
+
+class ProfileApiView(ApiView):
+    """
+    Public data of a single profile.
+    """
+    def get(self, request, id):
+        fields = requested_fields(request, PROFILE_FIELDS)
+        profile = get_object(Profile.objects.select_related('user'), id)
+        return json_response(request, serialize(profile, fields,
+                                                PROFILE_FIELDS))
+
+
+class OwnProfileApiView(ApiView):
+    """
+    Read (GET) or update (PATCH) profile of the logged in user.
+    """
+    login_required = ('get', 'patch')
+
+    def get(self, request):
+        fields = requested_fields(request, OWN_PROFILE_FIELDS)
+        return json_response(request, serialize(request.user.profile, fields,
+                                                OWN_PROFILE_FIELDS))
+
+    def patch(self, request):
+        profile = request.user.profile
+        data = model_to_dict(profile, fields=('gender', 'age', 'weight',
+                                              'region'))
+        data.update(parse_body(request))
+        form = ProfileDetailsForm(form_data(data), instance=profile)
+        if not form.is_valid():
+            raise ApiError(400, 'Niepoprawne dane.', form.errors)
+        form.save()
+        return JsonResponse(serialize(profile, OWN_PROFILE_FIELDS,
+                                      OWN_PROFILE_FIELDS))
+
+
+class BikeListApiView(ApiView):
+    """
+    Add bike of the logged in user (POST).
+    """
+    login_required = ('post',)
+
+    def post(self, request):
+        form = AddBikeForm(form_data(parse_body(request)))
+        if not form.is_valid():
+            raise ApiError(400, 'Niepoprawne dane.', form.errors)
+        bike = form.save()
+        profile = request.user.profile
+        profile.bike = bike
+        profile.save()
+        return JsonResponse(serialize(bike, BIKE_FIELDS, BIKE_FIELDS),
+                            status=201)
+
+
+class BikeApiView(ApiView):
+    """
+    Read (GET) or update (PATCH) single bike.
+    """
+    login_required = ('patch',)
+
+    def get(self, request, id):
+        fields = requested_fields(request, BIKE_FIELDS)
+        bike = get_object(Bike.objects.all(), id)
+        return json_response(request, serialize(bike, fields, BIKE_FIELDS))
+
+    def patch(self, request, id):
+        bike = get_object(Bike.objects.all(), id)
+        if request.user.profile.bike_id != bike.id:
+            raise ApiError(403, 'Możesz zmieniać tylko swój rower.')
+        data = model_to_dict(bike, fields=('brand', 'model', 'bike_type',
+                                           'weight'))
+        data.update(parse_body(request))
+        form = AddBikeForm(form_data(data), instance=bike)
+        if not form.is_valid():
+            raise ApiError(400, 'Niepoprawne dane.', form.errors)
+        form.save()
+        return JsonResponse(serialize(bike, BIKE_FIELDS, BIKE_FIELDS))
@@ -0,0 +1,20 @@
+from django.urls import path
+
+from .api import EventListApiView, EventApiView, EventSignupApiView, \
+    EventExportApiView, ProfileApiView, OwnProfileApiView, BikeListApiView, \
+    BikeApiView, EventWaitlistApiView
+
+urlpatterns = [
+    path('events/', EventListApiView.as_view(), name='api-events'),
+    path('events/export/', EventExportApiView.as_view(),
+         name='api-events-export'),
+    path('events/<str:id>/', EventApiView.as_view(), name='api-event'),
+    path('events/<str:id>/signup/', EventSignupApiView.as_view(),
+         name='api-event-signup'),
+    path('events/<str:id>/waitlist/', EventWaitlistApiView.as_view(),
+         name='api-event-waitlist'),
+    path('profile/', OwnProfileApiView.as_view(), name='api-own-profile'),
+    path('profiles/<str:id>/', ProfileApiView.as_view(), name='api-profile'),
+    path('bikes/', BikeListApiView.as_view(), name='api-bikes'),
+    path('bikes/<str:id>/', BikeApiView.as_view(), name='api-bike'),
+]
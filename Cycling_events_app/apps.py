@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class CyclingEventsAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Cycling_events_app'
+
+    def ready(self):
+        """
+        Connect signal receivers which invalidate cached events,
+        users, reference tables, keep search vectors and event coordinates
+        up to date, release images of deleted bikes and profiles
+        and tracks of deleted routes and instrument database connections.
+        """
+        from . import (backends, caching, geo, gpx,  # noqa: F401
+                       images, metrics, query_inspector, reference, search)
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Profile
+
+USER_KEY = 'auth:user:{}'
+
+User = get_user_model()
+
+
+def load_user(user_id):
+    """
+    Return user with the profile (used by every page) or None.
+    """
+    return User._default_manager.select_related('profile')\
+        .filter(pk=user_id).first()
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    Model backend which loads the user of the session together with the
+    profile from a cached snapshot, so authenticated requests do not
+    query the user and profile tables. The session auth hash is still
+    verified against the snapshot by django.contrib.auth.get_user.
+    """
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = load_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(user_id):
+    """
+    Drop snapshot of the user now and once more after the transaction
+    commits, so a request reading in between can not cache
+    uncommitted state.
+    """
+    key = USER_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_saved_user(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_saved_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
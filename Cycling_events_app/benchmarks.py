@@ -0,0 +1,510 @@
+import contextvars
+import datetime
+import functools
+import gc
+import io
+import json
+import math
+import random
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.urls import get_resolver, resolve, reverse, URLPattern, \
+    URLResolver
+from django.utils import timezone
+
+from .geo import locate_event
+from .ical import user_token
+from .models import Event, Profile, Bike, Region, Category, EVENT_TYPE, \
+    VOIVODESHIP_NAME, CATEGORY_NAME, participant_count_subquery
+from .reference import clear_reference_cache
+from .search import update_search_vectors
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+# routes which are not part of the application
+SKIPPED_ROUTES = ('admin/', 'media/')
+
+WORDS = ('szosa', 'gravel', 'maraton', 'klasyk', 'pętla', 'wyścig', 'górski',
+         'nocny', 'rodzinny', 'jesienny', 'wiosenny', 'kryterium', 'MTB',
+         'Tatry', 'Mazury', 'Kaszuby', 'Beskidy', 'Wisła', 'Odra')
+TOWNS = ('Kraków', 'Warszawa', 'Gdańsk', 'Wrocław', 'Poznań', 'Łódź',
+         'Lublin', 'Zakopane', 'Olsztyn', 'Toruń', 'Rzeszów', 'Opole')
+
+
+class Dataset:
+    """
+    Synthetic data used by the benchmark scenarios.
+    """
+    def __init__(self, user, event, own_event, joined_event, bike, profile,
+                 sizes):
+        self.user = user
+        self.event = event
+        self.own_event = own_event
+        self.joined_event = joined_event
+        self.bike = bike
+        self.profile = profile
+        self.sizes = sizes
+
+
+def seed_dataset(users=200, events=1000, participants=20, seed=0):
+    """
+    Fill the (test) database with synthetic users, profiles, bikes,
+    events and participants.
+    :param users: number of users (each with a profile and a bike)
+    :param events: number of events
+    :param participants: maximal number of participants of an event
+    :param seed: seed of the random generator
+    :return: Dataset
+    """
+    rng = random.Random(seed)
+    users = max(users, 2)
+    events = max(events, 3)
+    password = make_password(BENCHMARK_PASSWORD)
+    regions = [Region.objects.get_or_create(voivodeship_name=value)[0]
+               for value, _ in VOIVODESHIP_NAME]
+    categories = [Category.objects.get_or_create(category_name=value)[0]
+                  for value, _ in CATEGORY_NAME]
+    clear_reference_cache()
+
+    first_user = User.objects.order_by('-id').values_list('id', flat=True)\
+        .first() or 0
+    User.objects.bulk_create(
+        User(username=f'bench{first_user + number}', password=password,
+             email=f'bench{first_user + number}@example.com',
+             first_name=rng.choice(WORDS), last_name=rng.choice(TOWNS))
+        for number in range(users))
+    user_ids = list(User.objects.filter(id__gt=first_user)
+                    .order_by('id').values_list('id', flat=True))
+    bikes = Bike.objects.bulk_create(
+        Bike(brand=rng.choice(('Trek', 'Giant', 'Canyon', 'Kross')),
+             model=rng.choice(WORDS), bike_type=rng.choice(CATEGORY_NAME)[0],
+             weight=round(rng.uniform(6.5, 15), 1))
+        for _ in user_ids)
+    Profile.objects.bulk_create(
+        Profile(user_id=user_id, bike=bike, age=rng.randint(16, 70),
+                weight=rng.randint(50, 100),
+                region=rng.choice(VOIVODESHIP_NAME)[0])
+        for user_id, bike in zip(user_ids, bikes))
+    profile_ids = list(Profile.objects.filter(user_id__in=user_ids)
+                       .order_by('id').values_list('id', flat=True))
+
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    new_events = [
+        Event(event_name=f'{rng.choice(WORDS)} {rng.choice(TOWNS)} '
+                         f'{number}',
+              event_type=rng.choice(EVENT_TYPE)[0],
+              limit=rng.randint(participants + 1, participants * 3 + 2),
+              distance=rng.randint(20, 300),
+              route_description=' '.join(rng.choices(WORDS + TOWNS, k=12)),
+              date=today + datetime.timedelta(days=rng.randint(1, 365)),
+              start=rng.choice(TOWNS), finish=rng.choice(TOWNS),
+              region_name=rng.choice(regions),
+              categories=rng.choice(categories),
+              event_creator_id=rng.choice(user_ids))
+        for number in range(events)]
+    for event in new_events:
+        locate_event(event)
+    Event.objects.bulk_create(new_events)
+    event_ids = list(Event.objects.order_by('-id')
+                     .values_list('id', flat=True)[:events])
+
+    Participant = Event.event_participant.through
+    rows = []
+    for event_id in event_ids:
+        count = rng.randint(0, min(participants, len(profile_ids)))
+        rows.extend(Participant(event_id=event_id, profile_id=profile_id)
+                    for profile_id in rng.sample(profile_ids, count))
+    Participant.objects.bulk_create(rows, batch_size=2000)
+    Event.objects.filter(id__in=event_ids)\
+        .update(participant_count=participant_count_subquery())
+    update_search_vectors(Event.objects.filter(id__in=event_ids))
+
+    user = User.objects.get(id=user_ids[0])
+    own_event = Event.objects.filter(id__in=event_ids)\
+        .exclude(event_participant=user.profile).order_by('id').first()
+    own_event.event_creator = user
+    own_event.save()
+    joined_event = Event.objects.filter(id__in=event_ids)\
+        .exclude(id=own_event.id).order_by('id').first()
+    joined_event.event_participant.add(user.profile)
+    event = Event.objects.filter(id__in=event_ids)\
+        .exclude(id__in=(own_event.id, joined_event.id))\
+        .exclude(event_participant=user.profile)\
+        .order_by('-participant_count', 'id').first()
+    return Dataset(
+        user=user, event=event, own_event=own_event,
+        joined_event=joined_event, bike=user.profile.bike,
+        profile=user.profile,
+        sizes={'users': users, 'events': events,
+               'participants': participants})
+
+
+def event_form_data(dataset, edit=False):
+    """
+    Return POST data of AddEventForm (choice values of region and category)
+    or EditEventForm (their ids).
+    """
+    event = dataset.own_event
+    date = timezone.now().date() + datetime.timedelta(days=30)
+    data = {'event_name': 'Edited' if edit else 'Benchmark',
+            'event_type': 1, 'limit': 50, 'date_year': date.year,
+            'date_month': date.month, 'date_day': date.day, 'distance': 100,
+            'route_description': 'pętla wokół miasta',
+            'start': 'Kraków', 'finish': 'Tarnów'}
+    if edit:
+        data.update(region_name=event.region_name_id,
+                    categories=event.categories_id)
+    else:
+        data.update(region_name=event.region_name.voivodeship_name,
+                    categories=event.categories.category_name)
+    return data
+
+
+def import_file(dataset):
+    date = (timezone.now().date() + datetime.timedelta(days=60)).isoformat()
+    lines = ['event_name,event_type,limit,date,distance,route_description,'
+             'start,finish,region_name,categories']
+    lines += [f'Import {number},1,100,{date},120,opis,Kraków,Tarnów,6,1'
+              for number in range(50)]
+    return SimpleUploadedFile('events.csv', '\n'.join(lines).encode(),
+                              'text/csv')
+
+
+def gpx_file(dataset, points=2000):
+    """
+    Return GPX track of a loop around Kraków.
+    """
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<gpx version="1.1" creator="benchmark" '
+             'xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>']
+    for number in range(points):
+        angle = 2 * math.pi * number / points
+        lines.append(f'<trkpt lat="{50.06 + 0.2 * math.sin(angle):.6f}" '
+                     f'lon="{19.94 + 0.3 * math.cos(angle):.6f}">'
+                     f'<ele>{250 + 40 * math.sin(7 * angle):.1f}</ele>'
+                     f'</trkpt>')
+    lines.append('</trkseg></trk></gpx>')
+    return SimpleUploadedFile('route.gpx', '\n'.join(lines).encode(),
+                              'application/gpx+xml')
+
+
+class Scenario:
+    """
+    Single benchmarked request.
+    :param name: unique name used in results and baselines
+    :param url: function of the Dataset returning URL of the request
+    :param method: HTTP method
+    :param data: function of the Dataset returning request data
+    :param login: send the request as the benchmark user
+    :param json_body: send data encoded as JSON
+    """
+    def __init__(self, name, url, method='get', data=None, login=True,
+                 json_body=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.login = login
+        self.json_body = json_body
+
+    def request(self, client, dataset):
+        data = self.data(dataset) if self.data else {}
+        kwargs = {}
+        if self.json_body:
+            data = json.dumps(data, default=str)
+            kwargs['content_type'] = 'application/json'
+        send = getattr(client, self.method)
+        if isinstance(client, AsyncClient):
+            # every request gets its own context, as on a server
+            send = functools.partial(contextvars.copy_context().run,
+                                     async_to_sync(send))
+        response = send(self.url(dataset), data, **kwargs)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+
+def url(name, *attributes):
+    """
+    Return function building URL of the route with ids of dataset objects.
+    """
+    def build(dataset):
+        ids = [getattr(dataset, attribute).id for attribute in attributes]
+        return reverse(name, args=ids)
+    return build
+
+
+SCENARIOS = [
+    Scenario('login page', lambda dataset: '/', login=False),
+    Scenario('login form', url('login'), login=False),
+    Scenario('login', url('login'), 'post', login=False,
+             data=lambda dataset: {'username': dataset.user.username,
+                                   'password': BENCHMARK_PASSWORD}),
+    Scenario('logout', url('logout')),
+    Scenario('register form', url('register'), login=False),
+    Scenario('register', url('register'), 'post', login=False,
+             data=lambda dataset: {
+                 'username': 'new_rider', 'password1': 'Tr3kEmonda!x',
+                 'password2': 'Tr3kEmonda!x', 'first_name': 'Jan',
+                 'last_name': 'Kowalski', 'email': 'jan@example.com'}),
+    Scenario('main page', url('main')),
+    Scenario('events', url('events')),
+    Scenario('events filtered', url('events'),
+             data=lambda dataset: {
+                 'region_name': dataset.event.region_name.voivodeship_name,
+                 'event_type': dataset.event.event_type}),
+    Scenario('events near', url('events'),
+             data=lambda dataset: {'near': 'Kraków', 'radius': 50}),
+    Scenario('events filter form', url('events'), 'post',
+             data=lambda dataset: {'event_type': 1}),
+    Scenario('search', url('search'), data=lambda dataset: {'q': 'gravel'}),
+    Scenario('add event form', url('add-events')),
+    Scenario('add event', url('add-events'), 'post', data=event_form_data),
+    Scenario('import events form', url('import-events')),
+    Scenario('import events', url('import-events'), 'post',
+             data=lambda dataset: {'file': import_file(dataset)}),
+    Scenario('profile', url('profile')),
+    Scenario('edit profile form', url('edit-profile')),
+    Scenario('edit profile', url('edit-profile'), 'post',
+             data=lambda dataset: {'first_name': 'Jan', 'last_name': 'Nowak',
+                                   'email': 'jan@example.com', 'age': 30,
+                                   'weight': 70, 'region': 6}),
+    Scenario('event details', url('event-details', 'event')),
+    Scenario('event signup', url('event-signup', 'event')),
+    Scenario('edit event form', url('edit-event', 'own_event')),
+    Scenario('edit event', url('edit-event', 'own_event'), 'post',
+             data=lambda dataset: event_form_data(dataset, edit=True)),
+    Scenario('event route form', url('event-route', 'own_event')),
+    Scenario('event route', url('event-route', 'own_event'), 'post',
+             data=lambda dataset: {'gpx': gpx_file(dataset)}),
+    Scenario('my events', url('my-events')),
+    Scenario('event resignation', url('event-resignation', 'joined_event')),
+    Scenario('waitlist resignation', url('waitlist-resignation', 'event')),
+    Scenario('participants', url('participants', 'event')),
+    Scenario('participants export',
+             url('participants-export', 'own_event')),
+    Scenario('add bike form', url('add-bike')),
+    Scenario('add bike', url('add-bike'), 'post',
+             data=lambda dataset: {'brand': 'Trek', 'model': 'Emonda',
+                                   'bike_type': 1, 'weight': 8}),
+    Scenario('bike details', url('bike_details', 'bike')),
+    Scenario('edit bike form', url('edit-bike', 'bike')),
+    Scenario('edit bike', url('edit-bike', 'bike'), 'post',
+             data=lambda dataset: {'brand': 'Giant', 'model': 'TCR',
+                                   'bike_type': 1, 'weight': 7.5}),
+    Scenario('contact', url('contact')),
+    Scenario('api events', url('api-events')),
+    Scenario('api create event', url('api-events'), 'post', json_body=True,
+             data=lambda dataset: {
+                 'event_name': 'API', 'event_type': 1, 'limit': 10,
+                 'date': timezone.now().date() + datetime.timedelta(days=9),
+                 'distance': 50, 'route_description': 'opis',
+                 'start': 'Kraków', 'finish': 'Tarnów',
+                 'region_name': 6, 'categories': 1}),
+    Scenario('api events bbox', url('api-events'),
+             data=lambda dataset: {'bbox': '49,18,51,21'}),
+    Scenario('api events export', url('api-events-export')),
+    Scenario('api event', url('api-event', 'event')),
+    Scenario('api edit event', url('api-event', 'own_event'), 'patch',
+             json_body=True, data=lambda dataset: {'limit': 500}),
+    Scenario('api event signup', url('api-event-signup', 'event'), 'post'),
+    Scenario('api leave waitlist', url('api-event-waitlist', 'event'),
+             'delete'),
+    Scenario('api own profile', url('api-own-profile')),
+    Scenario('api profile', url('api-profile', 'profile')),
+    Scenario('api bikes', url('api-bikes'), 'post', json_body=True,
+             data=lambda dataset: {'brand': 'Kross', 'model': 'Vento',
+                                   'bike_type': 1, 'weight': 9}),
+    Scenario('api bike', url('api-bike', 'bike')),
+    Scenario('metrics', url('metrics'), login=False),
+    Scenario('region calendar',
+             lambda dataset: reverse('region-calendar', kwargs={
+                 'id': dataset.event.region_name_id}), login=False),
+    Scenario('user calendar',
+             lambda dataset: reverse('user-calendar', kwargs={
+                 'token': user_token(dataset.user.id)}), login=False),
+]
+
+
+def application_routes(patterns=None, prefix=''):
+    """
+    Return routes of the URLconf, without the admin and media files.
+    """
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    routes = []
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if route.lstrip('^').startswith(SKIPPED_ROUTES):
+            continue
+        if isinstance(pattern, URLResolver):
+            routes += application_routes(pattern.url_patterns, route)
+        elif isinstance(pattern, URLPattern):
+            routes.append(route)
+    return routes
+
+
+def uncovered_routes(dataset, scenarios=SCENARIOS):
+    """
+    Return routes of the URLconf which no scenario requests.
+    """
+    covered = {resolve(scenario.url(dataset).split('?')[0]).route
+               for scenario in scenarios}
+    return [route for route in application_routes() if route not in covered]
+
+
+def percentile(values, percent):
+    """
+    Return nearest-rank percentile of the values.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class ScenarioFailed(Exception):
+    pass
+
+
+def run_once(client, scenario, dataset, cold_cache):
+    """
+    Send request of the scenario in a transaction which is rolled back,
+    so every iteration sees the same data.
+    :return: tuple (response, seconds, number of queries)
+    """
+    if cold_cache:
+        cache.clear()
+    if scenario.login:
+        client.force_login(dataset.user)
+    else:
+        client.logout()
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    # collect garbage of previous requests outside of the measured time
+    gc.collect()
+    with transaction.atomic():
+        with connection.execute_wrapper(count_query):
+            start = time.perf_counter()
+            response = scenario.request(client, dataset)
+            elapsed = time.perf_counter() - start
+        transaction.set_rollback(True)
+    if response.status_code >= 400:
+        raise ScenarioFailed(
+            f'{scenario.name}: status {response.status_code}')
+    return response, elapsed, len(queries)
+
+
+class BenchmarkAsyncClient(AsyncClient):
+    """
+    AsyncClient passing request bodies as files, like ASGI servers do
+    (FakePayload of Django 4.0 rejects reads of the multipart parser
+    beyond the end of the body).
+    """
+    async def request(self, **request):
+        if '_body_file' in request:
+            request['_body_file'] = io.BytesIO(request['_body_file'].read())
+        return await super().request(**request)
+
+
+# server modes: wsgi requests go through the WSGI handler and the
+# synchronous middleware chain, asgi requests through the ASGI one
+# with async views served on the event loop
+CLIENTS = {'wsgi': Client, 'asgi': BenchmarkAsyncClient}
+
+
+def run_scenario(scenario, dataset, iterations=20, warmup=2,
+                 cold_cache=False, mode='wsgi'):
+    """
+    Benchmark scenario.
+    :param mode: wsgi or asgi
+    :return: dict with latency percentiles (ms), query count
+        and peak memory (KiB) of a single request
+    """
+    client = CLIENTS[mode]()
+    timings = []
+    query_counts = []
+    for iteration in range(warmup + iterations):
+        _, elapsed, query_count = run_once(client, scenario, dataset,
+                                           cold_cache)
+        if iteration >= warmup:
+            timings.append(elapsed)
+            query_counts.append(query_count)
+
+    # tracemalloc.reset_peak() needs Python 3.9, a new trace starts
+    # with zero peak on the 3.8 runtime too
+    tracing = tracemalloc.is_tracing()
+    frames = tracemalloc.get_traceback_limit()
+    tracemalloc.stop()
+    tracemalloc.start()
+    try:
+        response, _, _ = run_once(client, scenario, dataset, cold_cache)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        if tracing:
+            tracemalloc.start(frames)
+
+    return {'status': response.status_code,
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'queries': max(query_counts),
+            'peak_memory_kb': round(peak / 1024, 1)}
+
+
+def run_benchmark(dataset, scenarios=SCENARIOS, iterations=20, warmup=2,
+                  cold_cache=False, only=None, mode='wsgi'):
+    """
+    Benchmark scenarios.
+    :param only: names of scenarios to run (all by default)
+    :param mode: wsgi or asgi
+    :return: dict scenario name -> results
+    """
+    return {scenario.name: run_scenario(scenario, dataset, iterations,
+                                        warmup, cold_cache, mode)
+            for scenario in scenarios
+            if not only or scenario.name in only}
+
+
+def make_baseline(results, dataset):
+    return {'dataset': dataset.sizes,
+            'scenarios': {name: {key: result[key] for key in
+                                 ('p95_ms', 'queries', 'peak_memory_kb')}
+                          for name, result in results.items()}}
+
+
+# absolute noise allowed on top of the relative tolerance
+CHECK_SLACK = {'p95_ms': 5, 'peak_memory_kb': 64}
+
+
+def check_baseline(results, baseline, tolerance=1.0):
+    """
+    Compare results with the baseline.
+    Query counts must not grow, latency and memory may grow by
+    the tolerance (1.0 = 100%) plus CHECK_SLACK to absorb noise.
+    :return: list of messages describing exceeded budgets
+    """
+    violations = []
+    for name, result in results.items():
+        budget = baseline['scenarios'].get(name)
+        if budget is None:
+            continue
+        if result['queries'] > budget['queries']:
+            violations.append(f'{name}: {result["queries"]} queries, '
+                              f'budget {budget["queries"]}')
+        for key, unit in (('p95_ms', 'ms'), ('peak_memory_kb', 'KiB')):
+            limit = budget[key] * (1 + tolerance) + CHECK_SLACK[key]
+            if result[key] > limit:
+                violations.append(f'{name}: {key} {result[key]} {unit}, '
+                                  f'budget {limit:.1f} {unit}')
+    return violations
@@ -0,0 +1,123 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Event, Region, Category
+from .routers import reads_from_replica
+
+EVENT_LIST_VERSION_KEY = 'events:list:version'
+EVENT_VERSION_KEY = 'events:event:{}:version'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def event_list_version():
+    """
+    Return current version of the events list.
+    Versions are timestamps, so a version key evicted from the cache
+    is recreated with a value newer than any fragment stored before.
+    """
+    return cache.get_or_set(EVENT_LIST_VERSION_KEY, _new_version, None)
+
+
+def event_version(event_id):
+    """
+    Return current version of a single event.
+    """
+    return cache.get_or_set(EVENT_VERSION_KEY.format(event_id),
+                            _new_version, None)
+
+
+def make_key(prefix, version, *parts):
+    """
+    Build cache key from prefix, version and any request parameters.
+    """
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'{prefix}:{version}:{digest}'
+
+
+def cache_timeout():
+    """
+    Return seconds for which values and template fragments computed
+    by the current request are cached. Values read from a replica may
+    miss the latest changes, so they are kept only for REPLICA_PIN_SECONDS.
+    """
+    timeout = settings.EVENT_CACHE_TIMEOUT
+    if reads_from_replica():
+        timeout = min(timeout, settings.REPLICA_PIN_SECONDS)
+    return timeout
+
+
+def get_or_compute(key, compute):
+    """
+    Return value stored under key, computing and storing it on a miss.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, cache_timeout())
+    return value
+
+
+def _bump(event_ids):
+    versions = {EVENT_LIST_VERSION_KEY: _new_version()}
+    for event_id in event_ids:
+        versions[EVENT_VERSION_KEY.format(event_id)] = _new_version()
+    cache.set_many(versions, None)
+
+
+def invalidate_events(*event_ids):
+    """
+    Invalidate cached events list and the given events.
+    Versions are bumped right away and once more after the transaction
+    commits, so a request reading between the two can not leave
+    uncommitted state in the cache.
+    """
+    _bump(event_ids)
+    transaction.on_commit(lambda: _bump(event_ids))
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_saved_event(sender, instance, **kwargs):
+    """
+    Invalidate event after create, edit or delete.
+    """
+    invalidate_events(instance.pk)
+
+
+@receiver(m2m_changed, sender=Event.event_participant.through)
+def invalidate_event_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidate events after their participants changed.
+    """
+    if not reverse:
+        event_ids = [instance.pk]
+    elif action == 'pre_clear':
+        instance._cleared_event_ids = list(
+            instance.event_set.values_list('id', flat=True))
+        return
+    elif action == 'post_clear':
+        event_ids = getattr(instance, '_cleared_event_ids', [])
+    else:
+        event_ids = pk_set or []
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_events(*event_ids)
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_reference_data(sender, **kwargs):
+    """
+    Invalidate events list after region or category changed.
+    """
+    invalidate_events()
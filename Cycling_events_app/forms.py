@@ -1,10 +1,15 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.db.models import F
 from django.forms import PasswordInput
+from django.forms.models import ModelChoiceIterator
+from django.utils import timezone
 import datetime
 from Cycling_events_app.models import EVENT_TYPE, VOIVODESHIP_NAME,\
     CATEGORY_NAME, Profile, Event, Bike
+from Cycling_events_app import geo, gpx, reference
 
 User = get_user_model()
 
@@ -31,6 +36,16 @@ def only_positive_distance(value):
     return value
 
 
+def start_of_day(value):
+    """
+    Convert date to aware datetime at midnight
+    :param value: date
+    :return: datetime
+    """
+    return timezone.make_aware(
+        datetime.datetime.combine(value, datetime.time.min))
+
+
 class UserForm(forms.Form):
     """Form to log in user"""
     username = forms.CharField(label='login')
@@ -101,8 +116,57 @@ class ProfileDetailsForm(forms.ModelForm):
         }
 
 
+class CachedChoiceIterator(ModelChoiceIterator):
+    """
+    Iterate choices of CachedModelChoiceField.
+    """
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.reference.all():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.reference.all()) + \
+            (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    Choice of region or category served from the reference cache
+    instead of querying the database on every render and validation.
+    """
+    iterator = CachedChoiceIterator
+
+    def __init__(self, reference, **kwargs):
+        self.reference = reference
+        super().__init__(queryset=reference.model.objects.none(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.reference.by_pk(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
 class EditEventForm(forms.ModelForm):
     """Form to update event."""
+    region_name = CachedModelChoiceField(reference.regions,
+                                         label='Województwo')
+    categories = CachedModelChoiceField(reference.categories,
+                                        label='Typ roweru')
 
     class Meta:
         model = Event
@@ -126,11 +190,178 @@ class EditEventForm(forms.ModelForm):
         widgets = {'date': forms.SelectDateWidget()}
 
 
+def optional_choices(choices):
+    """
+    Prepend empty choice meaning 'any value'
+    :param choices:
+    :return: choices
+    """
+    return (('', 'dowolny'),) + tuple(choices)
+
+
 class FilterEventsForm(forms.Form):
-    """Form to filter event."""
-    region_name = forms.ChoiceField(choices=VOIVODESHIP_NAME, label="Region")
-    event_type = forms.ChoiceField(choices=EVENT_TYPE, label="Typ wydarzenia")
-    categories = forms.ChoiceField(choices=CATEGORY_NAME, label="Typ roweru")
+    """Form to filter event. Every field is optional."""
+    region_name = forms.TypedChoiceField(
+        choices=optional_choices(VOIVODESHIP_NAME), coerce=int,
+        empty_value=None, required=False, label="Region")
+    event_type = forms.TypedChoiceField(
+        choices=optional_choices(EVENT_TYPE), coerce=int,
+        empty_value=None, required=False, label="Typ wydarzenia")
+    categories = forms.TypedChoiceField(
+        choices=optional_choices(CATEGORY_NAME), coerce=int,
+        empty_value=None, required=False, label="Typ roweru")
+    date_from = forms.DateField(
+        required=False, label="Data od",
+        widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(
+        required=False, label="Data do",
+        widget=forms.DateInput(attrs={'type': 'date'}))
+    distance_min = forms.FloatField(
+        required=False, min_value=0, label="Dystans od (km)")
+    distance_max = forms.FloatField(
+        required=False, min_value=0, label="Dystans do (km)")
+    free_only = forms.BooleanField(
+        required=False, label="Tylko z wolnymi miejscami")
+    near = forms.CharField(
+        max_length=100, required=False, label="Start w pobliżu",
+        help_text="Miejscowość lub współrzędne, np. 50.06, 19.94")
+    radius = forms.FloatField(
+        required=False, min_value=1, max_value=500,
+        label="Promień (km)", help_text="Domyślnie 50 km")
+    bbox = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    default_radius = 50
+
+    def clean_near(self):
+        """
+        Return coordinates of the place or None.
+        """
+        near = self.cleaned_data['near']
+        if not near:
+            return None
+        location = geo.geocode(near)
+        if location is None:
+            raise forms.ValidationError("Nie znaleziono takiej miejscowości.")
+        return location
+
+    def clean_bbox(self):
+        """
+        Return area "south,west,north,east" as a tuple of floats or None.
+        """
+        bbox = self.cleaned_data['bbox']
+        if not bbox:
+            return None
+        try:
+            south, west, north, east = (float(value)
+                                        for value in bbox.split(','))
+        except ValueError:
+            raise forms.ValidationError(
+                "Obszar należy podać jako: południe,zachód,północ,wschód.")
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise forms.ValidationError("Niepoprawny obszar.")
+        return south, west, north, east
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError(
+                "Data początkowa nie może być późniejsza niż końcowa.")
+        distance_min = cleaned_data.get('distance_min')
+        distance_max = cleaned_data.get('distance_max')
+        if distance_min is not None and distance_max is not None \
+                and distance_min > distance_max:
+            raise forms.ValidationError(
+                "Minimalny dystans nie może być większy od maksymalnego.")
+        return cleaned_data
+
+    def get_filters(self):
+        """
+        Return lookups of the filled in fields only,
+        so the queryset is filtered once with the active predicates.
+        :return: dict of lookups
+        """
+        data = self.cleaned_data
+        filters = {}
+        if data.get('region_name') is not None:
+            filters['region_name__in'] = reference.regions.pks_for_value(
+                data['region_name'])
+        if data.get('categories') is not None:
+            filters['categories__in'] = reference.categories.pks_for_value(
+                data['categories'])
+        if data.get('event_type') is not None:
+            filters['event_type'] = data['event_type']
+        if data.get('date_from'):
+            filters['date__gte'] = start_of_day(data['date_from'])
+        if data.get('date_to'):
+            filters['date__lt'] = start_of_day(
+                data['date_to'] + datetime.timedelta(days=1))
+        if data.get('distance_min') is not None:
+            filters['distance__gte'] = data['distance_min']
+        if data.get('distance_max') is not None:
+            filters['distance__lte'] = data['distance_max']
+        if data.get('free_only'):
+            filters['participant_count__lt'] = F('limit')
+        area = None
+        if data.get('near'):
+            area = geo.events_near(
+                *data['near'], data.get('radius') or self.default_radius)
+        if data.get('bbox'):
+            area = (area if area is not None else Event.objects)\
+                .filter(geo.in_bbox(*data['bbox']))
+        if area is not None:
+            # geohash cells and distance are evaluated in a subquery,
+            # so the lookups stay a plain dict like the other filters
+            filters['id__in'] = area.values('id')
+        return filters
+
+    def get_query(self):
+        """
+        Return query string parameters of the filled in fields built from
+        the cleaned data, so links repeat only the validated filters.
+        :return: dict of parameters
+        """
+        query = {}
+        for name, value in self.cleaned_data.items():
+            if value in (None, False, ''):
+                continue
+            if name in ('near', 'bbox'):
+                value = ','.join(f'{number:.6f}' for number in value)
+            elif value is True:
+                value = 'on'
+            query[name] = str(value)
+        return query
+
+
+class SearchEventsForm(forms.Form):
+    """Form to search events by name, route and places."""
+    q = forms.CharField(max_length=200, label="Szukaj")
+
+
+class ImportEventsForm(forms.Form):
+    """Form to upload CSV or JSON file with events."""
+    file = forms.FileField(label="Plik CSV lub JSON")
+
+
+class EventRouteForm(forms.Form):
+    """Form to upload GPX track of the event."""
+    gpx = forms.FileField(label="Plik GPX")
+
+    def clean_gpx(self):
+        """
+        Parse the track, its statistics are kept in self.stats.
+        """
+        upload = self.cleaned_data['gpx']
+        if upload.size > settings.GPX_MAX_SIZE:
+            raise forms.ValidationError(
+                f"Plik GPX może mieć najwyżej "
+                f"{settings.GPX_MAX_SIZE // 2 ** 20} MB.")
+        try:
+            self.stats = gpx.analyze(upload)
+        except gpx.GpxError as error:
+            raise forms.ValidationError(str(error))
+        return upload
 
 
 class AddBikeForm(forms.ModelForm):
@@ -0,0 +1,189 @@
+import csv
+import math
+import os
+import re
+import threading
+
+from django.db.models import F, Q
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Event
+from .text import tokenize
+
+TOWNS_FILE = os.path.join(os.path.dirname(__file__), 'data', 'towns_pl.csv')
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# stored precision, about 38 x 19 m
+GEOHASH_PRECISION = 8
+# maximal number of geohash cells of a single area query
+MAX_CELLS = 16
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+COORDINATES_RE = re.compile(
+    r'^\s*(-?\d{1,2}(?:\.\d+)?)\s*[,; ]\s*(-?\d{1,3}(?:\.\d+)?)\s*$')
+
+_towns = None
+_towns_lock = threading.Lock()
+
+
+def town_key(name):
+    return ' '.join(tokenize(name))
+
+
+def load_towns():
+    """
+    Return dict normalized town name -> (lat, lon) read from TOWNS_FILE.
+    """
+    global _towns
+    if _towns is None:
+        with _towns_lock:
+            if _towns is None:
+                with open(TOWNS_FILE, encoding='utf-8') as file:
+                    _towns = {town_key(row['name']):
+                              (float(row['lat']), float(row['lon']))
+                              for row in csv.DictReader(file)}
+    return _towns
+
+
+def geocode(text):
+    """
+    Return coordinates of the town mentioned in the text, e.g.
+    "Kraków, Rynek Główny" or "parking - Bielsko-Biała" (the longest
+    matching town name wins), or coordinates written as "50.06, 19.94".
+    :return: tuple (lat, lon) or None
+    """
+    match = COORDINATES_RE.match(text or '')
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lat, lon
+        return None
+    towns = load_towns()
+    words = tokenize(text)
+    for length in range(min(len(words), 4), 0, -1):
+        for start in range(len(words) - length + 1):
+            location = towns.get(' '.join(words[start:start + length]))
+            if location:
+                return location
+    return None
+
+
+def _cell_bits(precision):
+    bits = precision * 5
+    return bits // 2, bits - bits // 2
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Return geohash of the point, nearby points share its prefixes.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    value = bit = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            value = bit = 0
+    return ''.join(chars)
+
+
+def bbox_cells(south, west, north, east):
+    """
+    Return geohash prefixes of cells covering the bounding box,
+    with the finest precision needing at most MAX_CELLS cells.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_bits, lon_bits = _cell_bits(precision)
+        height, width = 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+        rows = math.floor((north + 90) / height) \
+            - math.floor((south + 90) / height) + 1
+        columns = math.floor((east + 180) / width) \
+            - math.floor((west + 180) / width) + 1
+        if rows * columns > MAX_CELLS and precision > 1:
+            continue
+        cells = set()
+        first_row = math.floor((south + 90) / height)
+        first_column = math.floor((west + 180) / width)
+        for row in range(rows):
+            lat = min(-90 + (first_row + row + 0.5) * height, 90)
+            for column in range(columns):
+                lon = min(-180 + (first_column + column + 0.5) * width, 180)
+                cells.add(encode_geohash(lat, lon, precision))
+        return sorted(cells)
+
+
+def radius_bbox(lat, lon, radius_km):
+    """
+    Return bounding box (south, west, north, east) of the circle.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlon = radius_km / (KM_PER_DEGREE_LON
+                        * max(math.cos(math.radians(lat)), 0.01))
+    return (max(lat - dlat, -90), max(lon - dlon, -180),
+            min(lat + dlat, 90), min(lon + dlon, 180))
+
+
+def in_bbox(south, west, north, east, prefix='start'):
+    """
+    Return condition selecting events located in the bounding box,
+    geohash cells narrow the rows through the index first.
+    """
+    cells = Q()
+    for cell in bbox_cells(south, west, north, east):
+        cells |= Q(**{f'{prefix}_geohash__startswith': cell})
+    return cells & Q(**{f'{prefix}_lat__range': (south, north),
+                        f'{prefix}_lon__range': (west, east)})
+
+
+def events_in_bbox(south, west, north, east, prefix='start'):
+    return Event.objects.filter(in_bbox(south, west, north, east, prefix))
+
+
+def events_near(lat, lon, radius_km, prefix='start'):
+    """
+    Return events starting (or finishing) within radius_km of the point.
+    Distance is computed in SQL with the equirectangular approximation,
+    which is accurate to a fraction of a percent at the scale of Poland.
+    """
+    kx = KM_PER_DEGREE_LON * math.cos(math.radians(lat))
+    ky = KM_PER_DEGREE_LAT
+    dx = (F(f'{prefix}_lon') - lon) * kx
+    dy = (F(f'{prefix}_lat') - lat) * ky
+    return events_in_bbox(*radius_bbox(lat, lon, radius_km), prefix=prefix)\
+        .alias(distance_square=dx * dx + dy * dy)\
+        .filter(distance_square__lte=radius_km ** 2)
+
+
+def locate_event(event):
+    """
+    Fill coordinates and geohashes of the event start and finish
+    from the towns table.
+    """
+    for prefix in ('start', 'finish'):
+        location = geocode(getattr(event, prefix))
+        lat, lon = location or (None, None)
+        setattr(event, f'{prefix}_lat', lat)
+        setattr(event, f'{prefix}_lon', lon)
+        setattr(event, f'{prefix}_geohash',
+                encode_geohash(lat, lon) if location else '')
+
+
+@receiver(pre_save, sender=Event)
+def locate_saved_event(sender, instance, update_fields=None, **kwargs):
+    """
+    Geocode event before it is saved (bulk_create callers use
+    locate_event themselves).
+    """
+    if update_fields is None or {'start', 'finish'} & set(update_fields):
+        locate_event(instance)
@@ -0,0 +1,198 @@
+import json
+import math
+from array import array
+from xml.etree.ElementTree import iterparse, ParseError
+
+import numpy as np
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .images import delete_files
+from .models import EventRoute
+from .tasks import submit_on_commit
+
+EARTH_RADIUS_M = 6371000.0
+# climbs smaller than this are treated as GPS noise
+ELEVATION_THRESHOLD_M = 3.0
+# maximal distance of the simplified polyline from the track
+SIMPLIFY_TOLERANCE_M = 10.0
+POINT_TAGS = ('trkpt', 'rtept')
+
+
+class GpxError(ValueError):
+    """
+    Raised when the uploaded file is not a GPX track.
+    """
+
+
+class RouteStats:
+    """
+    Values computed from a GPX track.
+    """
+    def __init__(self, points, distance, elevation_gain, bbox, polyline):
+        self.points = points
+        self.distance = distance
+        self.elevation_gain = elevation_gain
+        self.bbox = bbox
+        self.polyline = polyline
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_points(stream):
+    """
+    Yield (lat, lon, elevation or None) of track (or route) points.
+    Every element is removed from its parent as soon as it is read,
+    so memory does not depend on the size of the file.
+    """
+    elevation = None
+    open_elements = []
+    try:
+        for event, element in iterparse(stream, events=('start', 'end')):
+            if event == 'start':
+                if not open_elements and local_name(element.tag) != 'gpx':
+                    raise GpxError('Plik nie jest plikiem GPX.')
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            name = local_name(element.tag)
+            if name == 'ele':
+                try:
+                    elevation = float(element.text)
+                except (TypeError, ValueError):
+                    elevation = None
+            elif name in POINT_TAGS:
+                try:
+                    lat = float(element.get('lat'))
+                    lon = float(element.get('lon'))
+                except (TypeError, ValueError):
+                    raise GpxError('Punkt trasy bez poprawnych współrzędnych.')
+                yield lat, lon, elevation
+                elevation = None
+            if open_elements:
+                open_elements[-1].remove(element)
+    except ParseError as error:
+        raise GpxError(f'Niepoprawny plik GPX: {error}')
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Return distance of two points in meters.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) \
+        * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def simplify(lats, lons, tolerance=SIMPLIFY_TOLERANCE_M):
+    """
+    Return indexes of points kept by the Douglas-Peucker algorithm.
+    Points are projected to meters around the track, distances of all
+    points of a segment to its chord are computed at once with NumPy.
+    """
+    count = len(lats)
+    if count < 3:
+        return np.arange(count)
+    lat0 = math.radians(float(lats.mean()))
+    y = np.radians(lats) * EARTH_RADIUS_M
+    x = np.radians(lons) * EARTH_RADIUS_M * math.cos(lat0)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(px * dy - py * dx) / length
+        index = int(distances.argmax())
+        if distances[index] > tolerance:
+            middle = first + 1 + index
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return np.flatnonzero(keep)
+
+
+def analyze(stream, tolerance=SIMPLIFY_TOLERANCE_M):
+    """
+    Read GPX track and compute its statistics in a single pass.
+    Coordinates are kept in compact arrays only for the simplification.
+    :return: RouteStats
+    """
+    lats, lons = array('d'), array('d')
+    distance = gain = 0.0
+    reference = None
+    previous = None
+    for lat, lon, elevation in iter_points(stream):
+        lats.append(lat)
+        lons.append(lon)
+        if previous is not None:
+            distance += haversine(previous[0], previous[1], lat, lon)
+        previous = lat, lon
+        if elevation is not None:
+            # hysteresis: count a climb only once it exceeds the threshold
+            if reference is None or elevation < reference:
+                reference = elevation
+            elif elevation - reference >= ELEVATION_THRESHOLD_M:
+                gain += elevation - reference
+                reference = elevation
+    if len(lats) < 2:
+        raise GpxError('Plik GPX musi zawierać co najmniej dwa punkty trasy.')
+    lats = np.frombuffer(lats, dtype=np.float64)
+    lons = np.frombuffer(lons, dtype=np.float64)
+    kept = simplify(lats, lons, tolerance)
+    polyline = [[round(float(lats[index]), 5), round(float(lons[index]), 5)]
+                for index in kept]
+    bbox = (float(lats.min()), float(lons.min()),
+            float(lats.max()), float(lons.max()))
+    return RouteStats(len(lats), distance / 1000, gain, bbox, polyline)
+
+
+def dump_polyline(polyline):
+    return json.dumps(polyline, separators=(',', ':'))
+
+
+def save_route(event, upload, stats):
+    """
+    Store uploaded GPX file of the event with its statistics
+    and replace the event distance with the measured one.
+    :param stats: RouteStats of the upload returned by analyze
+    """
+    upload.seek(0)
+    with transaction.atomic():
+        route = EventRoute.objects.select_for_update()\
+            .filter(event=event).first()
+        old_name = route.gpx.name if route else ''
+        if route is None:
+            route = EventRoute(event=event)
+        route.gpx.save(upload.name, upload, save=False)
+        route.points = stats.points
+        route.distance = stats.distance
+        route.elevation_gain = stats.elevation_gain
+        route.south, route.west, route.north, route.east = stats.bbox
+        route.polyline = dump_polyline(stats.polyline)
+        route.save()
+        event.distance = round(stats.distance, 1)
+        event.save(update_fields=['distance', 'modified'])
+        if old_name:
+            submit_on_commit(delete_files, route.gpx.storage, [old_name])
+    return route
+
+
+@receiver(post_delete, sender=EventRoute)
+def release_route(sender, instance, **kwargs):
+    """
+    Release GPX file of a deleted route.
+    """
+    submit_on_commit(delete_files, instance.gpx.storage, [instance.gpx.name])
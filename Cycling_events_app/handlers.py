@@ -0,0 +1,76 @@
+from itertools import islice
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .middleware import AsyncCapableMiddleware
+
+# parts of a streaming response read in a single worker thread hop
+STREAM_BATCH = 256
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler which reads streaming responses in a worker thread.
+    Django 4.0 iterates them on the event loop, where the ORM queries
+    of the CSV, JSON and iCalendar exports are not allowed.
+    """
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        parts = iter(response)
+        read_batch = sync_to_async(lambda: list(islice(parts, STREAM_BATCH)),
+                                   thread_sensitive=True)
+        # Django sends the headers and an empty body, the parts are sent
+        # right before its closing message
+        response.streaming_content = ()
+
+        async def send_parts(message):
+            if message['type'] == 'http.response.body' \
+                    and not message.get('more_body'):
+                batch = await read_batch()
+                while batch:
+                    for part in batch:
+                        for chunk, _ in self.chunk_bytes(part):
+                            await send({'type': 'http.response.body',
+                                        'body': chunk, 'more_body': True})
+                    batch = await read_batch()
+            await send(message)
+
+        await super().send_response(response, send_parts)
+
+
+class AsyncWhiteNoiseMiddleware(AsyncCapableMiddleware,
+                                WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware (added by django_on_heroku) which does not move
+    the requests of the ASGI handler to a worker thread. Only static
+    files are looked up and opened with sync_to_async.
+    """
+    def __init__(self, get_response=None, **kwargs):
+        WhiteNoiseMiddleware.__init__(self, get_response, **kwargs)
+        AsyncCapableMiddleware.__init__(self, get_response)
+
+    def handle(self, request):
+        return WhiteNoiseMiddleware.__call__(self, request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(
+                request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+def get_asgi_application():
+    """
+    Return ASGI callable of the project, like
+    django.core.asgi.get_asgi_application.
+    """
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
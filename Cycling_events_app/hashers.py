@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 hasher with the number of iterations set by
+    settings.PASSWORD_HASH_ITERATIONS (Django default when None).
+    It reads the hashes of the default PBKDF2 hasher. Passwords
+    hashed with a different number of iterations are hashed again
+    at the next login.
+    """
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS \
+            or PBKDF2PasswordHasher.iterations
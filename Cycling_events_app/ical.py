@@ -0,0 +1,155 @@
+import hashlib
+from datetime import timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone as django_timezone
+
+from .models import Event
+
+SIGNING_SALT = 'Cycling_events_app.ical'
+VEVENT_KEY = 'calendar:vevent:{}:{}:{}'
+PRODID = '-//Cycling Events//Kalendarz wydarzeń//PL'
+FRAGMENT_FIELDS = ('id', 'event_name', 'event_type', 'date', 'start',
+                   'finish', 'distance', 'modified')
+
+
+def user_token(user_id):
+    """
+    Return token identifying the user in the url of the personal feed.
+    """
+    return signing.Signer(salt=SIGNING_SALT).sign(str(user_id))
+
+
+def user_from_token(token):
+    """
+    Return id of the user the token was made for or None.
+    """
+    try:
+        return int(signing.Signer(salt=SIGNING_SALT).unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def upcoming_events():
+    return Event.objects.filter(date__gte=django_timezone.now())
+
+
+def region_events(region_id):
+    return upcoming_events().filter(region_name_id=region_id)
+
+
+def user_events(user_id):
+    """
+    Return upcoming events the user created or takes part in.
+    """
+    return upcoming_events().filter(
+        Q(event_participant__user_id=user_id) | Q(event_creator_id=user_id))
+
+
+def escape_text(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;')\
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def format_datetime(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line):
+    """
+    Split content line into lines of at most 75 octets (RFC 5545 3.1).
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # do not split multi-byte characters
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts)
+
+
+def render_vevent(event, base_url):
+    """
+    Return VEVENT component of the event.
+    """
+    description = f'{event.get_event_type_display()}, ' \
+                  f'dystans: {event.distance:g} km, ' \
+                  f'start: {event.start}, meta: {event.finish}'
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@cycling-events',
+        f'DTSTAMP:{format_datetime(event.modified)}',
+        f'LAST-MODIFIED:{format_datetime(event.modified)}',
+        f'DTSTART:{format_datetime(event.date)}',
+        f'SUMMARY:{escape_text(event.event_name)}',
+        f'LOCATION:{escape_text(event.start)}',
+        f'DESCRIPTION:{escape_text(description)}',
+        f'URL:{base_url}/event_details/{event.id}/',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def feed_query(events):
+    """
+    Return ids and modification times of the feed events in feed order.
+    """
+    return events.order_by('date', 'id').distinct()\
+        .values_list('id', 'modified')
+
+
+def feed_state(events):
+    """
+    Return ids and modification times of the feed events,
+    with ETag of the feed computed from them.
+    No Last-Modified is derived: joining or leaving an event, or an event
+    dropping out of the feed, does not advance the modification times.
+    :return: tuple (rows, etag)
+    """
+    rows = list(feed_query(events))
+    digest = hashlib.md5(repr([(event_id, modified.isoformat())
+                               for event_id, modified in rows]).encode())
+    return rows, f'"{digest.hexdigest()}"'
+
+
+def render_calendar(rows, name, base_url):
+    """
+    Return iCalendar document with events of rows from feed_state.
+    VEVENT fragments are cached per event version, so only events
+    changed since the previous request are rendered.
+    """
+    keys = {event_id: VEVENT_KEY.format(base_url, event_id,
+                                        modified.timestamp())
+            for event_id, modified in rows}
+    fragments = cache.get_many(keys.values())
+    missing = [event_id for event_id, key in keys.items()
+               if key not in fragments]
+    if missing:
+        rendered = {
+            keys[event.id]: render_vevent(event, base_url)
+            for event in Event.objects.filter(id__in=missing)
+            .only(*FRAGMENT_FIELDS)
+        }
+        cache.set_many(rendered, settings.EVENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ]
+    body = [fragments[keys[event_id]] for event_id, _ in rows
+            if keys[event_id] in fragments]
+    return ''.join(fold(line) + '\r\n' for line in header) \
+        + ''.join(body) + 'END:VCALENDAR\r\n'
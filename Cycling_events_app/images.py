@@ -0,0 +1,171 @@
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .backends import invalidate_user
+from .models import Bike, Profile
+from .tasks import submit_on_commit
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = 'files/thumbnails'
+# formats of uploaded images which are re-encoded to drop EXIF metadata
+REWRITTEN_FORMATS = ('JPEG', 'PNG', 'WEBP')
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def webp_supported():
+    return features.check('webp')
+
+
+def encode(image, image_format, **options):
+    """
+    Return image encoded in the given format as bytes.
+    Only the colour profile is kept from the metadata.
+    """
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def has_metadata(image):
+    return any(key in image.info for key in METADATA_KEYS) \
+        or bool(image.getexif())
+
+
+def make_thumbnail(image, width):
+    """
+    Return copy of the image scaled down to the given width.
+    """
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGB')
+    thumbnail = image.copy()
+    thumbnail.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+    return thumbnail
+
+
+def save_file(storage, name, data):
+    return storage.save(name, ContentFile(data))
+
+
+def delete_files(storage, names):
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def schedule_image_processing(instance, old_image=''):
+    """
+    Reset variants of the uploaded image of a Bike or Profile and generate
+    new ones in the background after the transaction is committed.
+    Call after the instance has been saved.
+    :param old_image: name of the replaced image, released by the task
+    """
+    model = type(instance)
+    old_files = [old_image, instance.thumbnail.name,
+                 instance.thumbnail_webp.name]
+    instance.thumbnail = instance.thumbnail_webp = None
+    instance.image_width = instance.image_height = None
+    model.objects.filter(pk=instance.pk).update(
+        thumbnail=None, thumbnail_webp=None,
+        image_width=None, image_height=None)
+    if model is Profile:
+        # update() sends no post_save
+        invalidate_user(instance.user_id)
+    submit_on_commit(process_image, model, instance.pk,
+                     instance.image.name or '', old_files)
+
+
+@receiver(post_delete, sender=Bike)
+@receiver(post_delete, sender=Profile)
+def release_images(sender, instance, **kwargs):
+    """
+    Release the image and its variants of a deleted Bike or Profile.
+    """
+    names = [instance.image.name, instance.thumbnail.name,
+             instance.thumbnail_webp.name]
+    submit_on_commit(delete_files, instance.image.storage, names)
+
+
+def process_image(model, pk, name, old_files=()):
+    """
+    Strip EXIF from the uploaded image (applying its orientation first),
+    record dimensions and generate thumbnail and WebP variants.
+    :param model: Bike or Profile
+    :param pk: primary key of the instance
+    :param name: name of the image file the task was scheduled for
+    :param old_files: names of the previous image and variants to release
+    :return: True when the image was processed
+    """
+    instance = model.objects.filter(pk=pk).first()
+    storage = model._meta.get_field('thumbnail').storage
+    delete_files(storage, old_files)
+    if instance is None or (instance.image.name or '') != name:
+        # deleted or replaced by a newer upload, which has its own task
+        return False
+    if not name:
+        return False
+
+    image_storage = instance.image.storage
+    try:
+        with image_storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning('Could not process image %s.', name)
+        return False
+
+    image_format = image.format
+    stripped = has_metadata(image)
+    image = ImageOps.exif_transpose(image)
+    changes = {'image_width': image.width, 'image_height': image.height}
+
+    if stripped and image_format in REWRITTEN_FORMATS:
+        options = {'quality': JPEG_QUALITY} if image_format == 'JPEG' else {}
+        data = encode(image, image_format, **options)
+        # save under the upload_to root, not the current hashed name
+        upload_name = model._meta.get_field('image')\
+            .generate_filename(instance, os.path.basename(name))
+        changes['image'] = save_file(image_storage, upload_name, data)
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    width = model.thumbnail_width
+    thumbnail = make_thumbnail(image, width)
+    if thumbnail.mode in ('RGBA', 'LA'):
+        data, extension = encode(thumbnail, 'PNG', optimize=True), 'png'
+    else:
+        data = encode(thumbnail, 'JPEG', quality=JPEG_QUALITY,
+                      optimize=True, progressive=True)
+        extension = 'jpg'
+    changes['thumbnail'] = save_file(
+        storage, f'{THUMBNAILS_DIR}/{stem}_{width}.{extension}', data)
+    if webp_supported():
+        data = encode(thumbnail, 'WEBP', quality=WEBP_QUALITY, method=4)
+        changes['thumbnail_webp'] = save_file(
+            storage, f'{THUMBNAILS_DIR}/{stem}_{width}.webp', data)
+
+    if not model.objects.filter(pk=pk, image=name).update(**changes):
+        # the image was replaced while it was processed
+        delete_files(storage, [changes.get('image'), changes['thumbnail'],
+                               changes.get('thumbnail_webp')])
+        return False
+    if model is Profile:
+        # the cached user must not keep the released image
+        invalidate_user(instance.user_id)
+    if changes.get('image', name) != name:
+        delete_files(image_storage, [name])
+    return True
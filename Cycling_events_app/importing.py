@@ -0,0 +1,172 @@
+import csv
+import json
+
+from django.db import transaction
+
+from .caching import invalidate_events
+from .forms import AddEventForm, start_of_day
+from .geo import locate_event
+from .models import Event
+from .reference import regions, categories
+from .search import update_search_vectors
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+class ImportFormatError(ValueError):
+    """
+    Raised when the imported file can not be parsed.
+    """
+
+
+def iter_csv(stream):
+    """
+    Yield rows of CSV file with a header line as dicts.
+    :param stream: text stream
+    """
+    yield from csv.DictReader(stream)
+
+
+def iter_json(stream, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yield objects of JSON array (or JSON lines) reading the stream in chunks,
+    so only one row at a time is kept in memory.
+    :param stream: text stream
+    :param chunk_size: number of characters read at once
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    exhausted = False
+    started = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(buffer):
+            if exhausted:
+                return
+            buffer = buffer[position:] + stream.read(chunk_size)
+            position = 0
+            exhausted = not buffer
+            continue
+        if not started:
+            started = True
+            if buffer[position] == '[':
+                position += 1
+                continue
+        if buffer[position] == ']':
+            return
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if exhausted:
+                raise ImportFormatError(f'Niepoprawny JSON: {error}')
+            chunk = stream.read(chunk_size)
+            exhausted = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if not isinstance(row, dict):
+            raise ImportFormatError('Każde wydarzenie musi być obiektem JSON.')
+        yield row
+        position = end
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield rows of the stream in the given format ('csv' or 'json').
+    """
+    if file_format == 'csv':
+        return iter_csv(stream)
+    if file_format == 'json':
+        return iter_json(stream)
+    raise ImportFormatError(f'Nieobsługiwany format: {file_format}')
+
+
+def guess_format(filename):
+    """
+    Return import format based on the file extension.
+    """
+    if filename.lower().endswith(('.json', '.jsonl')):
+        return 'json'
+    return 'csv'
+
+
+class ImportResult:
+    """
+    Number of created events and errors of rejected rows.
+    """
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.errors.append((row_number, errors))
+
+
+class EventImporter:
+    """
+    Validate rows with AddEventForm and insert events in batches.
+    Regions and categories are resolved from the reference cache.
+    """
+    def __init__(self, creator, batch_size=500, dry_run=False):
+        self.creator = creator
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def build_event(self, row):
+        """
+        Return unsaved event or dict of errors.
+        """
+        data = {key: '' if value is None else str(value)
+                for key, value in row.items() if key is not None}
+        form = AddEventForm(data)
+        if not form.is_valid():
+            return None, {field: list(errors)
+                          for field, errors in form.errors.items()}
+        data = dict(form.cleaned_data)
+        region = regions.by_value(data.pop('region_name'))
+        category = categories.by_value(data.pop('categories'))
+        if region is None or category is None:
+            return None, {'__all__': ['Brak regionu lub kategorii w bazie.']}
+        data['date'] = start_of_day(data['date'])
+        event = Event(region_name=region, categories=category,
+                      event_creator=self.creator, **data)
+        locate_event(event)
+        return event, None
+
+    def flush(self, batch, result):
+        if not batch:
+            return
+        if not self.dry_run:
+            with transaction.atomic():
+                created = Event.objects.bulk_create(batch)
+                update_search_vectors(created)
+        result.created += len(batch)
+        batch.clear()
+
+    def run(self, rows):
+        """
+        Import rows.
+        :param rows: iterable of dicts
+        :return: ImportResult
+        """
+        result = ImportResult()
+        batch = []
+        try:
+            for row_number, row in enumerate(rows, start=1):
+                event, errors = self.build_event(row)
+                if errors:
+                    result.add_error(row_number, errors)
+                    continue
+                batch.append(event)
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, result)
+            self.flush(batch, result)
+        finally:
+            if result.created and not self.dry_run:
+                invalidate_events()
+        return result
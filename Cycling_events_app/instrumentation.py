@@ -0,0 +1,18 @@
+from django.db.backends.signals import connection_created
+
+
+def wrap_queries(wrapper):
+    """
+    Install the execute wrapper on every database connection, in any
+    thread, as soon as the connection is created. Temporary wrappers
+    are removed from the end of the list, so this one is kept first.
+    Use as a decorator of the wrapper.
+    """
+    def instrument_connection(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, wrapper)
+
+    connection_created.connect(
+        instrument_connection, weak=False,
+        dispatch_uid=f'{wrapper.__module__}.{wrapper.__qualname__}')
+    return wrapper
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings, setup_databases, \
+    setup_test_environment, teardown_databases, teardown_test_environment
+
+from Cycling_events_app.benchmarks import SCENARIOS, check_baseline, \
+    make_baseline, run_benchmark, seed_dataset, uncovered_routes
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmark_baseline.json')
+
+
+class Command(BaseCommand):
+    """
+    Benchmark every view on a synthetic dataset created in a test database
+    (the configured database is never touched).
+    """
+    help = 'Measure latency, query count and memory of every view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--events', type=int, default=1000)
+        parser.add_argument(
+            '--participants', type=int, default=20,
+            help='Maximal number of participants of an event.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='Clear the cache before every request.')
+        parser.add_argument(
+            '--mode', choices=('wsgi', 'asgi', 'both'), default='wsgi',
+            help='Serve requests through the WSGI or ASGI handler, both '
+                 'prints the modes side by side (baselines use wsgi).')
+        parser.add_argument(
+            '--only', nargs='+', metavar='SCENARIO',
+            help='Run only the scenarios with the given names.')
+        parser.add_argument(
+            '--output', help='Write results to the JSON file.')
+        parser.add_argument(
+            '--baseline', default=DEFAULT_BASELINE,
+            help=f'Baseline JSON file (default {DEFAULT_BASELINE}).')
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Save results as the new baseline.')
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Fail when a view exceeds its baseline budget.')
+        parser.add_argument(
+            '--tolerance', type=float, default=1.0,
+            help='Allowed growth of latency and memory in --check mode '
+                 '(default 1.0 = 100%%), query counts must not grow at all.')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep the test database between runs.')
+
+    def handle(self, *args, **options):
+        if options['check'] and not os.path.exists(options['baseline']):
+            raise CommandError(f'No baseline file {options["baseline"]}.')
+
+        media_root = tempfile.TemporaryDirectory()
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False,
+                                     keepdb=options['keepdb'])
+        try:
+            with override_settings(
+                    MEDIA_ROOT=media_root.name, TASKS_EAGER=True,
+                    CACHES={'default': {
+                        'BACKEND': 'django.core.cache.backends.locmem.'
+                                   'LocMemCache',
+                        'LOCATION': 'benchmark'}}):
+                dataset = seed_dataset(options['users'], options['events'],
+                                       options['participants'],
+                                       options['seed'])
+                missing = uncovered_routes(dataset)
+                if missing:
+                    self.stderr.write('Routes without benchmark scenario: '
+                                      + ', '.join(missing))
+                modes = ('wsgi', 'asgi') if options['mode'] == 'both' \
+                    else (options['mode'],)
+                results_by_mode = {
+                    mode: run_benchmark(
+                        dataset, SCENARIOS, options['iterations'],
+                        options['warmup'], options['cold_cache'],
+                        options['only'], mode)
+                    for mode in modes}
+        finally:
+            teardown_databases(old_config, verbosity=0,
+                               keepdb=options['keepdb'])
+            teardown_test_environment()
+            media_root.cleanup()
+
+        results = results_by_mode[modes[0]]
+        if len(modes) > 1:
+            self.print_comparison(results_by_mode)
+        else:
+            self.print_results(results)
+        if options['output']:
+            self.write_json(options['output'], results)
+        if options['save_baseline']:
+            self.write_json(options['baseline'],
+                            make_baseline(results, dataset))
+            self.stdout.write(f'Baseline saved to {options["baseline"]}.')
+        if options['check']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            if baseline.get('dataset') != dataset.sizes:
+                self.stderr.write(
+                    f'Baseline was recorded for dataset '
+                    f'{baseline.get("dataset")}, not {dataset.sizes}.')
+            violations = check_baseline(results, baseline,
+                                        options['tolerance'])
+            if violations:
+                raise CommandError('Budget exceeded:\n'
+                                   + '\n'.join(violations))
+            self.stdout.write(self.style.SUCCESS('All views within budget.'))
+
+    def print_results(self, results):
+        self.stdout.write(f'{"scenario":<24}{"p50 ms":>10}{"p95 ms":>10}'
+                          f'{"queries":>9}{"peak KiB":>11}')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["queries"]:>9}'
+                f'{result["peak_memory_kb"]:>11.1f}')
+
+    def print_comparison(self, results_by_mode):
+        wsgi, asgi = results_by_mode['wsgi'], results_by_mode['asgi']
+        self.stdout.write(f'{"scenario":<24}{"wsgi p50":>10}{"asgi p50":>10}'
+                          f'{"wsgi p95":>10}{"asgi p95":>10}')
+        for name, result in wsgi.items():
+            self.stdout.write(
+                f'{name:<24}{result["p50_ms"]:>10.2f}'
+                f'{asgi[name]["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{asgi[name]["p95_ms"]:>10.2f}')
+
+    def write_json(self, path, data):
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2, sort_keys=True)
+            file.write('\n')
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from Cycling_events_app.models import StoredFile
+from Cycling_events_app.storage import ContentAddressedStorage, \
+    get_media_storage
+
+
+class Command(BaseCommand):
+    """
+    Reconcile reference counts of content addressed media files with
+    the rows pointing at them and delete files nothing refers to.
+    """
+    help = 'Fix media reference counts and delete orphaned media files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Keep unreferenced files younger than this many seconds '
+                 '(uploads whose rows are not committed yet), default 3600.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be changed.')
+
+    def get_fields(self):
+        """
+        Return file fields stored in the content addressed storage.
+        """
+        return [field for model in apps.get_models()
+                for field in model._meta.get_fields()
+                if isinstance(field, models.FileField)
+                and isinstance(field.storage, ContentAddressedStorage)]
+
+    def count_references(self, fields):
+        references = Counter()
+        for field in fields:
+            names = field.model._default_manager\
+                .exclude(**{field.name: ''})\
+                .exclude(**{f'{field.name}__isnull': True})\
+                .values_list(field.name, flat=True)
+            references.update(names.iterator())
+        return references
+
+    def handle(self, *args, **options):
+        storage = get_media_storage()
+        fields = self.get_fields()
+        dry_run = options['dry_run']
+        deadline = time.time() - options['grace']
+
+        def is_old(name):
+            try:
+                return os.path.getmtime(storage.path(name)) < deadline
+            except FileNotFoundError:
+                return True
+
+        fixed = deleted = 0
+        with transaction.atomic():
+            references = self.count_references(fields)
+            known = set()
+            for stored_file in StoredFile.objects.select_for_update()\
+                    .iterator():
+                known.add(stored_file.name)
+                count = references.get(stored_file.name, 0)
+                if count == 0 and is_old(stored_file.name):
+                    self.stdout.write(f'Orphaned: {stored_file.name}')
+                    deleted += 1
+                    if not dry_run:
+                        stored_file.delete()
+                        storage.delete(stored_file.name)
+                elif count and count != stored_file.ref_count:
+                    fixed += 1
+                    if not dry_run:
+                        stored_file.ref_count = count
+                        stored_file.save(update_fields=['ref_count'])
+            for name, count in references.items():
+                if name not in known and storage.exists(name):
+                    fixed += 1
+                    if not dry_run:
+                        StoredFile.objects.create(
+                            name=name, size=storage.size(name),
+                            ref_count=count)
+                    known.add(name)
+
+        for directory in {os.path.dirname(field.generate_filename(None, 'x'))
+                          for field in fields}:
+            for root, _, files in os.walk(storage.path(directory)):
+                for file_name in files:
+                    name = os.path.relpath(os.path.join(root, file_name),
+                                           storage.location)
+                    name = name.replace('\\', '/')
+                    if name in known or name in references \
+                            or not is_old(name):
+                        continue
+                    self.stdout.write(f'Unknown file: {name}')
+                    deleted += 1
+                    if not dry_run:
+                        os.remove(storage.path(name))
+
+        prefix = 'Dry run: ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{fixed} reference count(s) fixed, '
+            f'{deleted} file(s) deleted.'))
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Cycling_events_app import ical, reference
+from Cycling_events_app.forms import FilterEventsForm
+from Cycling_events_app.models import Event, WaitlistEntry
+from Cycling_events_app.views import EventsView, ParticipantsView, \
+    event_participants
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Print query plans of the queries issued by the event views,
+    to verify that the indexes declared on Event are used.
+    """
+    help = 'Print EXPLAIN (ANALYZE) plans for the event views queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Username used for the "my events" queries '
+                           '(defaults to the creator of the first event).')
+        parser.add_argument(
+            '--no-analyze', action='store_true',
+            help='Only plan the queries, do not execute them.')
+
+    def get_queries(self, options):
+        """
+        Return list of (description, queryset) mirroring the views.
+        Filters and helpers of the views are reused, so the plans follow
+        the queries the application runs.
+        """
+        sample = Event.objects.order_by('id').first()
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        elif sample is not None:
+            user = sample.event_creator
+        else:
+            user = User.objects.order_by('id').first()
+        # KeysetPaginator reads one row more to know if a next page exists
+        limit = settings.EVENTS_PAGE_SIZE + 1
+        ordering = EventsView.ordering
+
+        queries = [
+            ('EventsView.get: first page of events',
+             Event.objects.order_by(*ordering)[:limit]),
+        ]
+        if sample is not None:
+            form = FilterEventsForm({
+                'region_name': reference.regions.value_for_pk(
+                    sample.region_name_id),
+                'categories': reference.categories.value_for_pk(
+                    sample.categories_id),
+                'event_type': sample.event_type})
+            if form.is_valid():
+                filters = form.get_filters()
+                queries.append(
+                    ('EventsView.get: filter by region, bike type '
+                     'and event type',
+                     Event.objects.filter(**filters)
+                     .order_by(*ordering)[:limit]))
+                if 'categories__in' in filters:
+                    queries.append(
+                        ('EventsView.get: filter by bike type only',
+                         Event.objects.filter(
+                             categories__in=filters['categories__in'])
+                         .order_by(*ordering)[:limit]))
+            queries += [
+                ('EventView.get: single event',
+                 Event.objects.select_related('event_creator', 'route')
+                 .filter(id=sample.id)),
+                ('ParticipantsView.get: first page of participants',
+                 event_participants(sample)
+                 .order_by(*ParticipantsView.ordering)[:limit]),
+            ]
+            if sample.region_name_id is not None:
+                queries.append(
+                    ('CalendarFeedView.get: upcoming events of the region',
+                     ical.feed_query(
+                         ical.region_events(sample.region_name_id))))
+        if user is not None:
+            queries += [
+                ('MyEventsView.get: events created by user',
+                 Event.objects.filter(event_creator_id=user.id)
+                 .order_by('event_name')),
+                ('MyEventsView.get: events joined by user',
+                 Event.objects.filter(event_participant__user_id=user.id)
+                 .order_by('event_name')),
+                ('MyEventsView.get: waitlist of user',
+                 WaitlistEntry.objects.filter(profile__user_id=user.id)
+                 .select_related('event').order_by('event__event_name')),
+                ('CalendarFeedView.get: upcoming events of the user',
+                 ical.feed_query(ical.user_events(user.id))),
+            ]
+        return queries
+
+    def handle(self, *args, **options):
+        explain_options = {}
+        if connection.vendor == 'postgresql':
+            explain_options = {'analyze': not options['no_analyze'],
+                               'buffers': not options['no_analyze']}
+        elif not options['no_analyze']:
+            self.stderr.write(
+                f'EXPLAIN ANALYZE is not supported on {connection.vendor}, '
+                f'printing plain query plans.')
+
+        for description, queryset in self.get_queries(options):
+            self.stdout.write(self.style.MIGRATE_HEADING(description))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from Cycling_events_app.geo import locate_event
+from Cycling_events_app.models import Event
+
+FIELDS = ('start_lat', 'start_lon', 'start_geohash',
+          'finish_lat', 'finish_lon', 'finish_geohash')
+
+
+class Command(BaseCommand):
+    """
+    Fill coordinates of events created before they were geocoded
+    (or of all events after the towns table changed).
+    """
+    help = 'Geocode start and finish of events from the towns table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Geocode also events which already have coordinates.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        events = Event.objects.only('id', 'start', 'finish', *FIELDS)
+        if not options['all']:
+            events = events.filter(start_geohash='', finish_geohash='')
+        located = 0
+        batch = []
+        for event in events.iterator(chunk_size=options['batch_size']):
+            locate_event(event)
+            located += bool(event.start_geohash or event.finish_geohash)
+            batch.append(event)
+            if len(batch) >= options['batch_size']:
+                Event.objects.bulk_update(batch, FIELDS)
+                batch = []
+        if batch:
+            Event.objects.bulk_update(batch, FIELDS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Located {located} event(s).'))
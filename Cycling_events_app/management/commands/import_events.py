@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Cycling_events_app.importing import EventImporter, ImportFormatError, \
+    guess_format, iter_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Import events from CSV (with header) or JSON (array or JSON lines) file.
+    Columns are named like the AddEventForm fields.
+    """
+    help = 'Import events from CSV or JSON file in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file to import.')
+        parser.add_argument('--creator', required=True,
+                            help='Username of the events creator.')
+        parser.add_argument('--format', choices=('csv', 'json'),
+                            help='File format (guessed from the extension '
+                                 'by default).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of events inserted at once.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only validate the file.')
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError(f'User {options["creator"]} does not exist.')
+        file_format = options['format'] or guess_format(options['path'])
+        importer = EventImporter(creator, batch_size=options['batch_size'],
+                                 dry_run=options['dry_run'])
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            try:
+                result = importer.run(iter_rows(stream, file_format))
+            except ImportFormatError as error:
+                raise CommandError(str(error))
+
+        for row_number, errors in result.errors:
+            for field, messages in errors.items():
+                self.stderr.write(
+                    f'Row {row_number}: {field}: {" ".join(messages)}')
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} event(s), '
+            f'rejected {len(result.errors)} row(s).'))
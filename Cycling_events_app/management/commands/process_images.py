@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from Cycling_events_app.images import process_image
+from Cycling_events_app.models import Bike, Profile
+
+
+class Command(BaseCommand):
+    """
+    Generate thumbnails of images uploaded before the image pipeline
+    existed (or regenerate all of them).
+    """
+    help = 'Strip EXIF, record dimensions and generate thumbnails ' \
+           'of bike and profile images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Process also images which already have thumbnails.')
+
+    def handle(self, *args, **options):
+        for model in (Bike, Profile):
+            instances = model.objects.exclude(image='').exclude(image=None)
+            if not options['all']:
+                instances = instances.filter(
+                    Q(thumbnail=None) | Q(thumbnail=''))
+            processed = 0
+            rows = instances.values_list('pk', 'image', 'thumbnail',
+                                         'thumbnail_webp')
+            for pk, name, thumbnail, thumbnail_webp in rows.iterator():
+                if process_image(model, pk, name,
+                                 [thumbnail, thumbnail_webp]):
+                    processed += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'Processed {processed} {model._meta.verbose_name_plural}.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from Cycling_events_app.models import Event, participant_count_subquery
+
+
+class Command(BaseCommand):
+    """
+    Recount participants of every event and fix stored counters
+    which drifted from the participants table.
+    """
+    help = 'Recompute Event.participant_count and repair drifted counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report events with a wrong counter.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Event.objects\
+                .annotate(actual=participant_count_subquery())\
+                .exclude(participant_count=F('actual'))
+            if options['dry_run']:
+                for event in drifted.only('id', 'participant_count'):
+                    self.stdout.write(
+                        f'Event {event.id}: stored {event.participant_count},'
+                        f' actual {event.actual}')
+                self.stdout.write(f'{len(drifted)} event(s) need repair.')
+                return
+            ids = list(drifted.values_list('id', flat=True))
+            repaired = Event.objects.filter(id__in=ids)\
+                .update(participant_count=participant_count_subquery())
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired participant counters of {repaired} event(s).'))
@@ -0,0 +1,384 @@
+import contextvars
+import glob
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.crypto import constant_time_compare
+
+from .instrumentation import wrap_queries
+from .middleware import AsyncCapableMiddleware
+
+PREFIX = 'cycling'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Number of handled requests.', None),
+    'http_request_duration_seconds': (
+        'histogram', 'Time spent handling requests.', LATENCY_BUCKETS),
+    'http_request_db_seconds': (
+        'histogram', 'Time spent in database queries (sampled requests).',
+        LATENCY_BUCKETS),
+    'http_request_template_seconds': (
+        'histogram', 'Time spent rendering templates without database '
+                     'queries (sampled requests).', LATENCY_BUCKETS),
+    'http_request_queries': (
+        'histogram', 'Number of database queries (sampled requests).',
+        QUERY_BUCKETS),
+    'http_response_size_bytes': (
+        'histogram', 'Size of response bodies (not streamed).', SIZE_BUCKETS),
+    'db_pool_connections': (
+        'gauge', 'Open connections of the database pool.', None),
+    'db_pool_checkouts_total': (
+        'counter', 'Connections taken from the database pool.', None),
+    'db_pool_discarded_total': (
+        'counter', 'Connections of the database pool closed.', None),
+    'db_pool_timeouts_total': (
+        'counter', 'Requests for a connection which timed out.', None),
+    'db_pool_wait_seconds': (
+        'histogram', 'Time spent waiting for a pooled connection.',
+        LATENCY_BUCKETS),
+}
+
+
+class Registry:
+    """
+    Metrics of this process.
+    Counters and gauges are stored as floats, histograms as
+    [bucket counts, sum, count] (bucket counts are not cumulative).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in METRICS}
+
+    def clear(self):
+        with self.lock:
+            self.values = {name: {} for name in METRICS}
+
+    def inc(self, name, labels, value=1):
+        key = encode_labels(labels)
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        key = encode_labels(labels)
+        with self.lock:
+            self.values[name][key] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = encode_labels(labels)
+        with self.lock:
+            series = self.values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * (len(buckets) + 1), 0, 0]
+            position = len(buckets)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    position = index
+                    break
+            histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.values))
+
+
+def encode_labels(labels):
+    return json.dumps(sorted(labels.items()))
+
+
+def merge(snapshots):
+    """
+    Sum snapshots of several processes (gauges too, e.g. connections
+    of all processes).
+    """
+    merged = {name: {} for name in METRICS}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            if name not in merged:
+                continue
+            for key, value in series.items():
+                current = merged[name].get(key)
+                if current is None:
+                    merged[name][key] = json.loads(json.dumps(value))
+                elif METRICS[name][0] in ('counter', 'gauge'):
+                    merged[name][key] = current + value
+                else:
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+    return merged
+
+
+def format_labels(pairs):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs)
+
+
+def render(values):
+    """
+    Return metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        full_name = f'{PREFIX}_{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {metric_type}')
+        for key, value in sorted(values.get(name, {}).items()):
+            pairs = [tuple(pair) for pair in json.loads(key)]
+            if metric_type in ('counter', 'gauge'):
+                lines.append(f'{full_name}{{{format_labels(pairs)}}} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(pairs + [('le', bound)])
+                lines.append(f'{full_name}_bucket{{{labels}}} {cumulative}')
+            labels = format_labels(pairs)
+            lines.append(f'{full_name}_sum{{{labels}}} {total}')
+            lines.append(f'{full_name}_count{{{labels}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class FileStore:
+    """
+    Share metrics of gunicorn workers: every process writes its snapshot
+    to METRICS_DIR/<pid>.json (at most every METRICS_FLUSH_INTERVAL seconds)
+    and the /metrics view sums snapshots of all processes.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.last_flush = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{os.getpid()}.json')
+
+    def flush(self, registry, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_flush < \
+                settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=self.directory,
+                                             suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(registry.snapshot(), file)
+        os.replace(temporary, self.path)
+
+    def collect(self):
+        """
+        Return snapshots of all processes. Counters and histograms
+        of exited processes are kept, their gauges (e.g. open
+        connections) are dropped.
+        """
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            pid = os.path.splitext(os.path.basename(path))[0]
+            if not process_alive(pid):
+                for name, (metric_type, _, _) in METRICS.items():
+                    if metric_type == 'gauge':
+                        snapshot.pop(name, None)
+            snapshots.append(snapshot)
+        return snapshots
+
+
+def process_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
+_stores = {}
+# timings of the sampled request, shared with the worker threads
+# running sync code of async views
+_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def get_store():
+    """
+    Return file store of METRICS_DIR or None when metrics
+    are kept in memory of this process only.
+    """
+    directory = settings.METRICS_DIR
+    if not directory:
+        return None
+    if directory not in _stores:
+        _stores[directory] = FileStore(directory)
+    return _stores[directory]
+
+
+class RequestTimings:
+    """
+    Database and template time of the sampled request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.template_db_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if self.template_depth:
+                self.template_db_time += elapsed
+
+
+@wrap_queries
+def record_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _timings.get()
+        if timings is None:
+            return super().render(context, request)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend measuring render time of sampled requests.
+    """
+    def from_string(self, template_code):
+        return InstrumentedTemplate(
+            super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(
+            super().get_template(template_name).template, self)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Measure latency, status and response size of every request and
+    (for METRICS_SAMPLE_RATE of requests) database and template time
+    and number of queries. Enabled by settings.METRICS_ENABLED.
+    Runs on the event loop under ASGI.
+    """
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        timings, token = self.start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        self.record(request, response, timings, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        timings, token = self.start()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        self.record(request, response, timings, time.perf_counter() - start)
+        return response
+
+    def start(self):
+        sample_rate = settings.METRICS_SAMPLE_RATE
+        timings = None
+        if sample_rate and random.random() < sample_rate:
+            timings = RequestTimings()
+        return timings, _timings.set(timings)
+
+    def record(self, request, response, timings, duration):
+        view = view_label(request)
+        if view == 'metrics':
+            return
+        labels = {'view': view, 'method': request.method}
+        registry.inc('http_requests_total',
+                     dict(labels, status=response.status_code))
+        registry.observe('http_request_duration_seconds', labels, duration)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', labels,
+                             len(response.content))
+        if timings is not None:
+            registry.observe('http_request_db_seconds', labels,
+                             timings.db_time)
+            registry.observe('http_request_template_seconds', labels,
+                             timings.template_time - timings.template_db_time)
+            registry.observe('http_request_queries', labels, timings.queries)
+        store = get_store()
+        if store is not None:
+            store.flush(registry)
+
+
+def metrics_view(request):
+    """
+    Expose metrics of all processes in the Prometheus text format.
+    Requires `Authorization: Bearer <METRICS_TOKEN>` when the token is set.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    store = get_store()
+    if store is None:
+        values = registry.snapshot()
+    else:
+        store.flush(registry, force=True)
+        values = merge(store.collect())
+    return HttpResponse(render(values),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,25 @@
+import asyncio
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of middleware running in the mode of the rest of the chain:
+    on the event loop under ASGI, so async views are not moved to a worker
+    thread, and synchronously under WSGI.
+
+    Subclasses define handle(request) for the synchronous chain
+    and async __acall__(request) for the asynchronous one.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # mark the instance as a coroutine function for Django
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
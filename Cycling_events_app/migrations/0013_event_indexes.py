@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0012_profile_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_name', 'id'], name='event_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['region_name', 'categories', 'event_type', 'event_name', 'id'], name='event_filter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_creator', 'event_name'], name='event_creator_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date'], name='event_date_idx'),
+        ),
+    ]
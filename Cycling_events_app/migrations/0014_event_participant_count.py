@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:27
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_participants(apps, schema_editor):
+    Event = apps.get_model('Cycling_events_app', 'Event')
+    participants = Event.event_participant.through.objects\
+        .filter(event_id=OuterRef('pk'))\
+        .order_by()\
+        .values('event_id')\
+        .annotate(total=Count('id'))\
+        .values('total')
+    Event.objects.update(participant_count=Coalesce(Subquery(participants), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0013_event_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:30
+
+import unicodedata
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+# frozen copies of the search fields and of Cycling_events_app.text.normalize,
+# so later changes of the app do not change this migration
+EXTRA_FOLDING = str.maketrans({'ł': 'l', 'Ł': 'l'})
+
+SEARCH_FIELDS = (
+    ('event_name', 'A'),
+    ('start', 'B'),
+    ('finish', 'B'),
+    ('route_description', 'C'),
+)
+
+
+def normalize(text):
+    text = (text or '').translate(EXTRA_FOLDING).lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed
+                   if not unicodedata.combining(char))
+
+
+def create_search_index(apps, schema_editor):
+    """
+    GIN index is PostgreSQL specific, other databases use
+    the in-memory index from Cycling_events_app/search.py.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS event_search_vector_idx '
+        'ON "Cycling_events_app_event" USING gin (search_vector)')
+    Event = apps.get_model('Cycling_events_app', 'Event')
+    for event in Event.objects.only(*dict(SEARCH_FIELDS)).iterator():
+        vector = None
+        for field, weight in SEARCH_FIELDS:
+            part = SearchVector(Value(normalize(getattr(event, field))),
+                                weight=weight, config='simple')
+            vector = part if vector is None else vector + part
+        Event.objects.filter(pk=event.pk).update(search_vector=vector)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS event_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0014_event_participant_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0015_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['categories', 'event_name', 'id'], name='event_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_type', 'event_name', 'id'], name='event_type_name_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0016_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bike',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bike',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bike',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, upload_to='files/thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='bike',
+            name='thumbnail_webp',
+            field=models.ImageField(editable=False, null=True, upload_to='files/thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, upload_to='files/thumbnails'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='thumbnail_webp',
+            field=models.ImageField(editable=False, null=True, upload_to='files/thumbnails'),
+        ),
+    ]
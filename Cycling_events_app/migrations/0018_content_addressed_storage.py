@@ -0,0 +1,54 @@
+# Generated by Django 4.0.4 on 2026-10-18 07:43
+
+import Cycling_events_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0017_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=1)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='bike',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/images'),
+        ),
+        migrations.AlterField(
+            model_name='bike',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/thumbnails'),
+        ),
+        migrations.AlterField(
+            model_name='bike',
+            name='thumbnail_webp',
+            field=models.ImageField(editable=False, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/thumbnails'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/images'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/thumbnails'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='thumbnail_webp',
+            field=models.ImageField(editable=False, null=True, storage=Cycling_events_app.storage.get_media_storage, upload_to='files/thumbnails'),
+        ),
+    ]
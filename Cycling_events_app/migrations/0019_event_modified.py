@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0018_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.0.4 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0019_event_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='finish_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='finish_lat',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='finish_lon',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='start_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='start_lat',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='start_lon',
+            field=models.FloatField(editable=False, null=True),
+        ),
+    ]
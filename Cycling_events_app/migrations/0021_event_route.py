@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 08:24
+
+import Cycling_events_app.storage
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Cycling_events_app', '0020_event_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gpx', models.FileField(storage=Cycling_events_app.storage.get_media_storage, upload_to='files/routes')),
+                ('points', models.PositiveIntegerField()),
+                ('distance', models.FloatField()),
+                ('elevation_gain', models.FloatField()),
+                ('south', models.FloatField()),
+                ('west', models.FloatField()),
+                ('north', models.FloatField()),
+                ('east', models.FloatField()),
+                ('polyline', models.TextField()),
+                ('uploaded', models.DateTimeField(auto_now=True)),
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='route', to='Cycling_events_app.event')),
+            ],
+        ),
+    ]
@@ -1,8 +1,16 @@
+import json
+import math
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, m2m_changed
 from django.dispatch import receiver
 
+from .storage import get_media_storage
+
 User = get_user_model()
 
 CATEGORY_NAME = (
@@ -43,6 +51,17 @@ GENDER_CHOICES = (
 )
 
 
+class StoredFile(models.Model):
+    """
+    Stores number of references to a file
+    of :class:`Cycling_events_app.storage.ContentAddressedStorage`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created = models.DateTimeField(auto_now_add=True)
+
+
 class Bike(models.Model):
     """
     Stores a single Bike model.
@@ -51,7 +70,18 @@ class Bike(models.Model):
     model = models.CharField('Model roweru:', max_length=64)
     bike_type = models.IntegerField(choices=CATEGORY_NAME)
     weight = models.FloatField()
-    image = models.ImageField(upload_to='files/images', blank=True, null=True)
+    image = models.ImageField(upload_to='files/images', blank=True, null=True,
+                              storage=get_media_storage)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail = models.ImageField(upload_to='files/thumbnails', null=True,
+                                  editable=False, storage=get_media_storage)
+    thumbnail_webp = models.ImageField(upload_to='files/thumbnails',
+                                       null=True, editable=False,
+                                       storage=get_media_storage)
+
+    # width in pixels of the generated variants (see images.process_image)
+    thumbnail_width = 500
 
 
 class Profile(models.Model):
@@ -64,7 +94,17 @@ class Profile(models.Model):
     region = models.IntegerField(choices=VOIVODESHIP_NAME, blank=True, null=True)
     gender = models.CharField(choices=GENDER_CHOICES, blank=True, null=True, max_length=15)
     bike = models.ForeignKey(Bike, on_delete=models.CASCADE, null=True)
-    image = models.ImageField(upload_to='files/images', blank=True, null=True)
+    image = models.ImageField(upload_to='files/images', blank=True, null=True,
+                              storage=get_media_storage)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    thumbnail = models.ImageField(upload_to='files/thumbnails', null=True,
+                                  editable=False, storage=get_media_storage)
+    thumbnail_webp = models.ImageField(upload_to='files/thumbnails',
+                                       null=True, editable=False,
+                                       storage=get_media_storage)
+
+    thumbnail_width = 150
 
     @receiver(post_save, sender=User)
     def create_user_profile(sender, instance, created, **kwargs):
@@ -127,3 +167,138 @@ class Event(models.Model):
     categories = models.ForeignKey(Category, on_delete=models.CASCADE, null=True)
     event_participant = models.ManyToManyField(Profile)
     event_creator = models.ForeignKey(User, on_delete=models.CASCADE, editable=False)
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    # coordinates of start and finish geocoded from the towns table,
+    # geohash prefixes index them for area queries (see geo.py)
+    start_lat = models.FloatField(null=True, editable=False)
+    start_lon = models.FloatField(null=True, editable=False)
+    start_geohash = models.CharField(max_length=12, blank=True, default='',
+                                     db_index=True, editable=False)
+    finish_lat = models.FloatField(null=True, editable=False)
+    finish_lon = models.FloatField(null=True, editable=False)
+    finish_geohash = models.CharField(max_length=12, blank=True, default='',
+                                      db_index=True, editable=False)
+    # time of the last change, calendar feeds use it for Last-Modified
+    modified = models.DateTimeField(auto_now=True)
+    # full text search document, filled only on PostgreSQL (see search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # events list: keyset pagination on (event_name, id)
+            models.Index(fields=['event_name', 'id'],
+                         name='event_name_id_idx'),
+            # events list filtered by region, bike type and event type,
+            # ordered the same way as the unfiltered list
+            models.Index(fields=['region_name', 'categories', 'event_type',
+                                 'event_name', 'id'],
+                         name='event_filter_idx'),
+            # events list filtered by a single bike type or event type
+            models.Index(fields=['categories', 'event_name', 'id'],
+                         name='event_category_name_idx'),
+            models.Index(fields=['event_type', 'event_name', 'id'],
+                         name='event_type_name_idx'),
+            # my events: events created by user ordered by name
+            models.Index(fields=['event_creator', 'event_name'],
+                         name='event_creator_name_idx'),
+            # upcoming events
+            models.Index(fields=['date'], name='event_date_idx'),
+        ]
+
+    @property
+    def free_places(self):
+        """
+        Return number of places left on the event
+        """
+        return int(self.limit) - self.participant_count
+
+
+class WaitlistEntry(models.Model):
+    """
+    Stores place of :model:`Cycling_events_app.Profile` on the waitlist
+    of a full :model:`Cycling_events_app.Event`.
+    Positions are dense (1, 2, ...) and kept so by signups.py,
+    so a rider's position is read from a single row.
+    """
+    event = models.ForeignKey(Event, related_name='waitlist',
+                              on_delete=models.CASCADE)
+    profile = models.ForeignKey(Profile, related_name='waitlist_entries',
+                                on_delete=models.CASCADE)
+    position = models.PositiveIntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'profile'],
+                                    name='waitlist_event_profile_unique'),
+        ]
+        indexes = [
+            # head of the waitlist and positions behind a removed entry
+            models.Index(fields=['event', 'position'],
+                         name='waitlist_event_position_idx'),
+        ]
+
+
+class EventRoute(models.Model):
+    """
+    Stores GPX track of :model:`Cycling_events_app.Event`
+    with statistics computed once on upload (see gpx.py).
+    """
+    event = models.OneToOneField(Event, related_name='route',
+                                 on_delete=models.CASCADE)
+    gpx = models.FileField(upload_to='files/routes',
+                           storage=get_media_storage)
+    points = models.PositiveIntegerField()
+    distance = models.FloatField()
+    elevation_gain = models.FloatField()
+    south = models.FloatField()
+    west = models.FloatField()
+    north = models.FloatField()
+    east = models.FloatField()
+    # simplified track as JSON list of [lat, lon]
+    polyline = models.TextField()
+    uploaded = models.DateTimeField(auto_now=True)
+
+    def svg_points(self, width=400, height=300):
+        """
+        Return simplified track as points of an SVG polyline
+        fitted into the width x height box.
+        """
+        lon_scale = math.cos(math.radians((self.south + self.north) / 2))
+        span_x = max((self.east - self.west) * lon_scale, 1e-9)
+        span_y = max(self.north - self.south, 1e-9)
+        scale = min(width / span_x, height / span_y)
+        return ' '.join(
+            f'{(lon - self.west) * lon_scale * scale:.1f},'
+            f'{(self.north - lat) * scale:.1f}'
+            for lat, lon in json.loads(self.polyline))
+
+
+def participant_count_subquery():
+    """
+    Return subquery counting participants of the outer event
+    """
+    participants = Event.event_participant.through.objects\
+        .filter(event_id=OuterRef('pk'))\
+        .order_by()\
+        .values('event_id')\
+        .annotate(total=Count('id'))\
+        .values('total')
+    return Coalesce(Subquery(participants), 0)
+
+
+@receiver(m2m_changed, sender=Event.event_participant.through)
+def update_participant_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Recount participants when they are changed through the related manager
+    (sign up views update the counter themselves).
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        events = Event.objects.filter(pk=instance.pk)
+    elif pk_set:
+        events = Event.objects.filter(pk__in=pk_set)
+    else:
+        events = Event.objects.all()
+    events.update(participant_count=participant_count_subquery())
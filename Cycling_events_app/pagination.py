@@ -0,0 +1,165 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor passed in the query string can not be decoded.
+    """
+
+
+def encode_cursor(values, direction):
+    """
+    Pack ordering key values and direction into an url-safe string.
+    :param values: values of the ordering fields of the boundary row
+    :param direction: FORWARD or BACKWARD
+    :return: cursor string
+    """
+    payload = json.dumps({'k': list(values), 'd': direction},
+                         cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Unpack cursor created by encode_cursor.
+    :param cursor: cursor string
+    :return: tuple (values, direction)
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['k'], payload['d']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if direction not in (FORWARD, BACKWARD) or not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values, direction
+
+
+class KeysetPage:
+    """
+    Single page returned by KeysetPaginator.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginate queryset by seeking past the ordering key of the last seen row
+    instead of using OFFSET, so every page costs the same as the first one.
+
+    The ordering must be unique, so it should end with the primary key.
+    """
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+        opts = queryset.model._meta
+        self.fields = [opts.get_field(field.lstrip('-'))
+                       for field in self.ordering]
+        self.attnames = [field.attname for field in self.fields]
+
+    def _key(self, obj):
+        return [getattr(obj, attname) for attname in self.attnames]
+
+    def _convert(self, values):
+        """
+        Convert values decoded from a cursor to python values
+        of the ordering fields.
+        """
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(values)
+        try:
+            values = [field.to_python(value)
+                      for field, value in zip(self.fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(values)
+        if None in values:
+            raise InvalidCursor(values)
+        return values
+
+    def _seek(self, values, direction):
+        """
+        Build filter selecting rows placed after (or before) given key.
+        """
+        values = self._convert(values)
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending == (direction == FORWARD) else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(self.ordering[:position], values):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def page(self, cursor=None):
+        """
+        Return page of objects following (or preceding) the cursor.
+        :param cursor: cursor from a previous page or None for the first page
+        :return: KeysetPage
+        """
+        queryset = self.queryset
+        direction = FORWARD
+        if cursor:
+            values, direction = decode_cursor(cursor)
+            queryset = queryset.filter(self._seek(values, direction))
+
+        if direction == FORWARD:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if direction == BACKWARD:
+            rows.reverse()
+
+        if direction == FORWARD:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._key(rows[-1]), FORWARD)
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._key(rows[0]), BACKWARD)
+        return KeysetPage(rows, next_cursor, previous_cursor)
@@ -0,0 +1,3 @@
+"""
+PostgreSQL database backend sharing connections of a process in a pool.
+"""
@@ -0,0 +1,252 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from ..metrics import registry
+
+DEFAULT_POOL = {
+    # open connections (in use and idle) of a database in a process
+    'MAX_SIZE': 10,
+    # seconds after which an idle connection is closed
+    'IDLE_TIMEOUT': 300,
+    # seconds to wait for a free connection when MAX_SIZE are in use
+    'TIMEOUT': 10,
+    # connections idle for longer are checked with SELECT 1 before use
+    'HEALTH_CHECK_INTERVAL': 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Connections of one database shared by the threads of a process.
+    The most recently returned connection is reused first, so the
+    rest stay idle and are closed after IDLE_TIMEOUT.
+    """
+    def __init__(self, connect, alias, options, clock=time.monotonic):
+        self.connect = connect
+        self.alias = alias
+        self.options = dict(DEFAULT_POOL, **options)
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+
+    def get(self):
+        """
+        Return a healthy connection, opening a new one if none is idle.
+        :raise psycopg2.OperationalError: when no connection is freed
+            within TIMEOUT
+        """
+        start = self.clock()
+        while True:
+            connection, idle_for = self._checkout(start)
+            if connection is None:
+                connection = self._open()
+                outcome = 'created'
+            elif self.is_usable(connection, idle_for):
+                outcome = 'reused'
+            else:
+                self.discard(connection, 'health_check')
+                continue
+            registry.inc('db_pool_checkouts_total',
+                         {'alias': self.alias, 'outcome': outcome})
+            registry.observe('db_pool_wait_seconds', {'alias': self.alias},
+                             self.clock() - start)
+            self.update_gauges()
+            return connection
+
+    def _checkout(self, start):
+        """
+        Take an idle connection or a free slot for a new one (None).
+        :return: tuple (connection or None, seconds it was idle)
+        """
+        deadline = start + self.options['TIMEOUT']
+        with self.condition:
+            while True:
+                now = self.clock()
+                self._close_expired(now)
+                if self.idle:
+                    connection, returned = self.idle.pop()
+                    return connection, now - returned
+                if self.size < self.options['MAX_SIZE']:
+                    self.size += 1
+                    return None, 0
+                if now >= deadline:
+                    registry.inc('db_pool_timeouts_total',
+                                 {'alias': self.alias})
+                    raise psycopg2.OperationalError(
+                        f'No free connection in the pool of the {self.alias} '
+                        f'database within {self.options["TIMEOUT"]} s.')
+                self.condition.wait(deadline - now)
+
+    def _open(self):
+        try:
+            return self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def _close_expired(self, now):
+        # idle connections are ordered by the time they were returned
+        while self.idle and \
+                now - self.idle[0][1] >= self.options['IDLE_TIMEOUT']:
+            connection, _ = self.idle.popleft()
+            self.size -= 1
+            connection.close()
+            registry.inc('db_pool_discarded_total',
+                         {'alias': self.alias, 'reason': 'idle_timeout'})
+
+    def is_usable(self, connection, idle_for):
+        if connection.closed or connection.info.transaction_status \
+                == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_for < self.options['HEALTH_CHECK_INTERVAL']:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.info.transaction_status \
+                    != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def put(self, connection):
+        """
+        Return connection to the pool, rolling back an open transaction.
+        """
+        if connection.closed or connection.info.transaction_status \
+                == extensions.TRANSACTION_STATUS_UNKNOWN:
+            self.discard(connection, 'broken')
+            return
+        if connection.info.transaction_status \
+                != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                self.discard(connection, 'broken')
+                return
+        with self.condition:
+            self.idle.append((connection, self.clock()))
+            self.condition.notify()
+        self.update_gauges()
+
+    def discard(self, connection, reason):
+        """
+        Close connection which must not be reused.
+        """
+        try:
+            connection.close()
+        finally:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            registry.inc('db_pool_discarded_total',
+                         {'alias': self.alias, 'reason': reason})
+            self.update_gauges()
+
+    def close_idle(self):
+        with self.condition:
+            while self.idle:
+                connection, _ = self.idle.pop()
+                self.size -= 1
+                connection.close()
+        self.update_gauges()
+
+    def update_gauges(self):
+        idle = len(self.idle)
+        registry.set('db_pool_connections',
+                     {'alias': self.alias, 'state': 'idle'}, idle)
+        registry.set('db_pool_connections',
+                     {'alias': self.alias, 'state': 'in_use'},
+                     self.size - idle)
+
+
+def connect(conn_params, isolation_level=None):
+    """
+    Open connection like the PostgreSQL backend does. It must not depend
+    on the DatabaseWrapper, which belongs to the thread opening the pool.
+    """
+    connection = psycopg2.connect(**conn_params)
+    if isolation_level is not None \
+            and isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    # JSONField decodes the values itself
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection,
+                                           loads=lambda value: value)
+    return connection
+
+
+def get_pool(alias, conn_params, options, connect):
+    """
+    Return pool of connections with the given parameters
+    in this process (pools are not shared with forked workers).
+    """
+    key = (os.getpid(), alias, repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(connect, alias, options)
+    return pool
+
+
+def close_pools(alias=None):
+    """
+    Close idle connections of the pools (of the alias).
+    """
+    with _pools_lock:
+        pools = [pool for pool in _pools.values()
+                 if alias is None or pool.alias == alias]
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # pooled connections would prevent dropping the database
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking connections from a pool of the process
+    instead of opening one per request. Closing the connection (at the
+    end of every request with CONN_MAX_AGE = 0) returns it to the pool.
+    Pool options are read from the POOL key of the database settings.
+    """
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.pool = get_pool(
+            self.alias, conn_params, self.settings_dict.get('POOL', {}),
+            functools.partial(connect, conn_params, isolation_level))
+        connection = self.pool.get()
+        self.isolation_level = connection.isolation_level \
+            if isolation_level is None else isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps the connection until the block ends
+                self.pool.discard(self.connection, 'closed_in_transaction')
+            else:
+                self.pool.put(self.connection)
@@ -0,0 +1,201 @@
+import contextvars
+import logging
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Node
+
+from .instrumentation import wrap_queries
+from .middleware import AsyncCapableMiddleware
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(APP_DIR)
+THIS_FILE = os.path.abspath(__file__)
+# savepoints of nested atomic blocks are not N+1 queries
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT',
+                          'ROLLBACK TO SAVEPOINT')
+
+# active recorders, shared with the worker threads running sync code
+# of async views
+_recorders = contextvars.ContextVar('query_recorders', default=())
+
+
+class NPlusOneError(AssertionError):
+    """
+    Raised when a request repeats the same query (N+1 pattern)
+    and settings.QUERY_INSPECTOR_RAISE is set.
+    """
+
+
+def query_shape(sql):
+    """
+    Return SQL with parameter lists and numbers collapsed,
+    so queries differing only in parameters have the same shape.
+    """
+    sql = PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return NUMBER_RE.sub('N', sql)
+
+
+def query_origin():
+    """
+    Return place which issued the query: the template line being rendered
+    or the innermost frame of the project code.
+    """
+    frame = sys._getframe(2)
+    code_origin = None
+    while frame is not None:
+        node = frame.f_locals.get('self') \
+            if frame.f_code.co_name == 'render_annotated' else None
+        if isinstance(node, Node) and getattr(node, 'origin', None) \
+                and getattr(node, 'token', None):
+            name = node.origin.template_name or node.origin.name
+            return f'{name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_origin is None and filename.startswith(PROJECT_DIR) \
+                and filename != THIS_FILE and 'site-packages' not in filename:
+            code_origin = f'{os.path.relpath(filename, PROJECT_DIR)}:' \
+                          f'{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return code_origin or 'unknown'
+
+
+class QueryRecord:
+    """
+    Single executed query.
+    """
+    def __init__(self, alias, sql, duration, origin):
+        self.alias = alias
+        self.sql = sql
+        self.duration = duration
+        self.origin = origin
+        self.shape = query_shape(sql)
+
+
+@wrap_queries
+def record_query(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        origin = query_origin()
+        for recorder in recorders:
+            recorder.queries.append(QueryRecord(
+                context['connection'].alias, sql, duration, origin))
+
+
+class QueryRecorder:
+    """
+    Record queries of every database connection used by the current
+    context, including worker threads of async views.
+    """
+    def __init__(self):
+        self.queries = []
+        self._token = None
+
+    def __enter__(self):
+        self._token = _recorders.set(_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorders.reset(self._token)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def repeated(self, threshold=None):
+        """
+        Return dict query shape -> records of queries
+        executed at least threshold times (N+1 candidates).
+        """
+        if threshold is None:
+            threshold = settings.QUERY_INSPECTOR_THRESHOLD
+        by_shape = defaultdict(list)
+        for query in self.queries:
+            if not query.shape.startswith(TRANSACTION_STATEMENTS):
+                by_shape[query.shape].append(query)
+        return {shape: queries for shape, queries in by_shape.items()
+                if len(queries) >= threshold}
+
+    def report(self, threshold=None):
+        """
+        Return human-readable description of repeated queries.
+        """
+        lines = []
+        for shape, queries in self.repeated(threshold).items():
+            origins = sorted({query.origin for query in queries})
+            lines.append(f'{len(queries)}x {shape}')
+            lines.extend(f'    from {origin}' for origin in origins)
+        return '\n'.join(lines)
+
+
+class QueryInspectorMiddleware(AsyncCapableMiddleware):
+    """
+    Development and CI middleware recording queries of every request.
+    Adds X-Query-Count and X-Query-Duration headers, logs repeated
+    queries (N+1) with the template line or code which issued them
+    and raises NPlusOneError when settings.QUERY_INSPECTOR_RAISE is set.
+    Enabled by settings.QUERY_INSPECTOR. Runs on the event loop under ASGI.
+    """
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.inspect(request, response, recorder)
+
+    async def __acall__(self, request):
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.inspect(request, response, recorder)
+
+    def inspect(self, request, response, recorder):
+        response['X-Query-Count'] = str(len(recorder.queries))
+        response['X-Query-Duration'] = f'{recorder.duration * 1000:.1f}ms'
+        report = recorder.report()
+        if report:
+            message = f'Repeated queries in {request.method} ' \
+                      f'{request.path}:\n{report}'
+            if settings.QUERY_INSPECTOR_RAISE:
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin to declare how many queries a block of code may run.
+    """
+    @contextmanager
+    def assertQueryBudget(self, budget, allow_repeated=False):
+        """
+        Fail when the block executes more than budget queries or,
+        unless allow_repeated, repeats the same query (N+1).
+        """
+        with QueryRecorder() as recorder:
+            yield recorder
+        details = '\n'.join(f'{query.origin}: {query.sql}'
+                            for query in recorder.queries)
+        if len(recorder.queries) > budget:
+            self.fail(f'{len(recorder.queries)} queries executed, '
+                      f'budget is {budget}:\n{details}')
+        report = recorder.report()
+        if report and not allow_repeated:
+            self.fail(f'Repeated queries:\n{report}')
@@ -0,0 +1,134 @@
+import threading
+import time
+
+from django.db import DatabaseError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Region, Category
+
+# seconds before a missing key reloads the table again, so requests
+# for values without a row do not query the database every time
+MISS_RELOAD_INTERVAL = 60
+
+
+class ReferenceCache:
+    """
+    Process-wide cache of a small reference table (regions, categories),
+    keyed by primary key and by choice value.
+    Loaded on first use (or by warm_reference_cache on startup) and cleared
+    by signals when a row changes.
+    """
+    def __init__(self, model, value_field, clock=time.monotonic):
+        self.model = model
+        self.value_field = value_field
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._by_pk = None
+        self._by_value = None
+        self._loaded_at = None
+
+    def warm(self):
+        """
+        Load all rows from the database.
+        """
+        rows = list(self.model.objects.order_by(self.value_field, 'pk'))
+        by_value = {}
+        for row in rows:
+            by_value.setdefault(getattr(row, self.value_field), []).append(row)
+        with self._lock:
+            self._by_pk = {row.pk: row for row in rows}
+            self._by_value = by_value
+            self._loaded_at = self.clock()
+
+    def clear(self):
+        with self._lock:
+            self._by_pk = None
+            self._by_value = None
+
+    def _tables(self):
+        by_pk, by_value = self._by_pk, self._by_value
+        if by_pk is None:
+            self.warm()
+            by_pk, by_value = self._by_pk, self._by_value
+        return by_pk, by_value
+
+    def _lookup(self, table, key):
+        result = self._tables()[table].get(key)
+        if result is None and \
+                self.clock() - self._loaded_at >= MISS_RELOAD_INTERVAL:
+            # row could have been added by another process
+            self.warm()
+            result = self._tables()[table].get(key)
+        return result
+
+    def all(self):
+        """
+        Return all rows ordered by choice value.
+        """
+        return sorted(self._tables()[0].values(),
+                      key=lambda row: (getattr(row, self.value_field), row.pk))
+
+    def by_pk(self, pk):
+        """
+        Return row with given primary key or None.
+        """
+        if pk is None:
+            return None
+        return self._lookup(0, pk)
+
+    def by_value(self, value):
+        """
+        Return first row with given choice value or None.
+        """
+        pks = self.pks_for_value(value)
+        return self.by_pk(pks[0]) if pks else None
+
+    def pks_for_value(self, value):
+        """
+        Return primary keys of all rows with given choice value.
+        """
+        if value is None or value == '':
+            return []
+        return [row.pk for row in self._lookup(1, int(value)) or []]
+
+    def value_for_pk(self, pk):
+        """
+        Return choice value of the row with given primary key.
+        """
+        row = self.by_pk(pk)
+        return None if row is None else getattr(row, self.value_field)
+
+
+regions = ReferenceCache(Region, 'voivodeship_name')
+categories = ReferenceCache(Category, 'category_name')
+
+
+def warm_reference_cache():
+    """
+    Load regions and categories when the server starts.
+    Errors (e.g. before migrations were run) are ignored,
+    the tables are then loaded on first use.
+    """
+    try:
+        regions.warm()
+        categories.warm()
+    except DatabaseError:
+        clear_reference_cache()
+
+
+def clear_reference_cache():
+    regions.clear()
+    categories.clear()
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def clear_regions(sender, **kwargs):
+    regions.clear()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def clear_categories(sender, **kwargs):
+    categories.clear()
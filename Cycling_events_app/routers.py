@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import random
+
+from django.conf import settings
+
+from .middleware import AsyncCapableMiddleware
+
+PIN_COOKIE = 'primary_pin'
+READ_METHODS = ('GET', 'HEAD')
+
+_state = contextvars.ContextVar('database_routing', default=None)
+
+
+class RoutingState:
+    """
+    Database routing of the current request.
+    """
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica_reads = False
+        self.wrote = False
+
+    @property
+    def use_replica(self):
+        return self.replica_reads and not self.pinned and not self.wrote
+
+
+def reads_from_replica():
+    """
+    Return True when the current request reads from a replica,
+    so values it caches may lag behind the primary.
+    """
+    state = _state.get()
+    return bool(state and state.use_replica and settings.DATABASE_REPLICAS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads of views marked with replica_reads to a random replica
+    of settings.DATABASE_REPLICAS and everything else to the primary
+    (default) database. A request which writes reads from the primary
+    from then on, and so does its client for REPLICA_PIN_SECONDS
+    (read-your-writes, see ReplicaMiddleware).
+    """
+    def db_for_read(self, model, **hints):
+        if reads_from_replica():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware(AsyncCapableMiddleware):
+    """
+    Enable replica reads for GET and HEAD requests of views with
+    the replica_reads attribute and pin the client to the primary
+    with a cookie after a request which wrote to the database.
+    Runs on the event loop under ASGI, so async views are not moved
+    to a worker thread.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if asyncio.iscoroutinefunction(self):
+            self.process_view = self.aprocess_view
+
+    def handle(self, request):
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        state = RoutingState(pinned=PIN_COOKIE in request.COOKIES)
+        return state, _state.set(state)
+
+    def finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.select_database(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args,
+                            view_kwargs):
+        self.select_database(request, view_func)
+
+    def select_database(self, request, view_func):
+        view_class = getattr(view_func, 'view_class', None)
+        if request.method in READ_METHODS \
+                and getattr(view_class, 'replica_reads', False):
+            _state.get().replica_reads = True
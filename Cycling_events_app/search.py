@@ -0,0 +1,217 @@
+import bisect
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Event
+from .text import normalize, tokenize
+
+# searched fields with their tsvector weight and in-memory index weight
+SEARCH_FIELDS = (
+    ('event_name', 'A', 1.0),
+    ('start', 'B', 0.4),
+    ('finish', 'B', 0.4),
+    ('route_description', 'C', 0.2),
+)
+SEARCHED_FIELDS = {field for field, _, _ in SEARCH_FIELDS}
+INDEX_VERSION_KEY = 'search:index:version'
+VECTOR_UPDATE_BATCH_SIZE = 500
+
+
+def uses_postgres_search():
+    """
+    Return True when events can be searched with PostgreSQL full text search.
+    """
+    return connection.vendor == 'postgresql'
+
+
+def search_vector_for(event):
+    """
+    Build tsvector expression from normalized fields of the event.
+    Text is normalized in Python, so the 'simple' configuration is enough
+    and no database extension is needed.
+    """
+    vector = None
+    for field, weight, _ in SEARCH_FIELDS:
+        part = SearchVector(Value(normalize(getattr(event, field))),
+                            weight=weight, config='simple')
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def update_search_vectors(events):
+    """
+    Store search vectors of the given created or edited events
+    (on PostgreSQL) or rebuild the in-memory index on the next search.
+    """
+    if not uses_postgres_search():
+        invalidate_index()
+        return
+    events = list(events)
+    # one UPDATE per chunk instead of one per event
+    for start in range(0, len(events), VECTOR_UPDATE_BATCH_SIZE):
+        chunk = events[start:start + VECTOR_UPDATE_BATCH_SIZE]
+        Event.objects.filter(pk__in=[event.pk for event in chunk])\
+            .update(search_vector=Case(*(
+                When(pk=event.pk, then=search_vector_for(event))
+                for event in chunk)))
+
+
+@receiver(post_save, sender=Event)
+def update_event_search_vector(sender, instance, raw=False,
+                               update_fields=None, **kwargs):
+    """
+    Refresh search vector after the searched fields of the event changed.
+    """
+    if raw or update_fields is not None \
+            and not SEARCHED_FIELDS & set(update_fields):
+        return
+    update_search_vectors([instance])
+
+
+@receiver(post_delete, sender=Event)
+def remove_deleted_event(sender, **kwargs):
+    if not uses_postgres_search():
+        invalidate_index()
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index used when the database has no full text search
+    (e.g. SQLite in tests and development).
+    """
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.size = 0
+
+    def add(self, doc_id, weighted_texts):
+        """
+        Index document.
+        :param doc_id:
+        :param weighted_texts: iterable of (text, weight)
+        """
+        for text, weight in weighted_texts:
+            for token in tokenize(text):
+                scores = self.postings[token]
+                scores[doc_id] = scores.get(doc_id, 0) + weight
+        self.size += 1
+
+    def freeze(self):
+        """
+        Sort terms, so they can be matched by prefix.
+        """
+        self.terms = sorted(self.postings)
+
+    def _prefix_postings(self, prefix):
+        matched = {}
+        position = bisect.bisect_left(self.terms, prefix)
+        while position < len(self.terms) \
+                and self.terms[position].startswith(prefix):
+            for doc_id, score in self.postings[self.terms[position]].items():
+                matched[doc_id] = matched.get(doc_id, 0) + score
+            position += 1
+        return matched
+
+    def search(self, query):
+        """
+        Return ids of documents containing every word of the query
+        (as a word prefix), best matches first.
+        """
+        scores = None
+        for token in tokenize(query):
+            matched = self._prefix_postings(token)
+            if not matched:
+                return []
+            idf = math.log(1 + self.size / len(matched))
+            if scores is None:
+                scores = {doc_id: tf * idf for doc_id, tf in matched.items()}
+            else:
+                scores = {doc_id: score + matched[doc_id] * idf
+                          for doc_id, score in scores.items()
+                          if doc_id in matched}
+        if not scores:
+            return []
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+
+def index_version():
+    """
+    Return version of the searched content of events, changed only
+    when events are created, deleted or their searched fields edited
+    (sign ups do not rebuild the index).
+    """
+    return cache.get_or_set(INDEX_VERSION_KEY, time.time_ns, None)
+
+
+def invalidate_index():
+    """
+    Rebuild the in-memory index of every process on its next search,
+    once more after the transaction commits (see invalidate_events).
+    """
+    cache.set(INDEX_VERSION_KEY, time.time_ns(), None)
+    transaction.on_commit(
+        lambda: cache.set(INDEX_VERSION_KEY, time.time_ns(), None))
+
+
+def get_index():
+    """
+    Return in-memory index of all events,
+    rebuilt after the searched content of events has changed.
+    """
+    global _index, _index_version
+    version = index_version()
+    with _index_lock:
+        if _index is None or _index_version != version:
+            index = InvertedIndex()
+            fields = [field for field, _, _ in SEARCH_FIELDS]
+            weights = [weight for _, _, weight in SEARCH_FIELDS]
+            rows = Event.objects.order_by().values_list('id', *fields)
+            for row in rows.iterator(chunk_size=2000):
+                index.add(row[0], zip(row[1:], weights))
+            index.freeze()
+            _index, _index_version = index, version
+        return _index
+
+
+def search_events(query, page=1, page_size=20):
+    """
+    Search events by name, start, finish and route description.
+    :param query: searched words
+    :param page: page number starting from 1
+    :param page_size: number of events on a page
+    :return: tuple (list of events, True if there is a next page)
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return [], False
+    offset = (page - 1) * page_size
+    events = Event.objects.all()
+
+    if uses_postgres_search():
+        search_query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens),
+            search_type='raw', config='simple')
+        results = list(
+            events.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', 'id')[offset:offset + page_size + 1])
+    else:
+        ids = get_index().search(query)[offset:offset + page_size + 1]
+        found = events.in_bulk(ids)
+        results = [found[event_id] for event_id in ids if event_id in found]
+    return results[:page_size], len(results) > page_size
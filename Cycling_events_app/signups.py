@@ -0,0 +1,210 @@
+import logging
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import F, Max
+
+from .caching import invalidate_events
+from .models import Event, Profile, WaitlistEntry
+from .tasks import submit_on_commit
+
+logger = logging.getLogger(__name__)
+
+Participant = Event.event_participant.through
+
+
+class SignupError(Exception):
+    """
+    Base class for errors raised while signing up for an event.
+    """
+
+
+class EventFull(SignupError):
+    """
+    Raised when there are no free places left on the event.
+    """
+
+
+class AlreadySignedUp(SignupError):
+    """
+    Raised when the profile is already on the participants list.
+    """
+
+
+class AlreadyWaiting(SignupError):
+    """
+    Raised when the profile is already on the waitlist.
+    """
+    def __init__(self, event, position):
+        super().__init__(event, position)
+        self.event = event
+        self.position = position
+
+
+def lock_event(event_id, *fields):
+    """
+    Return event row locked until the end of the transaction,
+    which serializes sign ups, resignations and waitlist changes.
+    """
+    return Event.objects.select_for_update()\
+        .only('id', 'event_name', *fields).get(id=event_id)
+
+
+def sign_up(event_id, profile):
+    """
+    Add profile to the event participants.
+    The event row is locked for the duration of the check, so concurrent
+    sign ups are serialized and can not exceed the limit. The participant
+    counter is updated in the same transaction.
+    :param event_id: id of the event
+    :param profile: profile of the user signing up
+    :return: signed up event
+    """
+    with transaction.atomic():
+        event = lock_event(event_id, 'limit', 'participant_count')
+        if event.free_places <= 0:
+            raise EventFull(event)
+        if Participant.objects.filter(event_id=event.id,
+                                      profile_id=profile.id).exists():
+            raise AlreadySignedUp(event)
+        Participant.objects.create(event_id=event.id, profile_id=profile.id)
+        Event.objects.filter(id=event.id)\
+            .update(participant_count=F('participant_count') + 1)
+        invalidate_events(event.id)
+    return event
+
+
+def resign(event_id, profile):
+    """
+    Remove profile from the event participants and give the freed place
+    to the head of the waitlist in the same transaction.
+    :param event_id: id of the event
+    :param profile: profile of the user resigning
+    :return: event
+    """
+    with transaction.atomic():
+        event = lock_event(event_id, 'limit', 'participant_count')
+        deleted, _ = Participant.objects.filter(
+            event_id=event.id, profile_id=profile.id).delete()
+        if deleted:
+            Event.objects.filter(id=event.id)\
+                .update(participant_count=F('participant_count') - deleted)
+            event.participant_count -= deleted
+            invalidate_events(event.id)
+            promote(event)
+    return event
+
+
+def join_waitlist(event_id, profile):
+    """
+    Append profile to the end of the event waitlist. A place freed
+    since the event was found full is given to the waitlist at once.
+    :param event_id: id of the event
+    :param profile: profile of the user waiting
+    :return: tuple (event, position on the waitlist or None
+        when the profile was signed up right away)
+    """
+    with transaction.atomic():
+        event = lock_event(event_id, 'limit', 'participant_count')
+        if Participant.objects.filter(event_id=event.id,
+                                      profile_id=profile.id).exists():
+            raise AlreadySignedUp(event)
+        position = WaitlistEntry.objects\
+            .filter(event_id=event.id, profile_id=profile.id)\
+            .values_list('position', flat=True).first()
+        if position is not None:
+            raise AlreadyWaiting(event, position)
+        last = WaitlistEntry.objects.filter(event_id=event.id)\
+            .aggregate(last=Max('position'))['last'] or 0
+        WaitlistEntry.objects.create(event_id=event.id, profile_id=profile.id,
+                                     position=last + 1)
+        if profile.id in promote(event):
+            return event, None
+    return event, last + 1
+
+
+def leave_waitlist(event_id, profile):
+    """
+    Remove profile from the event waitlist, riders behind move forward.
+    :return: event
+    """
+    with transaction.atomic():
+        event = lock_event(event_id)
+        entry = WaitlistEntry.objects.filter(
+            event_id=event.id, profile_id=profile.id).first()
+        if entry is not None:
+            entry.delete()
+            WaitlistEntry.objects\
+                .filter(event_id=event.id, position__gt=entry.position)\
+                .update(position=F('position') - 1)
+    return event
+
+
+def promote(event):
+    """
+    Move riders from the head of the waitlist to the free places.
+    Call inside a transaction with the event row locked (lock_event).
+    Riders are notified in the background after the commit.
+    :return: ids of promoted profiles
+    """
+    free_places = event.free_places
+    if free_places <= 0:
+        return []
+    entries = list(WaitlistEntry.objects.filter(event_id=event.id)
+                   .order_by('position')[:free_places]
+                   .values_list('id', 'profile_id'))
+    if not entries:
+        return []
+    profile_ids = [profile_id for _, profile_id in entries]
+    Participant.objects.bulk_create(
+        Participant(event_id=event.id, profile_id=profile_id)
+        for profile_id in profile_ids)
+    WaitlistEntry.objects.filter(id__in=[pk for pk, _ in entries]).delete()
+    # positions are dense, so the promoted were positions 1..len(entries)
+    WaitlistEntry.objects.filter(event_id=event.id)\
+        .update(position=F('position') - len(entries))
+    Event.objects.filter(id=event.id).update(
+        participant_count=F('participant_count') + len(entries))
+    event.participant_count += len(entries)
+    invalidate_events(event.id)
+    submit_on_commit(notify_promoted, event.id, profile_ids)
+    return profile_ids
+
+
+def update_event(form):
+    """
+    Save valid EditEventForm of an event and, when its limit changed,
+    give the free places to the waitlist in the same transaction.
+    The participant counter is not written, so sign ups and resignations
+    made since the event was read are kept.
+    :return: saved event with the current participant count
+    """
+    with transaction.atomic():
+        locked = lock_event(form.instance.id, 'limit', 'participant_count')
+        event = form.save(commit=False)
+        event.save(update_fields=[
+            field.name for field in Event._meta.concrete_fields
+            if not field.primary_key and field.name != 'participant_count'])
+        form.save_m2m()
+        event.participant_count = locked.participant_count
+        if 'limit' in form.changed_data:
+            # a raised limit gives the free places to the waitlist
+            promote(event)
+    return event
+
+
+def notify_promoted(event_id, profile_ids):
+    """
+    Send e-mail to riders moved from the waitlist to the participants.
+    """
+    event = Event.objects.only('id', 'event_name').get(id=event_id)
+    emails = Profile.objects.filter(id__in=profile_ids)\
+        .exclude(user__email='').values_list('user__email', flat=True)
+    subject = f'Miejsce na wydarzeniu {event.event_name}'
+    body = f'Zwolniło się miejsce na wydarzeniu {event.event_name} ' \
+           f'i zostałeś zapisany z listy rezerwowej.'
+    sent = send_mass_mail([(subject, body, settings.DEFAULT_FROM_EMAIL,
+                            [email]) for email in emails])
+    logger.info('Sent %d waitlist promotion e-mail(s) for event %s.',
+                sent, event_id)
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,5}$')
+TEMPORARY_SUFFIX = '.upload'
+# digest directories and file name added to the upload_to root
+HASHED_PATH_RE = re.compile(
+    r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})(?:\.[^/.]*)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store files under the SHA-256 hash of their content, e.g.
+    files/images/ab/cd/abcd...ef.jpg, so identical uploads share one file.
+
+    Every save of a file adds a reference to it and every delete removes one,
+    the file is removed from disk with its last reference. References are
+    kept in :model:`Cycling_events_app.StoredFile` and reconciled with
+    the database by the collect_media command.
+    """
+    def get_available_name(self, name, max_length=None):
+        # The final name depends only on the content, see _save.
+        return name
+
+    def upload_root(self, name):
+        """
+        Return the upload_to directory of the name, also when the name
+        is already a content address (a stored file saved again).
+        """
+        match = HASHED_PATH_RE.search(name)
+        if match:
+            return name[:match.start()]
+        return os.path.dirname(name)
+
+    def hashed_name(self, name, digest):
+        directory = self.upload_root(name)
+        extension = os.path.splitext(name)[1].lower()
+        if not EXTENSION_RE.match(extension):
+            extension = ''
+        return '/'.join(part for part in (
+            directory, digest[:2], digest[2:4], digest + extension) if part)
+
+    def make_directory(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode,
+                            exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _save(self, name, content):
+        """
+        Stream content to a temporary file while hashing it and move it
+        to its content address, unless a file with the same content exists.
+        """
+        directory = os.path.dirname(self.path(name))
+        self.make_directory(directory)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(
+                dir=directory, suffix=TEMPORARY_SUFFIX,
+                delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                temporary.close()
+                os.remove(temporary.name)
+                raise
+
+        name = self.hashed_name(name, digest.hexdigest())
+        full_path = self.path(name)
+        with transaction.atomic():
+            stored_file = self.add_reference(name, size)
+            if stored_file.ref_count == 1 or not os.path.exists(full_path):
+                self.make_directory(os.path.dirname(full_path))
+                os.replace(temporary.name, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+            else:
+                os.remove(temporary.name)
+        return name
+
+    def add_reference(self, name, size):
+        """
+        Add reference to the stored file and return its locked row.
+        """
+        StoredFile = apps.get_model('Cycling_events_app', 'StoredFile')
+        stored_file, created = StoredFile.objects.select_for_update()\
+            .get_or_create(name=name, defaults={'size': size, 'ref_count': 1})
+        if not created:
+            StoredFile.objects.filter(pk=stored_file.pk)\
+                .update(ref_count=F('ref_count') + 1)
+            stored_file.ref_count += 1
+        return stored_file
+
+    def delete(self, name):
+        """
+        Remove a reference to the file, delete the file with the last one.
+        Files stored before this storage was used have no references
+        and are deleted at once.
+        """
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        StoredFile = apps.get_model('Cycling_events_app', 'StoredFile')
+        with transaction.atomic():
+            stored_file = StoredFile.objects.select_for_update()\
+                .filter(name=name).first()
+            if stored_file is not None and stored_file.ref_count > 1:
+                StoredFile.objects.filter(pk=stored_file.pk)\
+                    .update(ref_count=F('ref_count') - 1)
+                return
+            if stored_file is not None:
+                stored_file.delete()
+            super().delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """
+    Storage of uploaded images (used as a callable, so migrations
+    do not depend on the storage settings).
+    """
+    return media_storage
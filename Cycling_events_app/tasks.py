@@ -0,0 +1,56 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return thread pool shared by all requests of this process.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TASKS_MAX_WORKERS,
+                thread_name_prefix='tasks')
+        return _executor
+
+
+def run_task(func, *args, **kwargs):
+    """
+    Run task in a worker thread, log errors and close the database
+    connection opened by the thread.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Task %s failed.', func.__name__)
+    finally:
+        connection.close()
+
+
+def submit(func, *args, **kwargs):
+    """
+    Run task off the request thread
+    (in place when settings.TASKS_EAGER is set).
+    """
+    if settings.TASKS_EAGER:
+        return func(*args, **kwargs)
+    return get_executor().submit(run_task, func, *args, **kwargs)
+
+
+def submit_on_commit(func, *args, **kwargs):
+    """
+    Run task after the current transaction is committed,
+    so the worker sees saved rows.
+    """
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
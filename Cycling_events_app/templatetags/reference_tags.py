@@ -0,0 +1,23 @@
+from django import template
+
+from Cycling_events_app.reference import regions, categories
+
+register = template.Library()
+
+
+@register.filter
+def region(pk):
+    """
+    Display name of the region with given id, e.g. {{ event.region_name_id|region }}
+    """
+    row = regions.by_pk(pk)
+    return '' if row is None else str(row)
+
+
+@register.filter
+def category(pk):
+    """
+    Display name of the category with given id.
+    """
+    row = categories.by_pk(pk)
+    return '' if row is None else str(row)
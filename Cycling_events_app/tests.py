@@ -1,7 +1,58 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from io import BytesIO, StringIO
+from unittest import mock
+
+import numpy
+import psycopg2
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse
+from django.template import Context, Template
+from asgiref.sync import sync_to_async
+from django.test import TestCase, TransactionTestCase, AsyncClient, Client, \
+    RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from django.contrib.auth.models import User
-from Cycling_events_app.models import Event, Bike
+from Cycling_events_app.models import Event, Bike, Region, Category, \
+    StoredFile, EventRoute, WaitlistEntry
+from Cycling_events_app.benchmarks import check_baseline, gpx_file, \
+    run_benchmark, seed_dataset, uncovered_routes
+from Cycling_events_app.handlers import StreamingASGIHandler
+from Cycling_events_app.forms import EditEventForm, FilterEventsForm, \
+    start_of_day
+from Cycling_events_app.geo import encode_geohash, events_near, geocode
+from Cycling_events_app.gpx import GpxError, analyze, simplify
+from Cycling_events_app.importing import EventImporter, iter_csv, iter_json
+from Cycling_events_app.metrics import registry
+from Cycling_events_app.pagination import FORWARD, encode_cursor
+from Cycling_events_app.postgresql_pool.base import ConnectionPool
+from Cycling_events_app.query_inspector import QueryBudgetMixin, \
+    QueryRecorder
+from Cycling_events_app.routers import PIN_COOKIE, ReplicaMiddleware
+from Cycling_events_app.reference import MISS_RELOAD_INTERVAL, \
+    ReferenceCache, clear_reference_cache, regions, categories
+from Cycling_events_app.search import get_index, search_events, \
+    uses_postgres_search
+from Cycling_events_app.signups import sign_up, resign, join_waitlist, \
+    leave_waitlist, update_event, EventFull, AlreadyWaiting
+from Cycling_events_app.text import normalize
+from Cycling_events_app.throttling import LoginThrottle, MemoryStore, \
+    client_ip, memory_store
 
 
 def create_event(event_name, limit):
@@ -83,6 +134,77 @@ class TestLoginSignupViews(TestCase):
         logged_in = c.login(username='testuser', password='12345')
         self.assertTrue(logged_in)
 
+    @override_settings(LOGIN_THROTTLE_USERNAME_LIMIT=3,
+                       LOGIN_THROTTLE_IP_LIMIT=10)
+    def test_login_throttling(self):
+        """
+        Test if logins are rejected before the password check
+        after too many failures for the username.
+        """
+        memory_store.failures.clear()
+        self.addCleanup(memory_store.failures.clear)
+        User.objects.create_user(username='testuser', password='12345')
+        for _ in range(3):
+            response = self.client.post(
+                reverse('login'), {'username': 'testuser', 'password': 'x'})
+            self.assertEqual(response.status_code, 200)
+        with mock.patch('Cycling_events_app.views.authenticate') as check:
+            response = self.client.post(
+                reverse('login'),
+                {'username': 'TestUser', 'password': '12345'})
+        check.assert_not_called()
+        self.assertContains(response, 'Zbyt wiele nieudanych prób',
+                            status_code=429)
+        response = self.client.post(
+            reverse('login'), {'username': 'other', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_sliding_window(self):
+        """
+        Test if failures older than the window are forgotten.
+        """
+        now = [1000.0]
+        request = RequestFactory().post('/')
+        throttle = LoginThrottle(request, 'rider', store=MemoryStore(),
+                                 clock=lambda: now[0])
+        for _ in range(settings.LOGIN_THROTTLE_USERNAME_LIMIT):
+            throttle.failed()
+            now[0] += 10
+        self.assertEqual(throttle.retry_after(),
+                         settings.LOGIN_THROTTLE_WINDOW - 50)
+        now[0] = 1000 + settings.LOGIN_THROTTLE_WINDOW + 1
+        self.assertEqual(throttle.retry_after(), 0)
+
+    def test_client_ip_behind_proxy(self):
+        """
+        Test if the address is read from X-Forwarded-For set by the
+        trusted proxies, forged entries before it are ignored.
+        """
+        request = RequestFactory().post(
+            '/', REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2, 3.3.3.3')
+        with override_settings(LOGIN_THROTTLE_TRUSTED_PROXIES=0):
+            self.assertEqual(client_ip(request), '10.0.0.1')
+        with override_settings(LOGIN_THROTTLE_TRUSTED_PROXIES=1):
+            self.assertEqual(client_ip(request), '3.3.3.3')
+            self.assertEqual(client_ip(RequestFactory().post(
+                '/', REMOTE_ADDR='10.0.0.1')), '10.0.0.1')
+        with override_settings(LOGIN_THROTTLE_TRUSTED_PROXIES=2):
+            self.assertEqual(client_ip(request), '2.2.2.2')
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_password_is_rehashed_at_login(self):
+        """
+        Test if changed number of iterations is applied at the next login.
+        """
+        user = User.objects.create_user(username='testuser', password='12345')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+        with self.settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.client.post(reverse('login'),
+                             {'username': 'testuser', 'password': '12345'})
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
 
 class TestEditProfile(TestCase):
     """
@@ -129,6 +251,45 @@ class TestEditProfile(TestCase):
         self.assertEqual(response.status_code, 302)
 
 
+class TestCachedAuthentication(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up logged in user.
+        """
+        self.client = Client()
+        self.user = User.objects.create_user(username='test', password='12345')
+        self.client.login(username='test', password='12345')
+
+    def test_page_view_runs_no_auth_queries(self):
+        """
+        Test if session, user and profile are read from the cache.
+        """
+        self.client.get(reverse('main'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('main'))
+        self.assertContains(response, 'Witaj test!')
+        tables = ('django_session', 'auth_user', 'Cycling_events_app_profile')
+        self.assertEqual([query['sql'] for query in queries
+                          if any(table in query['sql'] for table in tables)],
+                         [])
+
+    def test_profile_edit_refreshes_snapshot(self):
+        """
+        Test if the cached user is dropped after the profile is saved
+        and after the password is changed.
+        """
+        self.client.get(reverse('main'))
+        self.client.post(reverse('edit-profile'),
+                         {'first_name': 'Jan', 'age': '45'})
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['user'].profile.age, 45)
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get(reverse('main'))
+        self.assertContains(response, 'Logowanie')
+
+
 class TestMyEventsView(TestCase):
     def setUp(self):
         """
@@ -137,7 +298,7 @@ class TestMyEventsView(TestCase):
         self.client = Client()
         self.myevents_url = reverse('my-events')
 
-    def test_anonymus_cannot_see_page(self):\
+    def test_anonymus_cannot_see_page(self):
         """
         test view limitation for a user that is not logged in.
         """
@@ -192,6 +353,160 @@ class TestEventsView(TestCase):
         response = self.client.get(self.events_url)
         self.assertQuerysetEqual(response.context['events'], [event2, event1])
 
+    def test_pagination_cursors(self):
+        """
+        Test if next and previous cursors return neighbouring pages.
+        """
+        creator = User.objects.create_user(username='creator', password='12345')
+        events = [
+            Event.objects.create(
+                event_name=f'event{number}', event_type=1, limit=2,
+                distance=100, route_description='test',
+                date="2022-09-17 00:00:00.000000 +00:00",
+                start='test', finish='test', event_creator=creator)
+            for number in range(5)
+        ]
+        response = self.client.get(self.events_url, {'page_size': 2})
+        page = response.context['page']
+        self.assertEqual(list(page), events[:2])
+        self.assertFalse(page.has_previous)
+
+        response = self.client.get(
+            self.events_url, {'page_size': 2, 'cursor': page.next_cursor})
+        page = response.context['page']
+        self.assertEqual(list(page), events[2:4])
+
+        response = self.client.get(
+            self.events_url, {'page_size': 2, 'cursor': page.previous_cursor})
+        self.assertEqual(list(response.context['page']), events[:2])
+
+    def test_invalid_cursor(self):
+        """
+        Test if broken cursor returns 404.
+        """
+        response = self.client.get(self.events_url, {'cursor': '!!!'})
+        self.assertEqual(response.status_code, 404)
+        for values in (['event', 'x'], ['event', None], ['event', [1]],
+                       ['event']):
+            cursor = encode_cursor(values, FORWARD)
+            response = self.client.get(self.events_url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(reverse('api-events'),
+                                       {'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+
+
+class TestFilterEventsView(TestCase):
+
+    def setUp(self):
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.events_url = reverse('events')
+        creator = User.objects.create_user('creator')
+        self.addCleanup(clear_reference_cache)
+        mazowieckie = Region.objects.create(voivodeship_name=7)
+        slaskie = Region.objects.create(voivodeship_name=12)
+        road = Category.objects.create(category_name=1)
+        mtb = Category.objects.create(category_name=2)
+
+        def create(name, region, category, distance, date, limit=5):
+            return Event.objects.create(
+                event_name=name, event_type=1, limit=limit,
+                distance=distance, route_description='test', date=date,
+                start='test', finish='test', region_name=region,
+                categories=category, event_creator=creator)
+
+        self.road_race = create('a road', mazowieckie, road, 150,
+                                "2030-05-01 10:00:00 +00:00")
+        self.mtb_race = create('b mtb', mazowieckie, mtb, 40,
+                               "2030-06-01 10:00:00 +00:00")
+        self.full_mtb_race = create('c mtb', slaskie, mtb, 60,
+                                    "2030-07-01 10:00:00 +00:00", limit=0)
+
+    def filter(self, **params):
+        return list(self.client.get(self.events_url, params).context['events'])
+
+    def test_no_filters(self):
+        """
+        Test if all events are listed without filters.
+        """
+        self.assertEqual(
+            self.filter(),
+            [self.road_race, self.mtb_race, self.full_mtb_race])
+
+    def test_single_filter(self):
+        """
+        Test if bike type alone filters events from every region.
+        """
+        self.assertEqual(self.filter(categories=2),
+                         [self.mtb_race, self.full_mtb_race])
+
+    def test_combined_filters(self):
+        """
+        Test if date, distance and free places filters are combined.
+        """
+        self.assertEqual(self.filter(categories=2, free_only='on'),
+                         [self.mtb_race])
+        self.assertEqual(self.filter(distance_min=50),
+                         [self.road_race, self.full_mtb_race])
+        self.assertEqual(
+            self.filter(date_from='2030-06-01', date_to='2030-06-01'),
+            [self.mtb_race])
+
+    def test_filters_kept_in_pagination_links(self):
+        """
+        Test if next page link keeps active filters.
+        """
+        response = self.client.get(self.events_url,
+                                   {'categories': 2, 'page_size': 1})
+        self.assertEqual(list(response.context['events']), [self.mtb_race])
+        response = self.client.get(
+            f"{self.events_url}?{response.context['query_string']}"
+            f"&cursor={response.context['page'].next_cursor}")
+        self.assertEqual(list(response.context['events']),
+                         [self.full_mtb_race])
+
+    def test_invalid_filters_not_kept_in_links(self):
+        """
+        Test if links of the page cached for the unfiltered list
+        do not repeat invalid filters.
+        """
+        response = self.client.get(self.events_url,
+                                   {'region_name': 'bogus', 'page_size': 1})
+        self.assertIn('region_name', response.context['form'].errors)
+        self.assertEqual(response.context['query_string'], 'page_size=1')
+        response = self.client.get(self.events_url, {'page_size': 1})
+        self.assertNotContains(response, 'bogus')
+
+    def test_cleaned_filters_kept_in_links(self):
+        """
+        Test if links built from the cleaned filters select the same events.
+        """
+        params = {'categories': '2', 'free_only': 'on',
+                  'date_from': '2030-06-01', 'distance_min': '10'}
+        response = self.client.get(self.events_url, params)
+        events = list(response.context['events'])
+        self.assertEqual(events, [self.mtb_race])
+        response = self.client.get(
+            f"{self.events_url}?{response.context['query_string']}")
+        self.assertFalse(response.context['form'].errors)
+        self.assertEqual(list(response.context['events']), events)
+        form = FilterEventsForm({'near': '50.06, 19.94',
+                                 'bbox': '49.9,19.9,50.01,20.1'})
+        self.assertTrue(form.is_valid())
+        cleaned = FilterEventsForm(form.get_query())
+        self.assertTrue(cleaned.is_valid())
+        self.assertEqual(cleaned.cleaned_data, form.cleaned_data)
+
+    def test_post_redirects_to_query_string(self):
+        """
+        Test if filters sent with POST are redirected to GET.
+        """
+        response = self.client.post(self.events_url, {'categories': 2})
+        self.assertRedirects(response, f'{self.events_url}?categories=2')
+
 
 class TestAddEditEventView(TestCase):
 
@@ -305,6 +620,543 @@ class TestEventSignupView(TestCase):
         self.assertEqual(len(event.event_participant.all()), 0)
         self.assertEqual(response.status_code, 302)
 
+    def test_signup_queries_do_not_depend_on_participants(self):
+        """
+        Test if sign up runs the same queries for small and big events.
+        """
+        small = create_event2('small', 100)
+        big = self.event
+        big.limit = 100
+        big.save()
+        for number in range(20):
+            user = User.objects.create_user(f'rider{number}')
+            big.event_participant.add(user.profile)
+        first = User.objects.create_user('first')
+        second = User.objects.create_user('second')
+        with CaptureQueriesContext(connection) as small_queries:
+            sign_up(small.id, first.profile)
+        with CaptureQueriesContext(connection) as big_queries:
+            sign_up(big.id, second.profile)
+        self.assertEqual(len(small_queries), len(big_queries))
+        self.assertEqual(big.event_participant.count(), 21)
+
+    def test_signup_limit_is_strict(self):
+        """
+        Test if sign up raises EventFull once the limit is reached.
+        """
+        event = self.event
+        first = User.objects.create_user('first')
+        second = User.objects.create_user('second')
+        third = User.objects.create_user('third')
+        sign_up(event.id, first.profile)
+        sign_up(event.id, second.profile)
+        with self.assertRaises(EventFull):
+            sign_up(event.id, third.profile)
+        self.assertEqual(event.event_participant.count(), 2)
+
+    def test_participant_count_follows_signup_and_resignation(self):
+        """
+        Test if the participant counter is kept in sync by the views.
+        """
+        event = self.event
+        user = User.objects.create_user(
+            'TestUser', 'test@xyz.com', 'testpassword')
+        self.client.force_login(user=user)
+        self.client.get(reverse('event-signup', kwargs={"id": event.id}))
+        event.refresh_from_db()
+        self.assertEqual(event.participant_count, 1)
+        response = self.client.get(
+            reverse('event-details', kwargs={"id": event.id}))
+        self.assertEqual(response.context['avb'], 1)
+        self.client.get(reverse('event-resignation', kwargs={"id": event.id}))
+        event.refresh_from_db()
+        self.assertEqual(event.participant_count, 0)
+
+    def test_repair_participant_counts(self):
+        """
+        Test if the repair command fixes drifted counters.
+        """
+        event = self.event
+        user = User.objects.create_user('TestUser')
+        event.event_participant.add(user.profile)
+        Event.objects.filter(id=event.id).update(participant_count=7)
+        call_command('repair_participant_counts', stdout=StringIO())
+        event.refresh_from_db()
+        self.assertEqual(event.participant_count, 1)
+
+
+class TestWaitlist(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up full event with three riders waiting.
+        """
+        settings_override = override_settings(TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.event = create_event('testname', 1)
+        self.rider = User.objects.create_user('rider', 'rider@xyz.com')
+        sign_up(self.event.id, self.rider.profile)
+        self.waiting = [User.objects.create_user(f'waiting{number}',
+                                                 f'waiting{number}@xyz.com')
+                        for number in range(3)]
+        for user in self.waiting:
+            join_waitlist(self.event.id, user.profile)
+
+    def positions(self):
+        return list(WaitlistEntry.objects.filter(event=self.event)
+                    .order_by('position')
+                    .values_list('profile__user__username', 'position'))
+
+    def test_signup_of_full_event_joins_waitlist(self):
+        """
+        Test if sign up view puts the user at the end of the waitlist.
+        """
+        user = User.objects.create_user('late', password='12345')
+        self.client.force_login(user=user)
+        url = reverse('event-signup', kwargs={"id": self.event.id})
+        response = self.client.get(url, follow=True)
+        self.assertContains(response, 'pozycji 4')
+        response = self.client.get(url, follow=True)
+        self.assertContains(response, 'Jesteś już na liście rezerwowej')
+        self.assertEqual(WaitlistEntry.objects.filter(
+            event=self.event, profile=user.profile).get().position, 4)
+        with self.assertRaises(AlreadyWaiting):
+            join_waitlist(self.event.id, user.profile)
+
+    def test_resignation_promotes_head_of_waitlist(self):
+        """
+        Test if the freed place goes to the first rider waiting,
+        who is notified by e-mail after the commit.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            resign(self.event.id, self.rider.profile)
+        self.event.refresh_from_db()
+        self.assertEqual(list(self.event.event_participant.all()),
+                         [self.waiting[0].profile])
+        self.assertEqual(self.event.participant_count, 1)
+        self.assertEqual(self.positions(),
+                         [('waiting1', 1), ('waiting2', 2)])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['waiting0@xyz.com'])
+
+    def test_leaving_keeps_positions_dense(self):
+        """
+        Test if riders behind the one leaving move forward.
+        """
+        self.client.force_login(user=self.waiting[0])
+        response = self.client.get(reverse(
+            'waitlist-resignation', kwargs={"id": self.event.id}))
+        self.assertEqual(response.status_code, 302)
+        leave_waitlist(self.event.id, self.waiting[1].profile)
+        self.assertEqual(self.positions(), [('waiting2', 1)])
+
+    def test_raised_limit_promotes_waiting_riders(self):
+        """
+        Test if raising the limit through the API fills the new places.
+        """
+        Event.objects.filter(id=self.event.id).update(
+            region_name=Region.objects.create(voivodeship_name=6),
+            categories=Category.objects.create(category_name=1))
+        self.client.force_login(user=self.event.event_creator)
+        response = self.client.patch(
+            reverse('api-event', kwargs={'id': self.event.id}),
+            json.dumps({'limit': 3}), content_type='application/json')
+        self.assertEqual(response.json()['participant_count'], 3)
+        self.assertEqual(self.positions(), [('waiting2', 1)])
+        self.client.force_login(user=self.waiting[2])
+        response = self.client.get(
+            reverse('api-event-waitlist', kwargs={'id': self.event.id}))
+        self.assertEqual(response.json()['position'], 1)
+        response = self.client.get(reverse('my-events'))
+        self.assertContains(response, 'Pozycja na liście rezerwowej: 1')
+
+    def test_edit_keeps_concurrent_resignation(self):
+        """
+        Test if saving an edit form read before a resignation does not
+        write back the old participant count.
+        """
+        event = Event.objects.get(id=self.event.id)
+        WaitlistEntry.objects.all().delete()
+        resign(self.event.id, self.rider.profile)
+        form = EditEventForm({
+            'event_name': 'edited', 'event_type': 1, 'limit': 1,
+            'distance': 150, 'route_description': 'test',
+            'date_year': 2022, 'date_month': 9, 'date_day': 17,
+            'start': 'test', 'finish': 'test',
+            'region_name': Region.objects.create(voivodeship_name=6).pk,
+            'categories': Category.objects.create(category_name=1).pk,
+        }, instance=event)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(update_event(form).participant_count, 0)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.event_name, 'edited')
+        self.assertEqual(self.event.participant_count, 0)
+
+
+class TestEventCache(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.event = create_event('cached', 2)
+
+    def test_list_invalidated_after_edit(self):
+        """
+        Test if the cached events list shows edited event name.
+        """
+        self.client.get(reverse('events'))
+        self.event.event_name = 'renamed'
+        self.event.save()
+        response = self.client.get(reverse('events'))
+        self.assertContains(response, 'renamed')
+        self.assertNotContains(response, 'cached')
+
+    def test_details_invalidated_after_signup(self):
+        """
+        Test if the cached event details show current free places.
+        """
+        url = reverse('event-details', kwargs={"id": self.event.id})
+        response = self.client.get(url)
+        self.assertContains(response, 'Ilość wolnych miejsc: 2')
+        user = User.objects.create_user('TestUser')
+        sign_up(self.event.id, user.profile)
+        response = self.client.get(url)
+        self.assertContains(response, 'Ilość wolnych miejsc: 1')
+
+
+class TestReferenceCache(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.addCleanup(clear_reference_cache)
+        self.client = Client()
+        self.region = Region.objects.create(voivodeship_name=6)
+        self.category = Category.objects.create(category_name=2)
+        event = create_event('cached lookups', 2)
+        event.region_name = self.region
+        event.categories = self.category
+        event.save()
+
+    def test_events_list_does_not_join_lookup_tables(self):
+        """
+        Test if regions and categories are rendered from the cache.
+        """
+        regions.warm()
+        categories.warm()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('events'))
+        self.assertContains(response, 'małopolskie')
+        for query in queries.captured_queries:
+            self.assertNotIn('cycling_events_app_region', query['sql'])
+            self.assertNotIn('cycling_events_app_category', query['sql'])
+
+    def test_cache_cleared_after_change(self):
+        """
+        Test if a new region is visible without restarting the process.
+        """
+        self.assertIsNone(regions.by_value(7))
+        region = Region.objects.create(voivodeship_name=7)
+        self.assertEqual(regions.by_value(7), region)
+        self.assertEqual(categories.value_for_pk(self.category.pk), 2)
+
+    def test_missing_value_reloads_table_once(self):
+        """
+        Test if lookups of a value without a row reload the table
+        at most once per MISS_RELOAD_INTERVAL.
+        """
+        now = [1000.0]
+        cache = ReferenceCache(Region, 'voivodeship_name',
+                               clock=lambda: now[0])
+        self.assertIsNone(cache.by_value(7))
+        region = Region.objects.bulk_create([Region(voivodeship_name=7)])[0]
+        with self.assertNumQueries(0):
+            self.assertIsNone(cache.by_value(7))
+        now[0] += MISS_RELOAD_INTERVAL
+        self.assertEqual(cache.by_value(7).pk, region.pk)
+
+    def test_add_event_with_missing_region(self):
+        """
+        Test if the add event form shows an error for a region
+        without a row in the database.
+        """
+        user = User.objects.create_user('creator')
+        self.client.force_login(user)
+        response = self.client.post(reverse('add-events'), {
+            'event_name': 'new', 'event_type': 1, 'limit': 10,
+            'date_year': 2099, 'date_month': 5, 'date_day': 1,
+            'distance': 80, 'route_description': 'test',
+            'start': 'Łódź', 'finish': 'Łódź',
+            'region_name': 7, 'categories': 2})
+        self.assertContains(response, 'Brak regionu lub kategorii w bazie.')
+        self.assertFalse(Event.objects.filter(event_name='new').exists())
+
+
+class TestSearchEventsView(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.creator = User.objects.create_user('creator')
+        self.lodz = self.create('Wyścig łódzki', 'Łódź', 'Pabianice',
+                                'Pętla wokół miasta')
+        self.gravel = self.create('Gravel nad Wartą', 'Poznań', 'Puszczykowo',
+                                  'Szutry, start z Łodzi Kaliskiej')
+
+    def create(self, name, start, finish, description):
+        return Event.objects.create(
+            event_name=name, event_type=1, limit=10, distance=100,
+            route_description=description,
+            date="2022-09-17 00:00:00.000000 +00:00",
+            start=start, finish=finish, event_creator=self.creator)
+
+    def test_normalize_polish_letters(self):
+        """
+        Test if Polish diacritics are folded to ASCII.
+        """
+        self.assertEqual(normalize('Łódzkie ŚWIĘTOKRZYSKIE'),
+                         'lodzkie swietokrzyskie')
+
+    def test_search_ranks_name_matches_first(self):
+        """
+        Test if searching without diacritics finds both events,
+        event with the word in its name first.
+        """
+        response = self.client.get(reverse('search'), {'q': 'lodz'})
+        self.assertEqual(response.context['events'], [self.lodz, self.gravel])
+
+    def test_search_requires_all_words(self):
+        """
+        Test if every searched word must match.
+        """
+        response = self.client.get(reverse('search'), {'q': 'wyscig pabian'})
+        self.assertEqual(response.context['events'], [self.lodz])
+
+    def test_search_pagination(self):
+        """
+        Test if results are paginated.
+        """
+        response = self.client.get(reverse('search'),
+                                   {'q': 'lodz', 'page_size': 1, 'page': 2})
+        self.assertEqual(response.context['events'], [self.gravel])
+        self.assertFalse(response.context['has_next'])
+
+    def test_index_rebuilt_only_after_content_change(self):
+        """
+        Test if the in-memory index survives sign ups
+        and is rebuilt after a searched field is edited.
+        """
+        if uses_postgres_search():
+            self.skipTest('PostgreSQL searches stored vectors.')
+        index = get_index()
+        sign_up(self.lodz.id, User.objects.create_user('rider').profile)
+        self.lodz.distance = 120
+        self.lodz.save(update_fields=['distance'])
+        self.assertIs(get_index(), index)
+        self.lodz.event_name = 'Maraton'
+        self.lodz.save()
+        response = self.client.get(reverse('search'), {'q': 'maraton'})
+        self.assertEqual(response.context['events'], [self.lodz])
+
+
+class TestEventsApi(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.event = create_event('api event', 1)
+        self.addCleanup(clear_reference_cache)
+        Region.objects.create(voivodeship_name=5)
+        Category.objects.create(category_name=3)
+
+    def test_list_sparse_fields_and_etag(self):
+        """
+        Test if only requested fields are returned and ETag is honoured.
+        """
+        url = reverse('api-events')
+        response = self.client.get(url, {'fields': 'id,event_name'})
+        self.assertEqual(response.json()['results'],
+                         [{'id': self.event.id, 'event_name': 'api event'}])
+        response = self.client.get(url, {'fields': 'id,event_name'},
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_field(self):
+        """
+        Test if unknown field is rejected.
+        """
+        response = self.client.get(reverse('api-events'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_etag_changes_after_signup(self):
+        """
+        Test if ETag of the event changes when participants change.
+        """
+        url = reverse('api-event', kwargs={'id': self.event.id})
+        etag = self.client.get(url)['ETag']
+        user = User.objects.create_user('rider')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('api-event-signup', kwargs={'id': self.event.id}))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(
+            reverse('api-event-signup', kwargs={'id': self.event.id}))
+        self.assertEqual(response.status_code, 409)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['free_places'], 0)
+
+    def test_create_and_edit_event(self):
+        """
+        Test if logged in user can create event and only creator can edit it.
+        """
+        url = reverse('api-events')
+        data = {'event_name': 'new', 'event_type': 2, 'limit': 10,
+                'date': '2099-05-01', 'distance': 80,
+                'route_description': 'test', 'start': 'Łódź',
+                'finish': 'Łódź', 'region_name': 5, 'categories': 3}
+        response = self.client.post(url, json.dumps(data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+        creator = User.objects.create_user('creator')
+        self.client.force_login(creator)
+        response = self.client.post(url, json.dumps(data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['region_name'], 5)
+        self.assertEqual(created['categories'], 3)
+        self.assertEqual(Event.objects.get(id=created['id']).date,
+                         start_of_day(datetime.date(2099, 5, 1)))
+        response = self.client.post(url, json.dumps(dict(data, region_name=7)),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'],
+                         'Brak regionu lub kategorii w bazie.')
+
+        detail = reverse('api-event', kwargs={'id': created['id']})
+        response = self.client.patch(detail, json.dumps({'limit': 20}),
+                                     content_type='application/json')
+        self.assertEqual(response.json()['limit'], 20)
+
+        self.client.force_login(User.objects.create_user('other'))
+        response = self.client.patch(detail, json.dumps({'limit': 1}),
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_streams_all_events(self):
+        """
+        Test if export returns every event as a JSON array.
+        """
+        create_event2('second', 1)
+        response = self.client.get(reverse('api-events-export'),
+                                   {'fields': 'event_name'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(content), [{'event_name': 'api event'},
+                                               {'event_name': 'second'}])
+
+
+class TestImportEvents(TestCase):
+
+    csv_data = (
+        'event_name,event_type,limit,date,distance,route_description,'
+        'start,finish,region_name,categories\n'
+        'Maraton,1,100,2099-05-01,120,opis,Kraków,Tarnów,6,1\n'
+        'Ujemny,1,100,2099-05-01,-5,opis,Kraków,Tarnów,6,1\n'
+        'Stary,1,100,2000-05-01,50,opis,Kraków,Tarnów,6,1\n'
+        'Gravel,2,30,2099-06-01,60,opis,Kraków,Wieliczka,6,3\n'
+    )
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.creator = User.objects.create_user('organizer', password='12345')
+        self.addCleanup(clear_reference_cache)
+        Region.objects.create(voivodeship_name=6)
+        Category.objects.create(category_name=1)
+        Category.objects.create(category_name=3)
+
+    def test_import_csv_reports_invalid_rows(self):
+        """
+        Test if valid rows are inserted and invalid rows reported.
+        """
+        result = EventImporter(self.creator, batch_size=1).run(
+            iter_csv(StringIO(self.csv_data)))
+        self.assertEqual(result.created, 2)
+        self.assertEqual([row for row, _ in result.errors], [2, 3])
+        self.assertIn('distance', result.errors[0][1])
+        self.assertEqual(
+            list(Event.objects.order_by('event_name')
+                 .values_list('event_name', flat=True)),
+            ['Gravel', 'Maraton'])
+
+    def test_batch_search_vectors_set_in_one_statement(self):
+        """
+        Test if search vectors of a batch are stored with one UPDATE
+        and the imported events can be searched.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            EventImporter(self.creator).run(
+                iter_csv(StringIO(self.csv_data)))
+        updates = [query for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(updates), 1)
+        events, _ = search_events('wieliczka', 1, 10)
+        self.assertEqual([event.event_name for event in events], ['Gravel'])
+
+    def test_iter_json_reads_in_chunks(self):
+        """
+        Test if JSON array is parsed correctly with tiny chunks.
+        """
+        rows = [{'event_name': f'event {number}', 'start': 'Łódź'}
+                for number in range(20)]
+        parsed = list(iter_json(StringIO(json.dumps(rows)), chunk_size=7))
+        self.assertEqual(parsed, rows)
+        lines = '\n'.join(json.dumps(row) for row in rows)
+        self.assertEqual(list(iter_json(StringIO(lines), chunk_size=7)), rows)
+
+    def test_upload_view(self):
+        """
+        Test if logged in user can import events from uploaded file.
+        """
+        self.client.login(username='organizer', password='12345')
+        upload = SimpleUploadedFile('events.csv', self.csv_data.encode())
+        response = self.client.post(reverse('import-events'),
+                                    {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 2)
+        self.assertEqual(Event.objects.filter(
+            event_creator=self.creator).count(), 2)
+
+    def test_import_command(self):
+        """
+        Test if the management command imports JSON file.
+        """
+        rows = list(iter_csv(StringIO(self.csv_data)))
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False,
+                                         encoding='utf-8') as stream:
+            json.dump(rows, stream)
+        path = stream.name
+        try:
+            call_command('import_events', path, creator='organizer',
+                         stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(path)
+        self.assertEqual(Event.objects.count(), 2)
+
 
 class TestAddEditBike(TestCase):
 
@@ -341,3 +1193,919 @@ class TestAddEditBike(TestCase):
         bike.refresh_from_db()
         self.assertEqual(self.bike.brand, 'Trek')
         self.assertEqual(self.bike.weight, 9)
+
+
+class TestImagePipeline(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name,
+                                              TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.bike = create_bike()
+
+    def photo(self, name='photo.jpg'):
+        """
+        Return uploaded 800x600 JPEG rotated with EXIF orientation.
+        """
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+    def test_upload_generates_variants(self):
+        """
+        Test if uploaded bike photo is processed after the request.
+        """
+        url = reverse('edit-bike', kwargs={'id': self.bike.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'brand': 'Trek', 'model': 'Emonda',
+                                   'bike_type': 1, 'weight': 9,
+                                   'image': self.photo()})
+        self.bike.refresh_from_db()
+        self.assertEqual((self.bike.image_width, self.bike.image_height),
+                         (600, 800))
+        self.assertRegex(self.bike.image.name,
+                         r'^files/images/\w\w/\w\w/\w{64}\.jpg$')
+        with Image.open(self.bike.image.path) as original:
+            self.assertFalse(original.getexif())
+        with Image.open(self.bike.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.width, Bike.thumbnail_width)
+        self.assertTrue(self.bike.thumbnail_webp.name.endswith('.webp'))
+
+    def test_profile_photo_refreshes_cached_user(self):
+        """
+        Test if the cached user gets the processed photo and thumbnail.
+        """
+        user = User.objects.create_user(username='test', password='12345')
+        self.client.login(username='test', password='12345')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('edit-profile'),
+                             {'first_name': 'Jan', 'image': self.photo()})
+        for callback in callbacks[:-1]:
+            callback()
+        # page rendered before the image task finished caches the user
+        self.client.get(reverse('main'))
+        callbacks[-1]()
+        user.profile.refresh_from_db()
+        profile = self.client.get(reverse('main')).context['user'].profile
+        self.assertTrue(profile.thumbnail.name)
+        self.assertEqual(profile.thumbnail.name, user.profile.thumbnail.name)
+        self.assertEqual(profile.image.name, user.profile.image.name)
+
+    def test_backfill_command(self):
+        """
+        Test if images uploaded before the pipeline get thumbnails.
+        """
+        self.bike.image = self.photo()
+        self.bike.save()
+        call_command('process_images', stdout=StringIO())
+        self.bike.refresh_from_db()
+        self.assertTrue(self.bike.thumbnail)
+        self.assertEqual(self.bike.image_width, 600)
+
+
+class TestMediaStorage(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name,
+                                              TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_bike(self, content):
+        return Bike.objects.create(
+            brand='Trek', model='Emonda', bike_type=1, weight=8,
+            image=SimpleUploadedFile('rower2.jpg', content))
+
+    def test_identical_uploads_share_file(self):
+        """
+        Test if the same photo uploaded twice is stored once
+        and kept until the last bike using it is deleted.
+        """
+        first = self.create_bike(b'same photo')
+        second = self.create_bike(b'same photo')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^files/images/\w\w/\w\w/\w{64}\.jpg$')
+        stored_file = StoredFile.objects.get(name=first.image.name)
+        self.assertEqual(stored_file.ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(second.image.path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(second.image.path))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_saving_stored_file_keeps_its_address(self):
+        """
+        Test if saving a stored file again under its hashed name
+        refers to the same file instead of nesting new digest directories.
+        """
+        bike = self.create_bike(b'same photo')
+        name = bike.image.storage.save(bike.image.name,
+                                       ContentFile(b'same photo'))
+        self.assertEqual(name, bike.image.name)
+        self.assertEqual(StoredFile.objects.get().ref_count, 2)
+
+    def test_collect_media_deletes_orphans(self):
+        """
+        Test if files no row refers to are garbage collected.
+        """
+        bike = self.create_bike(b'used photo')
+        orphan = self.create_bike(b'orphan photo')
+        Bike.objects.filter(pk=orphan.pk).delete()
+        StoredFile.objects.filter(name=bike.image.name).update(ref_count=5)
+        call_command('collect_media', grace=-1, stdout=StringIO())
+        self.assertFalse(os.path.exists(orphan.image.path))
+        self.assertTrue(os.path.exists(bike.image.path))
+        self.assertEqual(StoredFile.objects.get().ref_count, 1)
+
+
+class TestBenchmarks(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name,
+                                              TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(clear_reference_cache)
+        self.dataset = seed_dataset(users=5, events=10, participants=3)
+
+    def test_every_route_is_benchmarked(self):
+        """
+        Test if every view of the URLconf has a benchmark scenario
+        and all scenarios succeed.
+        """
+        self.assertEqual(uncovered_routes(self.dataset), [])
+        results = run_benchmark(self.dataset, iterations=1, warmup=0)
+        for name, result in results.items():
+            self.assertLess(result['status'], 400, name)
+
+    def test_peak_memory_without_reset_peak(self):
+        """
+        Test if the peak memory is measured on Python 3.8,
+        which has no tracemalloc.reset_peak.
+        """
+        with mock.patch.object(tracemalloc, 'reset_peak', create=True,
+                               side_effect=AttributeError):
+            results = run_benchmark(self.dataset, iterations=1, warmup=0,
+                                    only=['events'])
+        self.assertGreater(results['events']['peak_memory_kb'], 0)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_explain_event_queries(self):
+        """
+        Test if the explain command plans the queries of the views.
+        """
+        stdout = StringIO()
+        call_command('explain_event_queries', no_analyze=True,
+                     stdout=stdout, stderr=StringIO())
+        output = stdout.getvalue()
+        for description in ('filter by region, bike type and event type',
+                            'ParticipantsView.get',
+                            'upcoming events of the user',
+                            'MyEventsView.get: waitlist of user'):
+            self.assertIn(description, output)
+        self.assertNotIn('"Cycling_events_app_region"', output)
+
+    def test_check_baseline(self):
+        """
+        Test if growing query count exceeds the budget.
+        """
+        result = {'p95_ms': 10, 'queries': 4, 'peak_memory_kb': 100}
+        baseline = {'scenarios': {'events': dict(result, queries=3)}}
+        self.assertEqual(check_baseline({'events': result}, baseline),
+                         ['events: 4 queries, budget 3'])
+        self.assertEqual(check_baseline({'events': result},
+                                        {'scenarios': {'events': result}}),
+                         [])
+
+
+class TestQueryInspector(QueryBudgetMixin, TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.addCleanup(clear_reference_cache)
+        self.client = Client()
+        self.user = User.objects.create_user('rider', password='12345')
+        region = Region.objects.create(voivodeship_name=6)
+        for number in range(3):
+            event = Event.objects.create(
+                event_name=f'event {number}', event_type=1, limit=10,
+                distance=150, route_description='test',
+                date="2022-09-17 00:00:00.000000 +00:00", start='test',
+                finish='test', region_name=region,
+                event_creator=User.objects.create_user(f'creator{number}'))
+            event.event_participant.add(self.user.profile)
+        regions.warm()
+        categories.warm()
+
+    def test_detects_repeated_query_in_template(self):
+        """
+        Test if N+1 query is reported with the template line.
+        """
+        template = Template('<ul>\n{% for event in events %}\n'
+                            '<li>{{ event.event_creator.username }}</li>\n'
+                            '{% endfor %}</ul>')
+        with QueryRecorder() as recorder:
+            template.render(Context({'events': Event.objects.all()}))
+        self.assertEqual(len(recorder.queries), 4)
+        report = recorder.report()
+        self.assertIn('3x SELECT', report)
+        self.assertIn('from <unknown source>:3', report)
+
+    @override_settings(QUERY_INSPECTOR=True)
+    def test_middleware_adds_query_count(self):
+        """
+        Test if the middleware reports number of queries.
+        """
+        response = Client().get(reverse('events'))
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    def test_hot_views_query_budgets(self):
+        """
+        Test if hot views stay within their query budgets.
+        """
+        self.client.login(username='rider', password='12345')
+        budgets = [
+            (reverse('events'), 2),
+            (reverse('my-events'), 4),
+            (reverse('search') + '?q=event', 3),
+            (reverse('event-details',
+                     kwargs={'id': Event.objects.first().id}), 1),
+            (reverse('api-events'), 1),
+        ]
+        for url, budget in budgets:
+            with self.subTest(url=url):
+                with self.assertQueryBudget(budget):
+                    self.client.get(url)
+
+
+class TestParticipants(QueryBudgetMixin, TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.client = Client()
+        self.creator = User.objects.create_user('organizer', password='12345')
+        self.event = Event.objects.create(
+            event_name='gran fondo', event_type=1, limit=100, distance=150,
+            route_description='test', date="2022-09-17 00:00:00.000000 +00:00",
+            start='test', finish='test', event_creator=self.creator)
+        bike = Bike.objects.create(brand='Trek', model='Emonda', bike_type=1,
+                                   weight=8)
+        for number in range(5):
+            user = User.objects.create_user(f'rider{number}',
+                                            first_name='Jan')
+            user.profile.bike = bike
+            user.profile.region = 6
+            user.profile.save()
+            self.event.event_participant.add(user.profile)
+
+    def test_participants_page(self):
+        """
+        Test if participants with bikes are listed in pages
+        with a constant number of queries.
+        """
+        url = reverse('participants', kwargs={'id': self.event.id})
+        with self.assertQueryBudget(2):
+            response = self.client.get(url, {'page_size': 3})
+        self.assertContains(response, 'rider0')
+        self.assertContains(response, 'Trek Emonda')
+        self.assertNotContains(response, 'rider3')
+        self.assertNotContains(response, 'listę startową')
+        response = self.client.get(url, {'page_size': 3,
+                                         'cursor': response.context['page']
+                                         .next_cursor})
+        self.assertContains(response, 'rider4')
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code,
+                         404)
+
+    def test_participants_in_signup_order(self):
+        """
+        Test if the start list and its export follow the order of joining
+        the event, not the order of creating the profiles.
+        """
+        first = User.objects.get(username='rider0').profile
+        self.event.event_participant.remove(first)
+        self.event.event_participant.add(first)
+        url = reverse('participants', kwargs={'id': self.event.id})
+        response = self.client.get(url, {'page_size': 3})
+        self.assertNotContains(response, 'rider0')
+        response = self.client.get(url, {'page_size': 3,
+                                         'cursor': response.context['page']
+                                         .next_cursor})
+        self.assertEqual([profile.user.username
+                          for profile in response.context['participants']],
+                         ['rider4', 'rider0'])
+        self.client.login(username='organizer', password='12345')
+        response = self.client.get(
+            reverse('participants-export', kwargs={'id': self.event.id}))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[1].startswith('1,rider1,'))
+        self.assertTrue(lines[5].startswith('5,rider0,'))
+
+    def test_export(self):
+        """
+        Test if the event creator can download the start list.
+        """
+        url = reverse('participants-export', kwargs={'id': self.event.id})
+        self.client.login(username='organizer', password='12345')
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1], '1,rider0,Jan,,,małopolskie,Trek Emonda')
+        User.objects.create_user('other', password='12345')
+        self.client.login(username='other', password='12345')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class TestCalendar(QueryBudgetMixin, TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.addCleanup(clear_reference_cache)
+        self.client = Client()
+        self.user = User.objects.create_user('rider', password='12345')
+        self.region = Region.objects.create(voivodeship_name=6)
+        self.event = Event.objects.create(
+            event_name='Tatry, nocą', event_type=1, limit=10, distance=150,
+            route_description='test', date="2099-09-17 08:00:00.000000 +00:00",
+            start='Zakopane', finish='Kraków', region_name=self.region,
+            event_creator=User.objects.create_user('organizer'))
+        self.url = reverse('region-calendar', kwargs={'id': self.region.id})
+
+    def test_region_feed(self):
+        """
+        Test if the region feed lists upcoming events and answers
+        conditional requests with 304.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'],
+                         'text/calendar; charset=utf-8')
+        content = response.content.decode()
+        self.assertIn('SUMMARY:Tatry\\, nocą\r\n', content)
+        self.assertIn('DTSTART:20990917T080000Z\r\n', content)
+        self.assertIn('LOCATION:Zakopane\r\n', content)
+        with self.assertQueryBudget(1):
+            response = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_fragments_are_cached(self):
+        """
+        Test if only changed events are rendered again.
+        """
+        self.client.get(self.url)
+        with self.assertQueryBudget(1):
+            self.client.get(self.url)
+        self.event.event_name = 'Beskidy'
+        self.event.save()
+        with self.assertQueryBudget(2):
+            content = self.client.get(self.url).content.decode()
+        self.assertIn('SUMMARY:Beskidy', content)
+
+    def test_user_feed(self):
+        """
+        Test if the personal feed lists events of the user
+        and requires a valid token.
+        """
+        self.client.login(username='rider', password='12345')
+        token = self.client.get(reverse('my-events'))\
+            .context['calendar_token']
+        self.client.logout()
+        url = reverse('user-calendar', kwargs={'token': token})
+        self.assertNotIn('BEGIN:VEVENT', self.client.get(url)
+                         .content.decode())
+        self.event.event_participant.add(self.user.profile)
+        self.assertIn('BEGIN:VEVENT', self.client.get(url).content.decode())
+        Event.objects.create(
+            event_name='Beskidy', event_type=1, limit=10, distance=90,
+            route_description='test', date="2099-09-18 08:00:00.000000 +00:00",
+            start='Wisła', finish='Wisła', event_creator=self.user)
+        resign(self.event.id, self.user.profile)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2099 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Tatry', response.content.decode())
+        url = reverse('user-calendar', kwargs={'token': token + 'x'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class TestGeo(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        creator = User.objects.create_user('organizer')
+        for name, start in (('krakow', 'Kraków, Rynek Główny'),
+                            ('wieliczka', 'Wieliczka'),
+                            ('gdansk', 'Gdańsk'), ('unknown', 'Las')):
+            Event.objects.create(
+                event_name=name, event_type=1, limit=10, distance=150,
+                route_description='test',
+                date="2022-09-17 00:00:00.000000 +00:00", start=start,
+                finish='Bielsko-Biała', event_creator=creator)
+
+    def test_geocode(self):
+        """
+        Test if towns and coordinates are found in free text.
+        """
+        self.assertEqual(geocode('parking, Zielona Góra'), (51.935, 15.506))
+        self.assertEqual(geocode('50.5, 19.25'), (50.5, 19.25))
+        self.assertIsNone(geocode('Atlantyda'))
+        self.assertEqual(encode_geohash(57.64911, 10.40744), 'u4pruydq')
+        event = Event.objects.get(event_name='krakow')
+        self.assertEqual(event.start_geohash[:4], 'u2yh')
+        self.assertEqual(event.finish_lat, 49.822)
+        self.assertEqual(Event.objects.get(event_name='unknown')
+                         .start_geohash, '')
+
+    def test_radius_and_bbox(self):
+        """
+        Test if events are filtered by distance from a place and by area.
+        """
+        names = set(events_near(50.062, 19.937, 20)
+                    .values_list('event_name', flat=True))
+        self.assertEqual(names, {'krakow', 'wieliczka'})
+        response = Client().get(reverse('events'),
+                                {'near': 'Gdynia', 'radius': 30})
+        self.assertEqual([event.event_name for event in
+                          response.context['events']], ['gdansk'])
+        response = Client().get(reverse('api-events'),
+                                {'bbox': '49.9,19.9,50.01,20.1'})
+        self.assertEqual([event['event_name'] for event in
+                          response.json()['results']], ['wieliczka'])
+        response = Client().get(reverse('events'), {'near': 'Atlantyda'})
+        self.assertIn('near', response.context['form'].errors)
+
+    def test_geocode_events_command(self):
+        """
+        Test if the command fills coordinates of existing events.
+        """
+        Event.objects.update(start_lat=None, start_lon=None,
+                             start_geohash='', finish_geohash='')
+        call_command('geocode_events', stdout=StringIO())
+        self.assertEqual(Event.objects.exclude(start_geohash='').count(), 3)
+
+
+GPX_TRACK = b"""<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+<trkpt lat="50.0" lon="19.0"><ele>200</ele></trkpt>
+<trkpt lat="50.0" lon="19.005"><ele>201</ele></trkpt>
+<trkpt lat="50.0" lon="19.01"><ele>200</ele></trkpt>
+<trkpt lat="50.01" lon="19.01"><ele>220</ele></trkpt>
+</trkseg></trk></gpx>"""
+
+
+class TestEventRoute(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name,
+                                              TASKS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.creator = User.objects.create_user('organizer', password='12345')
+        self.event = Event.objects.create(
+            event_name='gran fondo', event_type=1, limit=100, distance=150,
+            route_description='test', date="2022-09-17 00:00:00.000000 +00:00",
+            start='test', finish='test', event_creator=self.creator)
+        self.url = reverse('event-route', kwargs={'id': self.event.id})
+
+    def test_analyze(self):
+        """
+        Test if distance, elevation gain, area and simplified track
+        are computed from the GPX file.
+        """
+        stats = analyze(BytesIO(GPX_TRACK))
+        self.assertEqual(stats.points, 4)
+        self.assertAlmostEqual(stats.distance, 0.716 + 1.112, places=2)
+        # the 1 m bump is GPS noise
+        self.assertEqual(stats.elevation_gain, 20)
+        self.assertEqual(stats.bbox, (50.0, 19.0, 50.01, 19.01))
+        self.assertEqual(stats.polyline,
+                         [[50.0, 19.0], [50.0, 19.01], [50.01, 19.01]])
+        with self.assertRaises(GpxError):
+            analyze(BytesIO(b'<kml></kml>'))
+        with self.assertRaises(GpxError):
+            analyze(BytesIO(GPX_TRACK[:100]))
+
+    def test_simplify_long_track(self):
+        """
+        Test if points of a straight line are dropped.
+        """
+        lats = numpy.linspace(50, 51, 100000)
+        lons = numpy.full(100000, 19.0)
+        self.assertEqual(list(simplify(lats, lons)), [0, 99999])
+
+    def test_upload(self):
+        """
+        Test if the event creator can upload the track, which replaces
+        the event distance and is shown on the details page.
+        """
+        self.client.login(username='organizer', password='12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {
+                'gpx': SimpleUploadedFile('route.gpx', GPX_TRACK)})
+        self.assertRedirects(response, f'/event_details/{self.event.id}/',
+                             fetch_redirect_response=False)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.distance, 1.8)
+        response = self.client.get(response.url)
+        self.assertContains(response, '<polyline points="0.0,300.0 ')
+        self.assertContains(response, 'Przewyższenie: 20 m')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, {'gpx': gpx_file(None, points=100)})
+        route = EventRoute.objects.get()
+        self.assertEqual(route.points, 100)
+        self.assertEqual(list(StoredFile.objects.values_list('name',
+                                                             flat=True)),
+                         [route.gpx.name])
+        response = self.client.post(self.url, {
+            'gpx': SimpleUploadedFile('route.gpx', b'<gpx></gpx>')})
+        self.assertFormError(response, 'form', 'gpx', 'Plik GPX musi '
+                             'zawierać co najmniej dwa punkty trasy.')
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1,
+                   METRICS_DIR='', METRICS_TOKEN='')
+class TestMetrics(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.client = Client()
+
+    def test_request_metrics(self):
+        """
+        Test if requests are counted with database and template time.
+        """
+        self.client.get(reverse('events'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('cycling_http_requests_total{method="GET",'
+                      'status="200",view="events"} 1', content)
+        for name in ('duration_seconds', 'db_seconds', 'template_seconds',
+                     'queries'):
+            self.assertIn(f'cycling_http_request_{name}_count{{method="GET",'
+                          f'view="events"}} 1', content)
+        self.assertNotIn('view="metrics"', content)
+
+    def test_workers_are_aggregated(self):
+        """
+        Test if metrics written by other processes are summed.
+        """
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('login'))
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump(registry.snapshot(), file)
+            content = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('cycling_http_requests_total{method="GET",'
+                      'status="200",view="login"} 2', content)
+
+    def test_gauges_of_exited_workers_are_dropped(self):
+        """
+        Test if gauges are summed over running processes only.
+        """
+        labels = {'alias': 'default', 'state': 'idle'}
+        registry.set('db_pool_connections', labels, 2)
+        registry.inc('db_pool_timeouts_total', {'alias': 'default'})
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        exited = process.pid
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, f'{exited}.json'), 'w') as file:
+                json.dump(registry.snapshot(), file)
+            content = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('cycling_db_pool_connections{alias="default",'
+                      'state="idle"} 2', content)
+        self.assertIn('cycling_db_pool_timeouts_total{alias="default"} 2',
+                      content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """
+        Test if the endpoint requires the token when set.
+        """
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class TestReplicaRouting(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        self.event = create_event('testname', 2)
+        self.factory = RequestFactory()
+
+    def route(self, method, url, cookies=None, write=False):
+        """
+        Return database chosen for reads by the view of url
+        and the response of the middleware.
+        """
+        chosen = []
+
+        def get_response(request):
+            middleware.process_view(request, resolve(url).func, (), {})
+            if write:
+                router.db_for_write(Event)
+            chosen.append(router.db_for_read(Event))
+            return HttpResponse()
+        middleware = ReplicaMiddleware(get_response)
+        request = getattr(self.factory, method)(url)
+        request.COOKIES.update(cookies or {})
+        response = middleware(request)
+        return chosen[0], response
+
+    def test_read_only_views_use_replica(self):
+        """
+        Test if only GET requests of read only views read from replicas.
+        """
+        details = reverse('event-details', kwargs={'id': self.event.id})
+        self.assertEqual(self.route('get', details)[0], 'replica1')
+        self.assertEqual(self.route('get', reverse('events'))[0], 'replica1')
+        self.assertEqual(self.route('post', reverse('events'))[0], 'default')
+        self.assertEqual(self.route('get', reverse('my-events'))[0],
+                         'default')
+        self.assertEqual(router.db_for_read(Event), 'default')
+
+    def test_read_your_writes(self):
+        """
+        Test if a client which wrote is pinned to the primary.
+        """
+        details = reverse('event-details', kwargs={'id': self.event.id})
+        database, response = self.route('get', details, write=True)
+        self.assertEqual(database, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'],
+                         settings.REPLICA_PIN_SECONDS)
+        database, response = self.route('get', details,
+                                         cookies={PIN_COOKIE: '1'})
+        self.assertEqual(database, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=['default'], REPLICA_PIN_SECONDS=5)
+    def test_fragments_from_replica_expire_early(self):
+        """
+        Test if fragments rendered from replica reads are cached
+        only for REPLICA_PIN_SECONDS.
+        """
+        details = reverse('event-details', kwargs={'id': self.event.id})
+        for url in (reverse('events'), details):
+            response = self.client.get(url)
+            self.assertEqual(response.context['cache_timeout'], 5)
+        response = self.client.get(details, HTTP_COOKIE=f'{PIN_COOKIE}=1')
+        self.assertEqual(response.context['cache_timeout'],
+                         settings.EVENT_CACHE_TIMEOUT)
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_views_with_replica(self):
+        """
+        Test if signup pins the client and views work with a replica.
+        """
+        user = User.objects.create_user(
+            'TestUser', 'test@xyz.com', 'testpassword')
+        self.client.force_login(user=user)
+        response = self.client.get(
+            reverse('event-signup', kwargs={'id': self.event.id}))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.client.cookies.pop(PIN_COOKIE)
+        for url in (reverse('events'),
+                    reverse('event-details', kwargs={'id': self.event.id}),
+                    reverse('participants', kwargs={'id': self.event.id})):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class FakeConnection:
+    """
+    Connection of psycopg2 used by the pool.
+    """
+    def __init__(self):
+        self.closed = 0
+        self.info = mock.Mock(transaction_status=0)
+        self.pings = 0
+
+    def cursor(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.execute.side_effect = self.ping
+        return cursor
+
+    def ping(self, sql):
+        if self.closed:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.pings += 1
+
+    def rollback(self):
+        self.info.transaction_status = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool(TestCase):
+
+    def setUp(self) -> None:
+        """
+        Set up data to test.
+        """
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.now = 0
+        self.pool = ConnectionPool(
+            FakeConnection, 'default',
+            {'MAX_SIZE': 2, 'IDLE_TIMEOUT': 300, 'TIMEOUT': 0,
+             'HEALTH_CHECK_INTERVAL': 30},
+            clock=lambda: self.now)
+
+    def test_reuse_and_max_size(self):
+        """
+        Test if returned connections are reused and no more than
+        MAX_SIZE connections are opened.
+        """
+        first = self.pool.get()
+        second = self.pool.get()
+        with self.assertRaises(psycopg2.OperationalError):
+            self.pool.get()
+        self.pool.put(first)
+        self.assertIs(self.pool.get(), first)
+        self.pool.put(second)
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['db_pool_checkouts_total'], {
+            '[["alias", "default"], ["outcome", "created"]]': 2,
+            '[["alias", "default"], ["outcome", "reused"]]': 1})
+        self.assertEqual(list(snapshot['db_pool_timeouts_total'].values()),
+                         [1])
+        self.assertEqual(snapshot['db_pool_connections'], {
+            '[["alias", "default"], ["state", "idle"]]': 1,
+            '[["alias", "default"], ["state", "in_use"]]': 1})
+
+    def test_open_transaction_is_rolled_back(self):
+        """
+        Test if a connection is returned without an open transaction.
+        """
+        connection = self.pool.get()
+        connection.info.transaction_status = 2
+        self.pool.put(connection)
+        self.assertEqual(connection.info.transaction_status, 0)
+
+    def test_idle_timeout(self):
+        """
+        Test if connections idle for IDLE_TIMEOUT are closed.
+        """
+        connection = self.pool.get()
+        self.pool.put(connection)
+        self.now = 300
+        self.assertIsNot(self.pool.get(), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_health_check(self):
+        """
+        Test if connections idle for HEALTH_CHECK_INTERVAL are checked
+        and broken ones are replaced.
+        """
+        connection = self.pool.get()
+        self.pool.put(connection)
+        self.now = 10
+        self.assertIs(self.pool.get(), connection)
+        self.assertEqual(connection.pings, 0)
+        self.pool.put(connection)
+        self.now = 60
+        self.assertIs(self.pool.get(), connection)
+        self.assertEqual(connection.pings, 1)
+        self.pool.put(connection)
+        connection.ping = mock.Mock(side_effect=psycopg2.OperationalError)
+        self.now = 120
+        self.assertIsNot(self.pool.get(), connection)
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(
+            list(registry.snapshot()['db_pool_discarded_total']),
+            ['[["alias", "default"], ["reason", "health_check"]]'])
+
+
+class TestAsgi(TransactionTestCase):
+
+    async def test_async_views(self):
+        """
+        Test if async views serve requests of the ASGI handler.
+        """
+        event = await sync_to_async(create_event)('gran fondo', 5)
+        client = AsyncClient()
+        response = await client.get(
+            reverse('event-details', kwargs={'id': event.id}))
+        self.assertContains(response, 'gran fondo')
+        response = await client.get(reverse('events'))
+        self.assertContains(response, 'gran fondo')
+        response = await client.get(reverse('my-events'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(DEBUG=True, METRICS_ENABLED=True, QUERY_INSPECTOR=True)
+    def test_middleware_is_not_adapted(self):
+        """
+        Test if no middleware moves requests of the ASGI handler
+        to a worker thread.
+        """
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('loaded')
+            StreamingASGIHandler()
+        self.assertEqual([record.getMessage() for record in logs.records
+                          if 'adapted' in record.getMessage()], [])
+
+    @override_settings(DEBUG=True)
+    async def test_static_files_are_served(self):
+        """
+        Test if static files are served in both modes of the middleware
+        (found by the static finders, as nothing is collected in tests).
+        """
+        url = f'{settings.STATIC_URL}style.css'
+        response = await AsyncClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        response = await sync_to_async(Client().get)(url)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_SAMPLE_RATE=1,
+                       QUERY_INSPECTOR=True)
+    async def test_async_views_are_measured(self):
+        """
+        Test if queries of async views run in worker threads are measured.
+        """
+        registry.clear()
+        self.addCleanup(registry.clear)
+        event = await sync_to_async(create_event)('gran fondo', 5)
+        response = await AsyncClient().get(
+            reverse('event-details', kwargs={'id': event.id}))
+        self.assertNotEqual(response['X-Query-Count'], '0')
+        queries = registry.snapshot()['http_request_queries']
+        self.assertEqual(
+            queries['[["method", "GET"], ["view", "event-details"]]'][2], 1)
+        self.assertGreater(
+            queries['[["method", "GET"], ["view", "event-details"]]'][1], 0)
+
+    async def test_streaming_response_reads_database(self):
+        """
+        Test if the export streamed by the ASGI handler runs its queries
+        in a worker thread.
+        """
+        await sync_to_async(create_event)('gran fondo', 5)
+        scope = {'type': 'http', 'method': 'GET', 'scheme': 'http',
+                 'path': reverse('api-events-export'), 'query_string': b'',
+                 'headers': [], 'server': ('testserver', 80)}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await StreamingASGIHandler()(scope, receive, send)
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertEqual(json.loads(body)[0]['event_name'], 'gran fondo')
@@ -0,0 +1,29 @@
+import re
+import unicodedata
+
+# letters which unicode does not decompose into base letter + diacritic
+EXTRA_FOLDING = str.maketrans({'ł': 'l', 'Ł': 'l'})
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """
+    Lowercase text and strip Polish diacritics,
+    e.g. "Łódzkie" -> "lodzkie".
+    :param text:
+    :return: normalized text
+    """
+    text = (text or '').translate(EXTRA_FOLDING).lower()
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed
+                   if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """
+    Split text into normalized words.
+    :param text:
+    :return: list of words
+    """
+    return WORD_RE.findall(normalize(text))
@@ -0,0 +1,134 @@
+import hashlib
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY = 'login-throttle:{}'
+# sweep idle keys of the memory store after this many recorded failures
+SWEEP_EVERY = 1000
+
+
+class MemoryStore:
+    """
+    Failure timestamps kept in memory of this process.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = {}
+        self.recorded = 0
+
+    def get(self, key, since):
+        with self.lock:
+            times = self.failures.get(key)
+            if not times:
+                return []
+            while times and times[0] <= since:
+                times.popleft()
+            return list(times)
+
+    def add(self, key, now, window):
+        with self.lock:
+            self.failures.setdefault(key, deque()).append(now)
+            self.recorded += 1
+            if self.recorded % SWEEP_EVERY == 0:
+                self.sweep(now - window)
+
+    def sweep(self, since):
+        for key in [key for key, times in self.failures.items()
+                    if not times or times[-1] <= since]:
+            del self.failures[key]
+
+    def clear(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+
+
+class CacheStore:
+    """
+    Failure timestamps kept in the cache, shared by all workers
+    with the redis or file based cache.
+    """
+    def get(self, key, since):
+        return [moment for moment in cache.get(key, []) if moment > since]
+
+    def add(self, key, now, window):
+        times = self.get(key, now - window)
+        times.append(now)
+        cache.set(key, times, window)
+
+    def clear(self, key):
+        cache.delete(key)
+
+
+memory_store = MemoryStore()
+
+
+def get_store():
+    if settings.LOGIN_THROTTLE_BACKEND == 'cache':
+        return CacheStore()
+    return memory_store
+
+
+def make_key(kind, value):
+    digest = hashlib.md5(str(value).strip().lower().encode()).hexdigest()
+    return KEY.format(f'{kind}:{digest}')
+
+
+def client_ip(request):
+    """
+    Return address of the client. Behind LOGIN_THROTTLE_TRUSTED_PROXIES
+    proxies (the Heroku router) it is the entry of X-Forwarded-For added
+    by the outermost of them, entries before it may be forged.
+    """
+    proxies = settings.LOGIN_THROTTLE_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [address.strip() for address in request.META.get(
+            'HTTP_X_FORWARDED_FOR', '').split(',') if address.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class LoginThrottle:
+    """
+    Sliding window limit of failed logins per client address and per
+    username. Blocked attempts are rejected before the password is
+    hashed, so bursts of guesses do not use up the CPU of the workers.
+    """
+    def __init__(self, request, username, store=None, clock=time.time):
+        self.keys = [
+            (make_key('ip', client_ip(request)),
+             settings.LOGIN_THROTTLE_IP_LIMIT),
+            (make_key('username', username),
+             settings.LOGIN_THROTTLE_USERNAME_LIMIT),
+        ]
+        self.store = store or get_store()
+        self.clock = clock
+        self.window = settings.LOGIN_THROTTLE_WINDOW
+
+    def retry_after(self):
+        """
+        Return seconds until the next attempt is allowed
+        or 0 when the attempt may be made now.
+        """
+        now = self.clock()
+        wait = 0
+        for key, limit in self.keys:
+            times = self.store.get(key, now - self.window)
+            if len(times) >= limit:
+                wait = max(wait, times[-limit] + self.window - now)
+        return wait
+
+    def failed(self):
+        now = self.clock()
+        for key, _ in self.keys:
+            self.store.add(key, now, self.window)
+
+    def succeeded(self):
+        """
+        Forget failures of the username, the address keeps its history.
+        """
+        self.store.clear(self.keys[1][0])
@@ -1,16 +1,87 @@
+import asyncio
+import csv
+import functools
+import io
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, get_user_model, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseRedirect
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponse, HttpResponseRedirect, Http404, \
+    StreamingHttpResponse
 from django.shortcuts import render, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import classonlymethod
+from django.utils.http import urlencode
 from django.views import View
 from .forms import UserForm, AddEventForm, RegisterForm, UserDetailsForm,\
-    ProfileDetailsForm, EditEventForm, FilterEventsForm, AddBikeForm
-from .models import Event, Category, Region, Profile, Bike
+    ProfileDetailsForm, EditEventForm, FilterEventsForm, AddBikeForm, \
+    SearchEventsForm, ImportEventsForm, EventRouteForm
+from . import ical
+from .caching import cache_timeout, event_list_version, event_version, \
+    get_or_compute, make_key
+from .importing import EventImporter, ImportFormatError, guess_format, \
+    iter_rows
+from .models import Event, Profile, Bike, GENDER_CHOICES, \
+    VOIVODESHIP_NAME, WaitlistEntry
+from . import reference
+from .gpx import save_route
+from .images import schedule_image_processing
+from .pagination import KeysetPaginator, InvalidCursor
+from .search import search_events
+from .signups import sign_up, resign, join_waitlist, leave_waitlist, \
+    update_event, EventFull, AlreadySignedUp, AlreadyWaiting
+from .throttling import LoginThrottle
 
 User = get_user_model()
 
 
+def get_page_size(request):
+    """
+    Read page size from the query string, limited by EVENTS_MAX_PAGE_SIZE.
+    :param request:
+    :return: number of objects on a single page
+    """
+    try:
+        page_size = int(request.GET.get('page_size', settings.EVENTS_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.EVENTS_PAGE_SIZE
+    return max(1, min(page_size, settings.EVENTS_MAX_PAGE_SIZE))
+
+
+class AsyncView(View):
+    """
+    View with async handlers, served on the event loop under ASGI
+    (and through async_to_sync under WSGI). Django 4.0 has no async ORM,
+    so handlers run their queries and templates with sync_to_async.
+    """
+    login_required = False
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        return functools.update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.login_required:
+            # the lazy user may query the session and user tables
+            authenticated = await sync_to_async(
+                lambda: request.user.is_authenticated)()
+            if not authenticated:
+                return redirect_to_login(request.get_full_path())
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
 class LoginView(View):
     """
     Display view to log in user.
@@ -28,28 +99,42 @@ class LoginView(View):
     def post(self, request, *args, **kwargs):
         """
         Handle POST requests: to authenticate user.
+        Too many failed attempts are rejected before the password
+        is checked.
         """
         form = UserForm(request.POST)
+        status = 200
         if form.is_valid():
             username = form.cleaned_data['username']
             password = form.cleaned_data['password']
 
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(
-                    request,
-                    f'Pomyślnie zalogowano użytkownika {user.username}'
-                )
-                return redirect('/main_page/')
+            throttle = LoginThrottle(request, username)
+            retry_after = throttle.retry_after()
+            if retry_after:
+                form.add_error(
+                    None,
+                    f'Zbyt wiele nieudanych prób logowania. Spróbuj '
+                    f'ponownie za {math.ceil(retry_after)} s.')
+                status = 429
             else:
-                form.add_error(None, 'Niepoprawny login lub hasło!')
+                user = authenticate(username=username, password=password)
+                if user is not None:
+                    throttle.succeeded()
+                    login(request, user)
+                    messages.success(
+                        request,
+                        f'Pomyślnie zalogowano użytkownika {user.username}'
+                    )
+                    return redirect('/main_page/')
+                else:
+                    throttle.failed()
+                    form.add_error(None, 'Niepoprawny login lub hasło!')
 
         context = {
             'form': form
         }
 
-        return render(request, 'login.html', context)
+        return render(request, 'login.html', context, status=status)
 
 
 class LogoutView(View):
@@ -76,38 +161,87 @@ class MainView(View):
         return render(request=request, template_name='main_page.html')
 
 
-class EventsView(View):
+class EventsView(AsyncView):
     """
     View display events.
     """
-    def get(self, request):
+    replica_reads = True
+    ordering = ('event_name', 'id')
+
+    async def get(self, request):
         """
         Handle get request:
-        to display all added events sorted by event_name
+        to display a page of events sorted by event_name,
+        filtered by the optional FilterEventsForm fields passed
+        in the query string. Pages are addressed with the `cursor` parameter.
         """
-        form = FilterEventsForm()
-        events = Event.objects.order_by('event_name')
+        return await sync_to_async(self.render_page)(request)
+
+    def render_page(self, request):
+        form = FilterEventsForm(request.GET or None)
+        filters, active, query = {}, (), {}
+        if form.is_valid():
+            filters = form.get_filters()
+            active = tuple(sorted(
+                (name, value) for name, value in form.cleaned_data.items()
+                if value not in (None, False)))
+            # links of the cached page must not repeat invalid input
+            query = form.get_query()
+        cursor = request.GET.get('cursor')
+        page_size = get_page_size(request)
+        query['page_size'] = page_size
+        cache_key = make_key('events_list', event_list_version(),
+                             cursor, page_size, active)
+        events = Event.objects.filter(**filters)
+        paginator = KeysetPaginator(events, self.ordering, page_size)
+        try:
+            page = get_or_compute(cache_key, lambda: paginator.page(cursor))
+        except InvalidCursor:
+            raise Http404('Niepoprawny numer strony.')
         return render(request=request, template_name='events.html', context={
-            "events": events,
+            "events": page.object_list,
+            "page": page,
+            "query_string": urlencode(query),
             "form": form,
+            "cache_key": cache_key,
+            "cache_timeout": cache_timeout(),
         })
 
-    def post(self, request):
+    async def post(self, request):
         """
         Handle POST requests:
-        to filter events through: event_type, region name, categories.
+        redirect filters sent by the old POST form to the query string.
+        """
+        query = {name: request.POST[name]
+                 for name in FilterEventsForm.base_fields
+                 if request.POST.get(name)}
+        return redirect(f"{reverse('events')}?{urlencode(query)}")
+
+
+class SearchEventsView(View):
+    """
+    View to search events by words.
+    """
+    def get(self, request):
+        """
+        Handle GET requests: to display events matching the `q` parameter,
+        best matches first.
         """
-        form = FilterEventsForm(request.POST)
+        form = SearchEventsForm(request.GET or None)
+        try:
+            page = max(1, int(request.GET.get('page', 1)))
+        except ValueError:
+            page = 1
+        events, has_next = [], False
         if form.is_valid():
-            event_type = form.cleaned_data['event_type']
-            region_name = form.cleaned_data['region_name']
-            categories = form.cleaned_data['categories']
-            events = Event.objects.filter(region_name=region_name)\
-                .filter(categories=categories)\
-                .filter(event_type=event_type)
-            return render(request, 'events.html', {"form": form,
-                                                   "events": events,
-                                                   })
+            events, has_next = search_events(form.cleaned_data['q'], page,
+                                             get_page_size(request))
+        return render(request, 'search.html', {
+            "form": form,
+            "events": events,
+            "page": page,
+            "has_next": has_next,
+        })
 
 
 class AddEventView(LoginRequiredMixin, View):
@@ -138,8 +272,11 @@ class AddEventView(LoginRequiredMixin, View):
             finish = form.cleaned_data['finish']
             region_name = form.cleaned_data['region_name']
             categories = form.cleaned_data['categories']
-            category = Category.objects.get(category_name=categories)
-            region = Region.objects.get(voivodeship_name=region_name)
+            category = reference.categories.by_value(categories)
+            region = reference.regions.by_value(region_name)
+            if region is None or category is None:
+                form.add_error(None, 'Brak regionu lub kategorii w bazie.')
+                return render(request, 'add_event.html', {"form": form})
             event = Event.objects.create(event_name=event_name,
                                          event_type=event_type,
                                          date=date,
@@ -148,11 +285,10 @@ class AddEventView(LoginRequiredMixin, View):
                                          distance=distance,
                                          start=start,
                                          finish=finish,
+                                         region_name=region,
+                                         categories=category,
                                          event_creator=request.user,
                                          )
-            event.region_name = region
-            event.categories = category
-            event.save()
             messages.success(
                 request,
                 f'Dodałeś wydarzenie {event.event_name} do bazy.'
@@ -161,6 +297,47 @@ class AddEventView(LoginRequiredMixin, View):
         return render(request, 'add_event.html', {"form": form})
 
 
+class ImportEventsView(LoginRequiredMixin, View):
+    """
+    Display view to import events from CSV or JSON file.
+    """
+    def get(self, request):
+        """
+        Handle GET requests: to display upload form.
+        """
+        form = ImportEventsForm()
+        return render(request, 'import_events.html', {"form": form})
+
+    def post(self, request):
+        """
+        Handle POST requests: to import uploaded file,
+        reporting rows which did not pass validation.
+        """
+        form = ImportEventsForm(request.POST, request.FILES)
+        result = None
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            upload.seek(0)
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig',
+                                      newline='')
+            try:
+                result = EventImporter(request.user).run(
+                    iter_rows(stream, guess_format(upload.name)))
+            except (ImportFormatError, UnicodeDecodeError) as error:
+                form.add_error('file', str(error))
+            else:
+                messages.success(
+                    request,
+                    f'Zaimportowano {result.created} wydarzeń.'
+                )
+            finally:
+                stream.detach()
+        return render(request, 'import_events.html', {
+            "form": form,
+            "result": result,
+        })
+
+
 class RegisterView(View):
     """
     Display view to register user in app.
@@ -236,12 +413,15 @@ class EditProfileView(View):
         Handle POST requests: to update user profile.
         """
         user_form = UserDetailsForm(request.POST, instance=request.user)
+        old_image = request.user.profile.image.name
         profile_form = ProfileDetailsForm(request.POST or None,
                                           request.FILES or None,
                                           instance=request.user.profile)
         if user_form.is_valid() and profile_form.is_valid():
             user_form.save()
-            profile_form.save()
+            profile = profile_form.save()
+            if 'image' in profile_form.changed_data:
+                schedule_image_processing(profile, old_image)
             messages.success(self.request, 'Zmieniono dane użytkownika.')
             return HttpResponseRedirect(self.request.path_info)
         else:
@@ -252,26 +432,37 @@ class EditProfileView(View):
         })
 
 
-class EventView(View):
+class EventView(AsyncView):
     """
     Display view single event.
     """
-    def get(self, request, id):
+    replica_reads = True
+
+    async def get(self, request, id):
         """
         Handle GET requests:
         to display event details with the limit of available places.
         """
-        event = Event.objects.get(id=id)
-        user = User.objects.get(id=event.event_creator_id)
-        participants = event.event_participant.count()
-        avb = int(event.limit) - int(participants)
+        return await sync_to_async(self.render_event)(request, id)
+
+    def render_event(self, request, id):
+        cache_key = make_key('event_details', event_version(id), id)
+        events = Event.objects.select_related('event_creator', 'route')
+        try:
+            event = get_or_compute(cache_key, lambda: events.get(id=id))
+        except Event.DoesNotExist:
+            raise Http404('Nie ma takiego wydarzenia.')
+        creator = event.event_creator
+        avb = event.free_places
         return render(
                request=request,
                template_name='event_details.html',
                context={
                 "event": event,
-                "user": user,
+                "creator": creator,
                 "avb": avb,
+                "cache_key": cache_key,
+                "cache_timeout": cache_timeout(),
                })
 
 
@@ -297,7 +488,7 @@ class EditEventView(LoginRequiredMixin, View):
         event = Event.objects.get(id=id)
         form = EditEventForm(request.POST, instance=event)
         if form.is_valid():
-            form.save()
+            update_event(form)
             messages.success(
                 request,
                 "Pomyślnie zmieniono informacje o wydarzeniu."
@@ -306,25 +497,67 @@ class EditEventView(LoginRequiredMixin, View):
         return render(request, 'edit_event.html', {"form": form})
 
 
-class MyEventsView(LoginRequiredMixin, View):
+class EventRouteView(LoginRequiredMixin, View):
+    """
+    Display view to upload GPX track of the event.
+    """
+    def get(self, request, id):
+        """
+        Handle GET requests: to display upload form to the event creator.
+        """
+        event = get_event_or_404(id)
+        if request.user.id != event.event_creator_id:
+            return redirect(f'/event_details/{id}/')
+        return render(request, 'event_route.html',
+                      {"form": EventRouteForm(), "event": event})
+
+    def post(self, request, id):
+        """
+        Handle POST requests: to store the track with its statistics.
+        """
+        event = get_event_or_404(id)
+        if request.user.id != event.event_creator_id:
+            return redirect(f'/event_details/{id}/')
+        form = EventRouteForm(request.POST, request.FILES)
+        if form.is_valid():
+            route = save_route(event, form.cleaned_data['gpx'], form.stats)
+            messages.success(
+                request,
+                f'Zapisano trasę o długości {route.distance:.1f} km.'
+            )
+            return redirect(f'/event_details/{id}/')
+        return render(request, 'event_route.html',
+                      {"form": form, "event": event})
+
+
+class MyEventsView(AsyncView):
     """
     Display view with user events.
     """
-    def get(self, request):
+    login_required = True
+
+    async def get(self, request):
         """
         Handle GET requests: to display user events.
         """
+        return await sync_to_async(self.render_events)(request)
+
+    def render_events(self, request):
         user = request.user
-        profile = Profile.objects.get(user_id=user.id)
         event_creator = Event.objects.filter(
             event_creator_id=user.id).order_by('event_name')
         my_event = Event.objects.filter(
-            event_participant=profile).order_by('event_name')
+            event_participant__user_id=user.id).order_by('event_name')
+        waitlist = WaitlistEntry.objects\
+            .filter(profile__user_id=user.id).select_related('event')\
+            .order_by('event__event_name')
         return render(
             request=request,
             template_name='my_events.html',
             context={"event_creator": event_creator,
-                     "my_event": my_event
+                     "my_event": my_event,
+                     "waitlist": waitlist,
+                     "calendar_token": ical.user_token(user.id)
                      })
 
 
@@ -337,26 +570,48 @@ class EventSignupView(LoginRequiredMixin, View):
         Handle GET requests: to sign up for the events,
         with checking that the limit is not exceeded
         and that the user is not already signed up.
-        """
-        event = Event.objects.get(id=id)
-        participants = event.event_participant.all()
-        if (int(event.limit) - int(participants.count())) > 0:
-            if request.user.profile not in participants:
-                event.event_participant.add(request.user.profile)
-                messages.success(
-                    request,
-                    f'Pomyślnie zapisałeś się na {event.event_name}.'
-                )
-                return redirect("my-events")
-            else:
-                messages.error(request, "Jesteś już zapisany na to wydarzenie")
-                return redirect('events')
+        When the event is full, the user joins its waitlist.
+        """
+        profile = request.user.profile
+        try:
+            event = sign_up(id, profile)
+        except Event.DoesNotExist:
+            raise Http404('Nie ma takiego wydarzenia.')
+        except EventFull:
+            return self.join_waitlist(request, id, profile)
+        except AlreadySignedUp:
+            messages.error(request, "Jesteś już zapisany na to wydarzenie")
+            return redirect('events')
+        messages.success(
+            request,
+            f'Pomyślnie zapisałeś się na {event.event_name}.'
+        )
+        return redirect("my-events")
+
+    def join_waitlist(self, request, id, profile):
+        try:
+            event, position = join_waitlist(id, profile)
+        except AlreadySignedUp:
+            messages.error(request, "Jesteś już zapisany na to wydarzenie")
+            return redirect('events')
+        except AlreadyWaiting as error:
+            messages.info(
+                request,
+                f'Jesteś już na liście rezerwowej na pozycji {error.position}.'
+            )
+            return redirect("my-events")
+        if position is None:
+            messages.success(
+                request,
+                f'Pomyślnie zapisałeś się na {event.event_name}.'
+            )
         else:
-            messages.error(
+            messages.warning(
                 request,
-                "Limit miejsc na to wydarzenie został wyczerpany"
+                f'Brak wolnych miejsc, zostałeś dopisany do listy '
+                f'rezerwowej na pozycji {position}.'
             )
-            return redirect('events')
+        return redirect("my-events")
 
 
 class EventResignationView(View):
@@ -368,8 +623,10 @@ class EventResignationView(View):
         Handle GET requests: to cancel participation in event.
         """
         user = request.user
-        event = Event.objects.get(id=id)
-        event.event_participant.remove(user.profile)
+        try:
+            event = resign(id, user.profile)
+        except Event.DoesNotExist:
+            raise Http404('Nie ma takiego wydarzenia.')
         messages.success(
             request,
             f'Zrezygnowałeś z udziału w wydarzeniu {event.event_name}.'
@@ -377,15 +634,179 @@ class EventResignationView(View):
         return redirect("my-events")
 
 
-class ParticipantsView(View):
+class WaitlistResignationView(LoginRequiredMixin, View):
+    """
+    View used to leave the waitlist of the event
+    """
+    def get(self, request, id):
+        """
+        Handle GET requests: to remove the user from the waitlist.
+        """
+        try:
+            event = leave_waitlist(id, request.user.profile)
+        except (Event.DoesNotExist, ValueError):
+            raise Http404('Nie ma takiego wydarzenia.')
+        messages.success(
+            request,
+            f'Opuściłeś listę rezerwową wydarzenia {event.event_name}.'
+        )
+        return redirect("my-events")
+
+
+class Echo:
+    """
+    Pseudo buffer returning the written value, so csv.writer
+    can produce rows of a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def get_event_or_404(id):
+    try:
+        return Event.objects.only('id', 'event_name', 'event_creator_id')\
+            .get(id=id)
+    except (Event.DoesNotExist, ValueError):
+        raise Http404('Nie ma takiego wydarzenia.')
+
+
+def event_participants(event):
+    """
+    Return sign-ups of the event with profiles of the participants,
+    their users and bikes fetched in the same query.
+    Sign-ups ordered by id follow the order of joining the event.
+    """
+    return Event.event_participant.through.objects.filter(event=event)\
+        .select_related('profile__user', 'profile__bike')
+
+
+class ParticipantsView(AsyncView):
     """
     Display view with the list of participants.
     """
+    replica_reads = True
+    ordering = ('id',)
+
+    async def get(self, request, id):
+        """
+        Handle GET requests: to display a page of participants
+        with their bikes, following the `cursor` from the query string.
+        """
+        return await sync_to_async(self.render_participants)(request, id)
+
+    def render_participants(self, request, id):
+        event = get_event_or_404(id)
+        page_size = get_page_size(request)
+        paginator = KeysetPaginator(event_participants(event), self.ordering,
+                                    page_size)
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Niepoprawny numer strony.')
+        return render(request, "participants.html", context={
+            "event": event,
+            "participants": [signup.profile for signup in page],
+            "page": page,
+            "query_string": urlencode({'page_size': page_size}),
+            "can_export": request.user.id == event.event_creator_id,
+        })
+
+
+class ParticipantsExportView(LoginRequiredMixin, View):
+    """
+    Stream the start list of the event as a CSV file
+    (available to the event creator).
+    """
+    chunk_size = 2000
+    columns = ('profile__user__username', 'profile__user__first_name',
+               'profile__user__last_name', 'profile__gender',
+               'profile__region', 'profile__bike__brand',
+               'profile__bike__model')
+    header = ('Nr', 'Login', 'Imię', 'Nazwisko', 'Płeć', 'Województwo',
+              'Rower')
+
     def get(self, request, id):
-        event = Event.objects.get(id=id)
-        participants = event.event_participant.all()
-        return render(request, "participants.html",
-                      context={"participants": participants})
+        """
+        Handle GET requests: to download the start list,
+        rows are read in chunks so memory use does not depend
+        on the number of participants.
+        """
+        event = get_event_or_404(id)
+        if request.user.id != event.event_creator_id:
+            return redirect(f'/event_details/{id}/')
+        rows = event_participants(event).order_by('id')\
+            .values_list(*self.columns)\
+            .iterator(chunk_size=self.chunk_size)
+        genders = dict(GENDER_CHOICES)
+        voivodeships = dict(VOIVODESHIP_NAME)
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield writer.writerow(self.header)
+            for number, (username, first_name, last_name, gender, region,
+                         brand, model) in enumerate(rows, 1):
+                bike = f'{brand} {model}' if brand else ''
+                yield writer.writerow((
+                    number, username, first_name, last_name,
+                    genders.get(gender, ''), voivodeships.get(region, ''),
+                    bike))
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = \
+            f'attachment; filename="participants-{event.id}.csv"'
+        return response
+
+
+def region_feed(id):
+    """
+    Build the feed with upcoming events of the region.
+    :param id: id of the region
+    :return: tuple (events queryset, calendar name)
+    """
+    region = reference.regions.by_pk(id)
+    if region is None:
+        raise Http404('Nie ma takiego regionu.')
+    return ical.region_events(id), f'Wydarzenia rowerowe: {region}'
+
+
+def user_feed(token):
+    """
+    Build the feed with upcoming events of the user, the signed token
+    in the url lets calendar clients subscribe without logging in.
+    :param token: token from ical.user_token
+    :return: tuple (events queryset, calendar name)
+    """
+    user_id = ical.user_from_token(token)
+    if user_id is None:
+        raise Http404('Niepoprawny link kalendarza.')
+    return ical.user_events(user_id), 'Moje wydarzenia rowerowe'
+
+
+class CalendarFeedView(View):
+    """
+    iCalendar feed with upcoming events built by the `feed` callable
+    passed to as_view, it gets the keyword arguments from the url.
+    Answers 304 Not Modified while no event of the feed changed.
+    """
+    feed = None
+    max_age = 300
+
+    def get(self, request, **kwargs):
+        """
+        Handle GET requests: to return the calendar
+        or 304 if the client has the current version.
+        """
+        events, name = self.feed(**kwargs)
+        rows, etag = ical.feed_state(events)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            base_url = request.build_absolute_uri('/').rstrip('/')
+            response = HttpResponse(
+                ical.render_calendar(rows, name, base_url),
+                content_type='text/calendar; charset=utf-8')
+        response['ETag'] = etag
+        patch_cache_control(response, max_age=self.max_age)
+        return response
 
 
 class AddBikeView(View):
@@ -416,7 +837,8 @@ class AddBikeView(View):
                                        bike_type=bike_type,
                                        weight=weight,
                                        image=image)
-            bike.save()
+            if image:
+                schedule_image_processing(bike)
             user = request.user
             user.profile.bike = bike
             user.save()
@@ -429,6 +851,8 @@ class BikeDetailsView(View):
     """
     Display view single bike.
     """
+    replica_reads = True
+
     def get(self, request, id):
         bike = Bike.objects.get(id=id)
         return render(request, "bike.html", context={"bike": bike})
@@ -451,12 +875,14 @@ class EditBikeView(View):
         Handle POST requests: to update event.
         """
         bike = Bike.objects.get(id=id)
+        old_image = bike.image.name
         form = AddBikeForm(request.POST or None,
                            request.FILES or None,
                            instance=bike)
         if form.is_valid():
             form.save()
-            bike.save()
+            if 'image' in form.changed_data:
+                schedule_image_processing(bike, old_image)
             messages.success(request, 'Zmieniłeś dane roweru')
             return redirect(f'/bike_details/{id}/')
         return render(request, 'add_bike.html', {"form": form})
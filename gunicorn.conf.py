@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration.
+
+DJANGO_SERVER_MODE selects how the project is served:
+wsgi (default) - synchronous workers running Cycling_events.wsgi,
+asgi - uvicorn workers running Cycling_events.asgi, where one worker
+keeps many slow client connections open on its event loop.
+The number of workers is read by gunicorn from WEB_CONCURRENCY.
+"""
+
+import os
+
+mode = os.environ.get('DJANGO_SERVER_MODE', 'wsgi')
+if mode not in ('wsgi', 'asgi'):
+    raise RuntimeError(f'Unknown DJANGO_SERVER_MODE {mode!r}, '
+                       f'use wsgi or asgi.')
+
+errorlog = '-'
+
+if mode == 'asgi':
+    wsgi_app = 'Cycling_events.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'Cycling_events.wsgi:application'